@@ -0,0 +1,232 @@
+import io
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import resource
+import tempfile
+import tracemalloc
+import subprocess
+
+import numpy as np
+import pandas as pd
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+
+# PATHS
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_FILE = os.path.join(BASE_DIR, "streamlit_app", "app.py")
+RESULTS_DIR = os.path.join(BASE_DIR, "benchmarks", "results")
+HISTORY_FILE = os.path.join(RESULTS_DIR, "dashboard_history.jsonl")
+
+# PARAMETERS
+LINK_COUNTS = [3, 30, 300]
+CELLS_PER_LINK = 8
+APP_TIMEOUT_SEC = 600
+TAB_NAMES = ["overview", "topology", "capacity", "traffic", "snapshot", "profile"]
+
+
+# SYNTHETIC OUTPUT TREE
+def _png_bytes(figsize, draw):
+    buf = io.BytesIO()
+    plt.figure(figsize=figsize)
+    draw()
+    plt.tight_layout()
+    plt.savefig(buf, format="png", dpi=150)
+    plt.close()
+    return buf.getvalue()
+
+
+def make_synthetic_outputs(out_dir, num_links, seed=0):
+    """
+    Write an output/ tree shaped like the real pipeline's for num_links links
+    """
+    rng = np.random.default_rng(seed)
+    num_cells = num_links * CELLS_PER_LINK
+
+    for sub in ["member3", "capacity", "figures"]:
+        os.makedirs(os.path.join(out_dir, sub), exist_ok=True)
+
+    link_ids = np.repeat(np.arange(1, num_links + 1), CELLS_PER_LINK)
+    cells = [f"Cell {i + 1}" for i in range(num_cells)]
+    pd.DataFrame({"Cell": cells, "Link_ID": link_ids}).to_csv(
+        os.path.join(out_dir, "member3", "cell_to_link_mapping.csv"),
+        index=False
+    )
+    pd.DataFrame([
+        {"Link_ID": f"Link {l}",
+         "Cells": ", ".join(c for c, lid in zip(cells, link_ids) if lid == l)}
+        for l in range(1, num_links + 1)
+    ]).to_csv(
+        os.path.join(out_dir, "member3", "link_groupwise_table.csv"),
+        index=False
+    )
+
+    links = [f"Link {l}" for l in range(1, num_links + 1)]
+    avg = rng.uniform(0.5, 1.5, num_links)
+    pd.DataFrame({
+        "Link": links,
+        "Avg_Traffic_Gbps": avg.round(3),
+        "Required_Capacity_No_Buffer_Gbps": (avg * 4.5).round(3)
+    }).to_csv(
+        os.path.join(out_dir, "capacity", "required_capacity_no_buffer.csv"),
+        index=False
+    )
+    pd.DataFrame({
+        "Link": links,
+        "Required_Capacity_With_Buffer_Gbps": (avg * 4.2).round(3)
+    }).to_csv(
+        os.path.join(out_dir, "capacity", "required_capacity_with_buffer.csv"),
+        index=False
+    )
+
+    # Images at the real pipeline's figure sizes
+    corr = np.corrcoef(rng.standard_normal((num_cells, 64)))
+    heatmap = _png_bytes(
+        (12, 10), lambda: (plt.imshow(corr, cmap="coolwarm"), plt.colorbar())
+    )
+    with open(os.path.join(out_dir, "member3", "correlation_heatmap.png"), "wb") as f:
+        f.write(heatmap)
+
+    states = rng.integers(0, 3, (3, 300))
+    snapshot = _png_bytes((14, 6), lambda: plt.imshow(states, aspect="auto"))
+    with open(os.path.join(out_dir, "member3", "traffic_snapshot.png"), "wb") as f:
+        f.write(snapshot)
+
+    trace = rng.gamma(0.3, 3.0, 6000)
+    figure = _png_bytes((14, 5), lambda: plt.fill_between(np.arange(6000), trace))
+    for link in links:
+        fname = f"figure3_{link.replace(' ', '_')}.png"
+        with open(os.path.join(out_dir, "figures", fname), "wb") as f:
+            f.write(figure)
+
+
+# MEASUREMENT HELPERS
+def _proto_bytes(node):
+    total = 0
+    proto = getattr(node, "proto", None)
+    if proto is not None and hasattr(proto, "ByteSize"):
+        total += proto.ByteSize()
+    for child in getattr(node, "children", {}).values():
+        total += _proto_bytes(child)
+    return total
+
+
+def _run_app():
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(APP_FILE, default_timeout=APP_TIMEOUT_SEC)
+    t0 = time.perf_counter()
+    at.run()
+    elapsed = time.perf_counter() - t0
+
+    if at.exception:
+        raise RuntimeError(at.exception[0].value)
+
+    return at, elapsed
+
+
+def _describe_run(at, elapsed):
+    markdown = [m.value for m in at.markdown]
+    return {
+        "script_sec": round(elapsed, 4),
+        "section_sec": {
+            k: round(v, 4) for k, v in at.session_state["render_timings"].items()
+        },
+        "bytes_total": _proto_bytes(at._tree),
+        "bytes_per_tab": {
+            name: _proto_bytes(tab) for name, tab in zip(TAB_NAMES, at.tabs)
+        },
+        "bytes_css": len(markdown[0].encode()) if markdown else 0,
+        "bytes_base64_images": sum(
+            len(m.encode()) for m in markdown if "data:image" in m
+        ),
+    }
+
+
+def measure_scenario(num_links):
+    """
+    Run inside a fresh interpreter so the first run is a true cold start
+    """
+    out_dir = tempfile.mkdtemp(prefix=f"fh_dash_{num_links}_")
+    try:
+        make_synthetic_outputs(out_dir, num_links)
+        os.environ["FRONTHAUL_OUTPUT_DIR"] = out_dir
+        os.environ["FRONTHAUL_RENDER_TIMINGS"] = "1"
+
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        cold = _describe_run(*_run_app())
+        warm = _describe_run(*_run_app())
+        rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+        # Separate pass: tracemalloc slows the script, so it is not timed
+        tracemalloc.start()
+        _run_app()
+        _, heap_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
+
+    return {
+        "num_links": num_links,
+        "cold": cold,
+        "warm": warm,
+        "peak_rss_kb": rss_after,
+        "rss_growth_kb": rss_after - rss_before,
+        "python_heap_peak_bytes": heap_peak,
+    }
+
+
+# MAIN
+def main():
+    parser = argparse.ArgumentParser(
+        description="Headless cold-start / render benchmark for the dashboard"
+    )
+    parser.add_argument("--links", type=int, nargs="+", default=LINK_COUNTS)
+    parser.add_argument("--history", default=HISTORY_FILE)
+    parser.add_argument("--scenario", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    # Child mode: measure one scenario and print JSON
+    if args.scenario is not None:
+        print(json.dumps(measure_scenario(args.scenario)))
+        return
+
+    run = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "scenarios": []
+    }
+
+    for num_links in args.links:
+        print(f"Benchmarking dashboard with {num_links} links...")
+        proc = subprocess.run(
+            [sys.executable, __file__, "--scenario", str(num_links)],
+            capture_output=True, text=True, check=True
+        )
+        result = json.loads(proc.stdout.strip().splitlines()[-1])
+        run["scenarios"].append(result)
+
+        cold, warm = result["cold"], result["warm"]
+        print(f"  cold {cold['script_sec']:.3f}s  warm {warm['script_sec']:.3f}s  "
+              f"sent {cold['bytes_total'] / 1e6:.2f} MB "
+              f"(css {cold['bytes_css'] / 1e3:.1f} kB, "
+              f"images {cold['bytes_base64_images'] / 1e6:.2f} MB)  "
+              f"peak RSS {result['peak_rss_kb'] / 1024:.0f} MB")
+        for name in TAB_NAMES:
+            print(f"    {name:<9} {cold['section_sec'].get(name, 0.0):.4f}s  "
+                  f"{cold['bytes_per_tab'][name] / 1e3:.1f} kB")
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.history)), exist_ok=True)
+    with open(args.history, "a") as f:
+        f.write(json.dumps(run) + "\n")
+
+    print(f"\nAppended results to {args.history}")
+
+
+if __name__ == "__main__":
+    main()
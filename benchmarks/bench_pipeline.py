@@ -0,0 +1,389 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import resource
+import tempfile
+import subprocess
+
+import numpy as np
+import pandas as pd
+import matplotlib
+matplotlib.use("Agg")
+
+# PATHS
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC_DIR = os.path.join(BASE_DIR, "src")
+RESULTS_DIR = os.path.join(BASE_DIR, "benchmarks", "results")
+HISTORY_FILE = os.path.join(RESULTS_DIR, "pipeline_history.jsonl")
+BASELINE_FILE = os.path.join(RESULTS_DIR, "pipeline_baseline.json")
+
+sys.path.insert(0, SRC_DIR)
+
+import pipeline
+import preprocess_member1 as member1
+import member3_topology_inference as member3
+import estimate_capacity_no_buffer as cap_no_buf
+import estimate_capacity_with_buffer as cap_buf
+import generate_synthetic_traces as synth
+
+# SCENARIOS (synthetic datasets of increasing size)
+SCENARIOS = {
+    "small": {"num_cells": 24, "num_links": 3, "duration_sec": 1.0},
+    "medium": {"num_cells": 24, "num_links": 3, "duration_sec": 5.0},
+    "large": {"num_cells": 48, "num_links": 6, "duration_sec": 5.0},
+}
+
+STAGES = [
+    "parse", "slot_aggregation", "windowing", "correlation", "clustering",
+    "link_aggregation", "capacity_no_buffer", "capacity_with_buffer",
+    "plotting",
+]
+
+# BUDGETS: allowed slowdown against the baseline before a stage is flagged
+BUDGETS = {
+    "parse": 0.15,
+    "slot_aggregation": 0.15,
+    "windowing": 0.20,
+    "correlation": 0.25,
+    "clustering": 0.25,
+    "link_aggregation": 0.25,
+    "capacity_no_buffer": 0.20,
+    "capacity_with_buffer": 0.15,
+    "plotting": 0.30,
+}
+MEMORY_BUDGET = 0.25
+MIN_DELTA_SEC = 0.05      # ignore slowdowns smaller than timer noise
+MIN_DELTA_KB = 16 * 1024  # ignore RSS growth below 16 MB
+
+
+# ACCURACY
+def adjusted_rand_index(labels_true, labels_pred):
+    """
+    Adjusted Rand index of two flat clusterings (1.0 = identical partitions)
+    """
+    _, true_idx = np.unique(labels_true, return_inverse=True)
+    _, pred_idx = np.unique(labels_pred, return_inverse=True)
+
+    contingency = np.zeros((true_idx.max() + 1, pred_idx.max() + 1))
+    np.add.at(contingency, (true_idx, pred_idx), 1)
+
+    def pairs(x):
+        return (x * (x - 1) / 2).sum()
+
+    n = len(true_idx)
+    index = pairs(contingency)
+    rows = pairs(contingency.sum(axis=1))
+    cols = pairs(contingency.sum(axis=0))
+    expected = rows * cols / pairs(np.array([n]))
+    maximum = (rows + cols) / 2
+
+    if maximum == expected:
+        return 1.0
+    return float((index - expected) / (maximum - expected))
+
+
+# MEASUREMENT HELPERS
+def _peak_rss_kb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _nbytes(obj):
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(deep=True).sum())
+    if isinstance(obj, np.ndarray):
+        return int(obj.nbytes)
+    if isinstance(obj, dict):
+        return sum(_nbytes(v) for v in obj.values())
+    if isinstance(obj, (list, tuple)):
+        return sum(_nbytes(v) for v in obj)
+    return 0
+
+
+def _dir_bytes(path):
+    return sum(
+        os.path.getsize(os.path.join(root, f))
+        for root, _, files in os.walk(path) for f in files
+    )
+
+
+def _timed(stages, name, func, *args):
+    rss_before = _peak_rss_kb()
+    wall = time.perf_counter()
+    cpu = time.process_time()
+
+    out = func(*args)
+
+    stages[name] = {
+        "wall_sec": round(time.perf_counter() - wall, 4),
+        "cpu_sec": round(time.process_time() - cpu, 4),
+        "peak_rss_kb": _peak_rss_kb(),
+        "rss_growth_kb": _peak_rss_kb() - rss_before,
+        "output_bytes": _nbytes(out),
+    }
+    return out
+
+
+# STAGE FUNCTIONS
+def parse(data_dir, num_cells):
+    raw = {}
+    for cell_id in range(1, num_cells + 1):
+        raw[cell_id] = (
+            member1.read_throughput(os.path.join(
+                data_dir, "throughput", f"throughput-cell-{cell_id}.dat"
+            )),
+            member1.read_pktstats(os.path.join(
+                data_dir, "pkt-stats", f"pkt-stats-cell-{cell_id}.dat"
+            )),
+        )
+    return raw
+
+
+def slot_aggregation(raw):
+    throughput = {c: member1.throughput_to_slots(thr) for c, (thr, _) in raw.items()}
+    pktloss = {c: member1.pktstats_to_loss(pkt) for c, (_, pkt) in raw.items()}
+    return throughput, pktloss
+
+
+def capacity_no_buffer(link_traces):
+    return np.array([
+        cap_no_buf.required_capacity_no_buffer(traffic)[1]
+        for traffic in link_traces.values()
+    ])
+
+
+def capacity_with_buffer(link_traces):
+    return np.array([
+        cap_buf.required_capacity_with_buffer(traffic)
+        for traffic in link_traces.values()
+    ])
+
+
+def measure_scenario(data_dir, num_cells, num_links):
+    """
+    Run every stage once on data_dir and return per-stage metrics + ARI.
+    Meant to run in a fresh interpreter so peak RSS is per scenario.
+    """
+    stages = {}
+
+    raw = _timed(stages, "parse", parse, data_dir, num_cells)
+    stages["parse"]["input_bytes"] = sum(
+        _dir_bytes(os.path.join(data_dir, sub))
+        for sub in ["throughput", "pkt-stats"]
+    )
+
+    throughput, pktloss = _timed(stages, "slot_aggregation", slot_aggregation, raw)
+    del raw
+
+    cell_ids, signal_matrix = _timed(
+        stages, "windowing", pipeline.build_signal_matrix, pktloss
+    )
+    corr = _timed(stages, "correlation", member3.correlation_matrix, signal_matrix)
+    labels = _timed(stages, "clustering", member3.cluster_links, corr, num_links)
+
+    cell_labels = [f"Cell {cid}" for cid in cell_ids]
+    mapping_df = pd.DataFrame({"Cell": cell_labels, "Link_ID": labels})
+
+    link_traces = _timed(
+        stages, "link_aggregation", pipeline.aggregate_links, throughput, mapping_df
+    )
+    no_buf = _timed(stages, "capacity_no_buffer", capacity_no_buffer, link_traces)
+    with_buf = _timed(stages, "capacity_with_buffer", capacity_with_buffer, link_traces)
+
+    result = {
+        "throughput": throughput,
+        "pktloss": pktloss,
+        "correlation": pd.DataFrame(corr, index=cell_labels, columns=cell_labels),
+        "link_traffic": link_traces,
+        "capacity": pd.DataFrame({
+            "Link": [f"Link {l}" for l in link_traces],
+            "Required_Capacity_No_Buffer_Gbps": no_buf,
+            "Required_Capacity_With_Buffer_Gbps": with_buf,
+        }),
+    }
+
+    plot_dir = tempfile.mkdtemp(prefix="fh_bench_plots_")
+    try:
+        _timed(stages, "plotting", pipeline.plot, result, plot_dir)
+        stages["plotting"]["output_bytes"] = _dir_bytes(plot_dir)
+    finally:
+        shutil.rmtree(plot_dir, ignore_errors=True)
+
+    truth = pd.read_csv(
+        os.path.join(data_dir, "ground_truth_cell_to_link.csv")
+    ).set_index("Cell")["Link_ID"]
+
+    return {
+        "num_slots": max(len(df) for df in throughput.values()),
+        "stages": stages,
+        "total_wall_sec": round(sum(s["wall_sec"] for s in stages.values()), 4),
+        "peak_rss_kb": _peak_rss_kb(),
+        "ari": adjusted_rand_index(truth.loc[cell_labels].values, labels),
+    }
+
+
+# BASELINE COMPARISON
+def compare(run, baseline):
+    """
+    Return (report lines, number of regressions) for run against baseline
+    """
+    lines = []
+    regressions = 0
+    base_scenarios = {s["name"]: s for s in baseline["scenarios"]}
+
+    for scenario in run["scenarios"]:
+        base = base_scenarios.get(scenario["name"])
+        if base is None:
+            lines.append(f"{scenario['name']}: no baseline")
+            continue
+
+        lines.append(f"{scenario['name']}:")
+        lines.append(f"  {'stage':<22}{'baseline':>10}{'current':>10}{'ratio':>8}  status")
+
+        for name in STAGES:
+            cur = scenario["stages"][name]
+            old = base["stages"].get(name)
+            if old is None:
+                lines.append(f"  {name:<22}{'-':>10}{cur['wall_sec']:>10.3f}{'':>8}  new")
+                continue
+
+            ratio = cur["wall_sec"] / max(old["wall_sec"], 1e-9)
+            status = "ok"
+
+            if (ratio > 1 + BUDGETS[name]
+                    and cur["wall_sec"] - old["wall_sec"] > MIN_DELTA_SEC):
+                status = f"REGRESSION (budget +{BUDGETS[name]:.0%})"
+                regressions += 1
+            elif (cur["rss_growth_kb"] > old["rss_growth_kb"] * (1 + MEMORY_BUDGET)
+                    and cur["rss_growth_kb"] - old["rss_growth_kb"] > MIN_DELTA_KB):
+                status = (f"MEMORY REGRESSION ({old['rss_growth_kb'] / 1024:.0f} → "
+                          f"{cur['rss_growth_kb'] / 1024:.0f} MB)")
+                regressions += 1
+            elif ratio < 1 - BUDGETS[name]:
+                status = "faster"
+
+            lines.append(f"  {name:<22}{old['wall_sec']:>10.3f}"
+                         f"{cur['wall_sec']:>10.3f}{ratio:>8.2f}  {status}")
+
+        ari_status = "ok"
+        if scenario["ari"] < base["ari"] - 1e-9:
+            ari_status = "ACCURACY REGRESSION"
+            regressions += 1
+        lines.append(f"  {'ARI':<22}{base['ari']:>10.3f}{scenario['ari']:>10.3f}"
+                     f"{'':>8}  {ari_status}")
+
+    return lines, regressions
+
+
+# DATASETS
+def ensure_dataset(cache_dir, name, spec, seed):
+    """
+    Generate (or reuse) the synthetic dataset for one scenario
+    """
+    data_dir = os.path.join(cache_dir, f"{name}_seed{seed}")
+    if os.path.exists(os.path.join(data_dir, "ground_truth_cell_to_link.csv")):
+        return data_dir
+
+    synth.generate(
+        data_dir, spec["num_cells"], spec["num_links"], spec["duration_sec"],
+        seed=seed, jobs=os.cpu_count()
+    )
+    return data_dir
+
+
+# MAIN
+def main():
+    parser = argparse.ArgumentParser(
+        description="Per-stage wall/CPU/memory benchmark of the pipeline"
+    )
+    parser.add_argument("--scenarios", nargs="+", default=list(SCENARIOS))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data-cache",
+                        help="keep generated datasets here between runs")
+    parser.add_argument("--history", default=HISTORY_FILE)
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--update-baseline", action="store_true",
+                        help="store this run as the new baseline")
+    parser.add_argument("--measure", nargs=3, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    # Child mode: measure one dataset and print JSON
+    if args.measure is not None:
+        data_dir, num_cells, num_links = args.measure
+        print(json.dumps(measure_scenario(data_dir, int(num_cells), int(num_links))))
+        return
+
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {sorted(unknown)}")
+
+    cache_dir = args.data_cache or tempfile.mkdtemp(prefix="fh_bench_data_")
+    os.makedirs(cache_dir, exist_ok=True)
+
+    run = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "cpu_count": os.cpu_count(),
+        "seed": args.seed,
+        "scenarios": []
+    }
+
+    try:
+        for name in args.scenarios:
+            spec = SCENARIOS[name]
+            print(f"\nScenario {name}: {spec['num_cells']} cells, "
+                  f"{spec['num_links']} links, {spec['duration_sec']}s")
+
+            data_dir = ensure_dataset(cache_dir, name, spec, args.seed)
+            proc = subprocess.run(
+                [sys.executable, __file__, "--measure", data_dir,
+                 str(spec["num_cells"]), str(spec["num_links"])],
+                capture_output=True, text=True, check=True
+            )
+            result = {"name": name, **spec,
+                      **json.loads(proc.stdout.strip().splitlines()[-1])}
+            run["scenarios"].append(result)
+
+            for stage in STAGES:
+                s = result["stages"][stage]
+                print(f"  {stage:<22}{s['wall_sec']:>8.3f}s wall "
+                      f"{s['cpu_sec']:>8.3f}s cpu "
+                      f"{s['peak_rss_kb'] / 1024:>7.0f} MB rss "
+                      f"{s['output_bytes'] / 1e6:>8.2f} MB out")
+            print(f"  {'total':<22}{result['total_wall_sec']:>8.3f}s   "
+                  f"ARI {result['ari']:.3f}")
+    finally:
+        if args.data_cache is None:
+            shutil.rmtree(cache_dir, ignore_errors=True)
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.history)), exist_ok=True)
+    with open(args.history, "a") as f:
+        f.write(json.dumps(run) + "\n")
+    print(f"\nAppended results to {args.history}")
+
+    regressions = 0
+    if args.update_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(run, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+        print(f"\nComparison against baseline from {baseline['timestamp']}:")
+        lines, regressions = compare(run, baseline)
+        print("\n".join(lines))
+        print(f"\n{regressions} regression(s)")
+    else:
+        print("No baseline found; rerun with --update-baseline to store one")
+
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
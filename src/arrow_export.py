@@ -0,0 +1,248 @@
+import os
+import argparse
+import numpy as np
+import pandas as pd
+
+import instrumentation as instr
+import pipeline
+import link_traffic_store
+import preprocess_member1 as member1
+
+try:
+    import pyarrow as pa
+except ImportError:             # optional: pip install pyarrow
+    pa = None
+
+# PATHS
+ARROW_DIR = os.path.join(pipeline.OUTPUT_DIR, "arrow")
+
+# DATASETS
+# Each dataset is one uncompressed Arrow IPC file (= Feather v2), so readers
+# can memory-map it and use the columns in place:
+#
+#   cell_throughput.arrow  cell u16, timestamp_slot f64, data_rate_gbps f64
+#   cell_loss.arrow        cell u16, timestamp_slot f64, loss_ratio f64
+#   link_traffic.arrow     link u16, slot i64, data_rate_gbps f64
+#   signal_matrix.arrow    cell u16, window u32, loss_ratio f64
+#
+# Tables are long and sorted by their first column. Per-cell and per-link
+# files hold one record batch per cell / link; the signal matrix is a single
+# batch in row-major order, so its loss_ratio column reshapes to the matrix.
+FILES = {
+    "cell_throughput": "cell_throughput.arrow",
+    "cell_loss": "cell_loss.arrow",
+    "link_traffic": "link_traffic.arrow",
+    "signal_matrix": "signal_matrix.arrow",
+}
+
+
+def _require():
+    if pa is None:
+        raise ImportError("Arrow export needs pyarrow: pip install pyarrow")
+
+
+def schemas():
+    _require()
+    slot = {b"slot_sec": str(member1.SLOT_DURATION_SEC).encode()}
+    return {
+        "cell_throughput": pa.schema([
+            ("cell", pa.uint16()),
+            ("timestamp_slot", pa.float64()),
+            ("data_rate_gbps", pa.float64()),
+        ], metadata=slot),
+        "cell_loss": pa.schema([
+            ("cell", pa.uint16()),
+            ("timestamp_slot", pa.float64()),
+            ("loss_ratio", pa.float64()),
+        ], metadata=slot),
+        "link_traffic": pa.schema([
+            ("link", pa.uint16()),
+            ("slot", pa.int64()),
+            ("data_rate_gbps", pa.float64()),
+        ], metadata=slot),
+        "signal_matrix": pa.schema([
+            ("cell", pa.uint16()),
+            ("window", pa.uint32()),
+            ("loss_ratio", pa.float64()),
+        ]),
+    }
+
+
+# WRITING
+def write_batches(path, schema, batches):
+    """
+    Stream (key, {column: array}) pairs into one IPC file, one record batch
+    each; nothing but the current batch is held in memory
+    """
+    key_name = schema.names[0]
+    with pa.OSFile(path, "wb") as sink, pa.ipc.new_file(sink, schema) as writer:
+        for key, columns in batches:
+            n = len(columns[schema.names[1]])
+            arrays = [pa.array(np.full(n, key), type=schema.field(key_name).type)]
+            arrays += [
+                pa.array(np.asarray(columns[name]), type=schema.field(name).type)
+                for name in schema.names[1:]
+            ]
+            writer.write_batch(pa.record_batch(arrays, schema=schema))
+    instr.count_file(path)
+
+
+def _link_batches(link_traces):
+    for link_id, traffic in link_traces:
+        yield link_id, {"slot": np.arange(len(traffic)), "data_rate_gbps": traffic}
+
+
+def write_signal_matrix(path, cell_ids, signal_matrix):
+    schema = schemas()["signal_matrix"]
+    num_cells, num_windows = signal_matrix.shape
+    batch = pa.record_batch([
+        pa.array(np.repeat(np.asarray(cell_ids), num_windows), type=pa.uint16()),
+        pa.array(np.tile(np.arange(num_windows), num_cells), type=pa.uint32()),
+        pa.array(np.ascontiguousarray(signal_matrix, dtype=np.float64).ravel()),
+    ], schema=schema)
+    with pa.OSFile(path, "wb") as sink, pa.ipc.new_file(sink, schema) as writer:
+        writer.write_batch(batch)
+    instr.count_file(path)
+
+
+def export_result(result, arrow_dir=ARROW_DIR):
+    """
+    Write the datasets of an in-memory pipeline.run() result
+    """
+    _require()
+    os.makedirs(arrow_dir, exist_ok=True)
+    s = schemas()
+    path = lambda name: os.path.join(arrow_dir, FILES[name])
+
+    write_batches(path("cell_throughput"), s["cell_throughput"], sorted(result["throughput"].items()))
+    write_batches(path("cell_loss"), s["cell_loss"], sorted(result["pktloss"].items()))
+    write_batches(path("link_traffic"), s["link_traffic"],
+                  _link_batches(sorted(result["link_traffic"].items())))
+    write_signal_matrix(path("signal_matrix"), result["cell_ids"], result["signal_matrix"])
+
+
+def _cleaned_batches(clean_dir, prefix):
+    cells = sorted(
+        int(f[len(prefix):-len(".csv")]) for f in os.listdir(clean_dir)
+        if f.startswith(prefix) and f.endswith(".csv")
+    )
+    for cell_id in cells:
+        file_path = os.path.join(clean_dir, f"{prefix}{cell_id}.csv")
+        instr.count_file(file_path, "bytes_read")
+        yield cell_id, pd.read_csv(file_path)
+
+
+def export_outputs(out_dir=pipeline.OUTPUT_DIR, arrow_dir=None):
+    """
+    Write the datasets from an existing output/ tree, one cell or link at a
+    time (works for chunked runs too)
+    """
+    _require()
+    arrow_dir = os.path.join(out_dir, "arrow") if arrow_dir is None else arrow_dir
+    os.makedirs(arrow_dir, exist_ok=True)
+    s = schemas()
+    path = lambda name: os.path.join(arrow_dir, FILES[name])
+    clean_dir = os.path.join(out_dir, "cleaned")
+
+    write_batches(path("cell_throughput"), s["cell_throughput"],
+                  _cleaned_batches(clean_dir, "throughput_slot_cell_"))
+    write_batches(path("cell_loss"), s["cell_loss"],
+                  _cleaned_batches(clean_dir, "pktloss_slot_cell_"))
+
+    link_dir = os.path.join(out_dir, "link_traffic")
+    write_batches(path("link_traffic"), s["link_traffic"], _link_batches(
+        (link_id, link_traffic_store.load_link(file_path))
+        for link_id, file_path in link_traffic_store.link_files(link_dir).items()
+    ))
+
+    member2_dir = os.path.join(out_dir, "member2")
+    signal_matrix = np.load(os.path.join(member2_dir, "signal_matrix.npy"), mmap_mode="r")
+    labels = pd.read_csv(os.path.join(member2_dir, "signal_matrix.csv"), usecols=[0]).iloc[:, 0]
+    cell_ids = labels.str.replace("cell_", "").astype(int).values
+    write_signal_matrix(path("signal_matrix"), cell_ids, signal_matrix)
+
+
+# READING
+def open_table(path):
+    """
+    Memory-mapped pyarrow Table: no bytes are copied or parsed until a
+    column is touched, and then only the pages it covers are read
+    """
+    _require()
+    return pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+
+
+def _view(array):
+    # Raises instead of silently copying when a view isn't possible
+    return array.to_numpy(zero_copy_only=True)
+
+
+def load_series(path):
+    """
+    {cell or link id: {column: numpy view}} for a per-cell / per-link file
+    """
+    _require()
+    reader = pa.ipc.open_file(pa.memory_map(path, "r"))
+    series = {}
+    for i in range(reader.num_record_batches):
+        batch = reader.get_batch(i)
+        if batch.num_rows == 0:
+            continue
+        key = batch.column(0)[0].as_py()
+        series[key] = {
+            name: _view(batch.column(name)) for name in batch.schema.names[1:]
+        }
+    return series
+
+
+def load_link_traffic(path):
+    """
+    {link_id: per-slot Gbps view}
+    """
+    return {k: v["data_rate_gbps"] for k, v in load_series(path).items()}
+
+
+def load_signal_matrix(path):
+    """
+    (cell_ids, signal_matrix) where signal_matrix is a read-only view of
+    the mapped file
+    """
+    table = open_table(path)
+    cells = _view(table.column("cell").combine_chunks())
+    windows = _view(table.column("window").combine_chunks())
+    if not len(windows):
+        # Zero rows keep neither the cell ids nor the matrix shape
+        raise ValueError(f"{path}: signal matrix has no windows")
+    num_windows = int(windows.max()) + 1
+    values = table.column("loss_ratio")
+    if values.num_chunks != 1:
+        raise ValueError(f"{path}: expected a single record batch")
+    return cells[::num_windows].astype(int), _view(values.chunk(0)).reshape(-1, num_windows)
+
+
+# MAIN
+def main():
+    parser = argparse.ArgumentParser(
+        description="Export pipeline outputs as memory-mappable Arrow IPC files"
+    )
+    parser.add_argument("--out-dir", default=pipeline.OUTPUT_DIR,
+                        help="existing output/ tree to export")
+    parser.add_argument("--arrow-dir", default=None,
+                        help="where to write (default <out-dir>/arrow)")
+    instr.add_arguments(parser)
+    args = parser.parse_args()
+
+    instr.configure_from_args(args)
+
+    arrow_dir = args.arrow_dir or os.path.join(args.out_dir, "arrow")
+    with instr.span("arrow_export"):
+        export_outputs(args.out_dir, arrow_dir)
+
+    for name, fname in FILES.items():
+        table = open_table(os.path.join(arrow_dir, fname))
+        print(f"{fname}: {table.num_rows} rows, "
+              f"{os.path.getsize(os.path.join(arrow_dir, fname)) / 1e6:.2f} MB")
+
+
+if __name__ == "__main__":
+    main()
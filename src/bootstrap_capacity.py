@@ -0,0 +1,160 @@
+import os
+import argparse
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+
+import instrumentation as instr
+import link_traffic_store
+import estimate_capacity_no_buffer as cap_no_buf
+import estimate_capacity_with_buffer as cap_buf
+import estimate_capacity_batched as batched
+
+# PATHS
+LINK_TRAFFIC_DIR = cap_no_buf.LINK_TRAFFIC_DIR
+OUT_DIR = cap_no_buf.OUT_DIR
+
+# PARAMETERS
+NUM_RESAMPLES = 1000
+BLOCK_SLOTS = 200            # 100 ms blocks, ~10× the mean burst length
+CONFIDENCE = 0.95
+MAX_ITER = 16                # bisection steps per resample; the bracket ends
+                             # ~1e-4 Gbps wide, below the 3-decimal output
+SEED = 0
+MAX_WORKERS = os.cpu_count()
+
+
+# RESAMPLING
+def block_indices(rng, num_slots, block_slots):
+    """
+    Slot indices of one circular block-bootstrap resample: random blocks of
+    block_slots consecutive slots (wrapping at the end) laid end to end,
+    cut to num_slots. Bursts inside a block keep their autocorrelation.
+    """
+    num_blocks = -(-num_slots // block_slots)
+    starts = rng.integers(0, num_slots, num_blocks)
+    return ((starts[:, None] + np.arange(block_slots)) % num_slots).ravel()[:num_slots]
+
+
+# WORKERS
+_SHARED = {}
+
+
+def _init_worker(link_traces, params):
+    _SHARED.update(link_traces=link_traces, params=params)
+
+
+def resample_batch(link_id, seeds, block_slots):
+    """
+    Worker: both estimates for one link's resamples, one per seed, built
+    as a resamples × slots array and estimated in one batched call
+    """
+    traffic = _SHARED["link_traces"][link_id]
+    rows = np.stack([
+        traffic[block_indices(np.random.default_rng(seed), len(traffic), block_slots)]
+        for seed in seeds
+    ])
+    avg, no_buf, with_buf, _ = batched.estimate_rows(
+        rows, np.full(len(rows), len(traffic)), *_SHARED["params"]
+    )
+    return no_buf, with_buf
+
+
+def bootstrap(link_traces, num_resamples=NUM_RESAMPLES, block_slots=BLOCK_SLOTS,
+              window=cap_no_buf.WINDOW,
+              loss_percentile=cap_no_buf.LOSS_PERCENTILE,
+              loss_limit=cap_buf.LOSS_LIMIT,
+              buffer_time_sec=cap_buf.BUFFER_TIME_SEC, max_iter=MAX_ITER,
+              seed=SEED, max_workers=MAX_WORKERS,
+              batch_elements=batched.BATCH_ELEMENTS):
+    """
+    {link_id: (no buffer, with buffer)} arrays of num_resamples bootstrap
+    estimates. Resamples go to a process pool in batches of about
+    batch_elements slots; every resample has its own child seed, so the
+    result does not depend on batching or the number of workers.
+    """
+    params = (window, loss_percentile, loss_limit, buffer_time_sec, max_iter)
+    seeds = np.random.SeedSequence(seed).spawn(num_resamples)
+    tasks = []
+    for link_id, traffic in link_traces.items():
+        per_batch = max(1, batch_elements // max(len(traffic), 1))
+        tasks += [(link_id, seeds[i:i + per_batch]) for i in range(0, num_resamples, per_batch)]
+
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                             initargs=(link_traces, params)) as pool:
+        futures = [pool.submit(resample_batch, link_id, batch, block_slots)
+                   for link_id, batch in tasks]
+        results = {link_id: ([], []) for link_id in link_traces}
+        for (link_id, _), future in zip(tasks, futures):
+            no_buf, with_buf = future.result()
+            results[link_id][0].append(no_buf)
+            results[link_id][1].append(with_buf)
+    instr.count("resamples", num_resamples * len(link_traces))
+
+    return {k: (np.concatenate(v[0]), np.concatenate(v[1])) for k, v in results.items()}
+
+
+def interval_table(point, resamples, confidence=CONFIDENCE):
+    """
+    Percentile bootstrap interval per link and estimator, next to the
+    point estimate of the capacity CSVs
+    """
+    tail = (1.0 - confidence) / 2 * 100
+    rows = []
+    for _, row in point.iterrows():
+        link_id = int(row["Link"].split()[-1])
+        for label, values in zip(["No_Buffer", "With_Buffer"], resamples[link_id]):
+            low, high = np.percentile(values, [tail, 100 - tail])
+            rows.append({
+                "Link": row["Link"],
+                "Estimator": label,
+                "Point_Gbps": row[f"Required_Capacity_{label}_Gbps"],
+                "Bootstrap_Mean_Gbps": round(float(values.mean()), 3),
+                "Bootstrap_Std_Gbps": round(float(values.std(ddof=1)), 3),
+                "CI_Low_Gbps": round(float(low), 3),
+                "CI_High_Gbps": round(float(high), 3),
+            })
+    return pd.DataFrame(rows)
+
+
+# MAIN
+def main(link_traffic_dir=LINK_TRAFFIC_DIR, out_dir=OUT_DIR,
+         num_resamples=NUM_RESAMPLES, block_slots=BLOCK_SLOTS,
+         confidence=CONFIDENCE, seed=SEED, max_workers=MAX_WORKERS):
+    os.makedirs(out_dir, exist_ok=True)
+
+    link_traces = link_traffic_store.load_links(link_traffic_dir)
+    point = batched.estimate_capacity(link_traces)
+
+    print(f"{num_resamples} resamples per link, {block_slots}-slot blocks")
+    with instr.span("bootstrap", links=len(link_traces), resamples=num_resamples):
+        resamples = bootstrap(link_traces, num_resamples, block_slots,
+                              seed=seed, max_workers=max_workers)
+    intervals = interval_table(point, resamples, confidence)
+
+    out_file = os.path.join(out_dir, "required_capacity_confidence_intervals.csv")
+    intervals.to_csv(out_file, index=False)
+    instr.count_file(out_file)
+
+    print(intervals.to_string(index=False))
+    print(f"Saved: {out_file}")
+    return intervals
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Block-bootstrap confidence intervals for both capacity estimates"
+    )
+    parser.add_argument("--link-traffic-dir", default=LINK_TRAFFIC_DIR)
+    parser.add_argument("--out-dir", default=OUT_DIR)
+    parser.add_argument("--resamples", type=int, default=NUM_RESAMPLES)
+    parser.add_argument("--block-slots", type=int, default=BLOCK_SLOTS)
+    parser.add_argument("--confidence", type=float, default=CONFIDENCE)
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--jobs", type=int, default=MAX_WORKERS)
+    instr.add_arguments(parser)
+    args = parser.parse_args()
+
+    instr.configure_from_args(args)
+    main(args.link_traffic_dir, args.out_dir, args.resamples, args.block_slots,
+         args.confidence, args.seed, args.jobs)
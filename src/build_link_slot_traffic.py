@@ -2,124 +2,100 @@ import os
 import pandas as pd
 import numpy as np
 
+import instrumentation as instr
+import link_traffic_store
+
 # PATHS
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 CLEAN_DIR = os.path.join(BASE_DIR, "output", "cleaned")
 TOPO_DIR = os.path.join(BASE_DIR, "output", "member3")
 OUT_DIR = os.path.join(BASE_DIR, "output", "link_traffic")
 
-os.makedirs(OUT_DIR, exist_ok=True)
+# CELL → LINK MAPPING
+def link_groups_from_mapping(mapping_df):
+    """
+    {link_id: [cell_id, ...]} from a Cell / Link_ID mapping table
+    """
+    # Convert "Cell 3" → 3
+    cell_ids = mapping_df["Cell"].str.extract(r"(\d+)")[0].astype(int)
+
+    # Group cells by link
+    return (
+        pd.Series(cell_ids.values, index=mapping_df["Link_ID"].values)
+        .groupby(level=0)
+        .apply(list)
+        .to_dict()
+    )
 
-# LOAD CELL → LINK MAPPING
-mapping_file = os.path.join(TOPO_DIR, "cell_to_link_mapping.csv")
+# PER-CELL TRAFFIC
+def load_cell_traces(clean_dir, cell_ids):
+    """
+    {cell_id: per-slot Gbps} from the cleaned throughput CSVs
+    """
+    cells = {}
+    for cell_id in cell_ids:
+        file_path = os.path.join(clean_dir, f"throughput_slot_cell_{cell_id}.csv")
+        if not os.path.exists(file_path):
+            raise FileNotFoundError(file_path)
+        cells[cell_id] = pd.read_csv(file_path)["data_rate_gbps"].values
+        instr.count_file(file_path, "bytes_read")
+    return cells
 
-if not os.path.exists(mapping_file):
-    raise FileNotFoundError(mapping_file)
+# AGGREGATE PER-SLOT TRAFFIC (TIME-ALIGNED)
+def sum_cell_traces(cell_traces):
+    """
+    Slot-wise sum of several per-cell Gbps traces, trimmed to the shortest
+    """
+    min_len = min(len(x) for x in cell_traces)
+    return np.sum([x[:min_len] for x in cell_traces], axis=0)
 
-mapping_df = pd.read_csv(mapping_file)
+def aggregate_links(cell_rates, link_groups):
+    """
+    {link_id: per-slot Gbps} from {cell_id: per-slot Gbps} and the groups
+    """
+    traffic = {}
+    for link_id, cells in link_groups.items():
+        with instr.span("link_aggregation", link=int(link_id), cells=len(cells)):
+            traffic[link_id] = sum_cell_traces([cell_rates[c] for c in cells])
+    return traffic
 
-# Convert "Cell 3" → 3
-mapping_df["cell_id"] = (
-    mapping_df["Cell"].str.extract(r"(\d+)").astype(int)
-)
+# MAIN
+def main(clean_dir=CLEAN_DIR, topo_dir=TOPO_DIR, out_dir=OUT_DIR):
+    os.makedirs(out_dir, exist_ok=True)
 
-# Group cells by link
-link_groups = (
-    mapping_df.groupby("Link_ID")["cell_id"]
-    .apply(list)
-    .to_dict()
-)
+    # LOAD CELL → LINK MAPPING
+    mapping_file = os.path.join(topo_dir, "cell_to_link_mapping.csv")
 
-print("\nCell → Link mapping:")
-for link, cells in link_groups.items():
-    print(f"Link {link}: Cells {cells}")
+    if not os.path.exists(mapping_file):
+        raise FileNotFoundError(mapping_file)
 
-# AGGREGATE PER-SLOT TRAFFIC (TIME-ALIGNED)
-for link_id, cells in link_groups.items():
+    link_groups = link_groups_from_mapping(pd.read_csv(mapping_file))
+    link_traffic_store.clear_links(out_dir)
 
-    print(f"\nProcessing Link {link_id}...")
+    print("\nCell → Link mapping:")
+    for link, cells in link_groups.items():
+        print(f"Link {link}: Cells {cells}")
 
-    merged = None
+    # Load each cell once, then trim and sum slot-wise per link
+    cell_ids = sorted({c for cells in link_groups.values() for c in cells})
+    traffic = aggregate_links(load_cell_traces(clean_dir, cell_ids), link_groups)
 
-    for cell_id in cells:
-        file_path = os.path.join(
-            CLEAN_DIR, f"throughput_slot_cell_{cell_id}.csv"
-        )
+    for link_id, link_traffic in traffic.items():
 
-        if not os.path.exists(file_path):
-            raise FileNotFoundError(file_path)
+        print(f"\nProcessing Link {link_id}...")
 
-        df = pd.read_csv(file_path)
-
-        # Keep only timestamp + rate
-        df = df[["timestamp_slot", "data_rate_gbps"]].copy()
-        df.rename(
-            columns={"data_rate_gbps": f"cell_{cell_id}_gbps"},
-            inplace=True
-        )
-
-        if merged is None:
-            merged = df
-        else:
-            # Load per-cell traffic
-            cell_traces = []
-
-            for cell_id in cells:
-                df = pd.read_csv(
-                    os.path.join(
-                        CLEAN_DIR,
-                        f"throughput_slot_cell_{cell_id}.csv"
-                    )
-                )
-
-                cell_traces.append(df["data_rate_gbps"].values)
-
-            # Trim all cells to same length
-            min_len = min(len(x) for x in cell_traces)
-            cell_traces = [x[:min_len] for x in cell_traces]
-
-            # Sum slot-wise
-            link_traffic = np.sum(cell_traces, axis=0)
-
-            out_df = pd.DataFrame({
-                "slot_index": np.arange(min_len),
-                "data_rate_gbps": link_traffic
-            })
-
-            out_df.to_csv(
-                os.path.join(
-                    OUT_DIR,
-                    f"link_{link_id}_slot_traffic.csv"
-                ),
-                index=False
-            )
-
-        # Fill missing cell values with 0 (no traffic)
-        cell_cols = [c for c in merged.columns if c.endswith("_gbps")]
-        merged[cell_cols] = merged[cell_cols].fillna(0.0)
-
-
-    if merged is None or merged.empty:
-        print(f"[WARN] No aligned data for Link {link_id}, skipping.")
-        continue
-
-    # Sum Gbps across aligned cells
-    cell_cols = [c for c in merged.columns if c.endswith("_gbps")]
-    merged["data_rate_gbps"] = merged[cell_cols].sum(axis=1)
-
-    # Create slot index AFTER alignment
-    merged = merged.reset_index(drop=True)
-    merged.insert(0, "slot_index", range(len(merged)))
-
-    # Save output
-    out_file = os.path.join(
-        OUT_DIR, f"link_{link_id}_slot_traffic.csv"
-    )
+        if len(link_traffic) == 0:
+            print(f"[WARN] No aligned data for Link {link_id}, skipping.")
+            continue
 
-    merged[["slot_index", "data_rate_gbps"]].to_csv(
-        out_file, index=False
-    )
+        # Save output
+        out_file = link_traffic_store.link_path(out_dir, link_id)
+        link_traffic_store.write(out_file, link_traffic)
+
+        print(f"Saved: {out_file}")
+
+    print("\nAggregated per-slot link traffic generation complete.")
 
-    print(f"Saved: {out_file}")
 
-print("\nAggregated per-slot link traffic generation complete.")
+if __name__ == "__main__":
+    main()
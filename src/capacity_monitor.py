@@ -0,0 +1,370 @@
+import os
+import time
+import asyncio
+import argparse
+from collections import deque
+import numpy as np
+import pandas as pd
+
+import instrumentation as instr
+import pipeline
+import live_tail
+import build_link_slot_traffic as link_traffic
+import estimate_capacity_no_buffer as cap_no_buf
+import estimate_capacity_with_buffer as cap_buf
+
+# PATHS
+CAPACITY_FILE = os.path.join(
+    pipeline.OUTPUT_DIR, "capacity", "required_capacity_with_buffer.csv"
+)
+NO_BUFFER_CAPACITY_FILE = os.path.join(
+    pipeline.OUTPUT_DIR, "capacity", "required_capacity_no_buffer.csv"
+)
+ALERT_FILE = os.path.join(pipeline.OUTPUT_DIR, "monitor", "alerts.csv")
+
+# PARAMETERS
+SLOTS_PER_SEC = int(round(1.0 / cap_buf.SLOT_TIME_SEC))
+HORIZON_SEC = 300            # "last N minutes" the ratio and quantile cover
+WARN_FRACTION = 0.8          # warn once the overflow ratio uses 80% of budget
+SKETCH_ERROR = 0.01          # relative error of the quantile sketch
+SKETCH_MIN_GBPS = 1e-3       # smaller rates count as idle
+SKETCH_MAX_GBPS = 1e4
+
+
+# ROLLING QUANTILE SKETCH
+class SlidingQuantile:
+    """
+    Quantiles of the last `horizon` seconds of a stream. Values go into
+    log-spaced bins (relative error SKETCH_ERROR); each second keeps its own
+    bin counts so the oldest second can be subtracted when it expires.
+    Adding a value is O(1); a query is O(bins).
+    """
+
+    def __init__(self, horizon, error=SKETCH_ERROR):
+        self.gamma = (1 + error) / (1 - error)
+        self.log_gamma = np.log(self.gamma)
+        self.offset = int(np.floor(np.log(SKETCH_MIN_GBPS) / self.log_gamma))
+        num_bins = int(np.ceil(np.log(SKETCH_MAX_GBPS) / self.log_gamma)) - self.offset + 1
+
+        # Bin 0 holds idle slots
+        self.total = np.zeros(num_bins + 1, dtype=np.int64)
+        self.current = np.zeros_like(self.total)
+        self.seconds = deque()
+        self.horizon = horizon
+
+    def bins(self, values):
+        values = np.asarray(values, dtype=float)
+        idx = np.zeros(len(values), dtype=np.int64)
+        busy = values >= SKETCH_MIN_GBPS
+        idx[busy] = np.clip(
+            np.ceil(np.log(values[busy]) / self.log_gamma).astype(np.int64) - self.offset,
+            1, len(self.total) - 1
+        )
+        return idx
+
+    def add(self, values):
+        self.current += np.bincount(self.bins(values), minlength=len(self.current))
+
+    def close_second(self):
+        self.seconds.append(self.current)
+        self.total += self.current
+        self.current = np.zeros_like(self.total)
+
+        if len(self.seconds) > self.horizon:
+            self.total -= self.seconds.popleft()
+
+    def count(self):
+        return int(self.total.sum())
+
+    def quantile(self, q):
+        """
+        np.percentile-style rank q·(n-1), returned as the bin's midpoint
+        """
+        n = self.count()
+        if n == 0:
+            return 0.0
+
+        i = int(np.searchsorted(np.cumsum(self.total), q * (n - 1), side="right"))
+        if i == 0:
+            return 0.0
+        return 2 * self.gamma ** (i + self.offset) / (self.gamma + 1)
+
+
+# PER-LINK MONITOR
+class LinkMonitor:
+    """
+    Streaming version of the buffered estimator's model for one link: the
+    same WINDOW moving average feeds the buffer simulation at a fixed
+    capacity, one second of slots at a time, carrying the buffer across
+    calls. Keeps per-second overflow counts and a quantile sketch of the
+    windowed traffic over the last horizon_sec. The sketch quantile is the
+    no-buffer estimate, so it is checked against the no-buffer capacity
+    (no check when that is None), not the buffered one.
+    """
+
+    def __init__(self, link_id, capacity_gbps, horizon_sec=HORIZON_SEC,
+                 window=cap_buf.WINDOW, loss_limit=cap_buf.LOSS_LIMIT,
+                 loss_percentile=cap_no_buf.LOSS_PERCENTILE,
+                 buffer_time_sec=cap_buf.BUFFER_TIME_SEC,
+                 no_buffer_capacity_gbps=None):
+        self.link_id = link_id
+        self.capacity = capacity_gbps
+        self.no_buffer_capacity = no_buffer_capacity_gbps
+        self.window = window
+        self.loss_limit = loss_limit
+        self.loss_percentile = loss_percentile
+        self.buffer_time_sec = buffer_time_sec
+        self.horizon = horizon_sec
+
+        self.tail = np.empty(0)       # last window-1 raw slots
+        self.pending = np.empty(0)    # windowed slots of the unfinished second
+        self.buffer = 0.0
+        self.sketch = SlidingQuantile(horizon_sec)
+
+        # (loss slots, traffic slots) per finished second
+        self.seconds = deque()
+        self.loss_slots = 0
+        self.traffic_slots = 0
+        self.seconds_seen = 0
+
+    def update(self, traffic):
+        """
+        Feed new raw link slots; returns the status of every second they
+        completed
+        """
+        raw = np.concatenate([self.tail, traffic])
+        if len(raw) < self.window:
+            self.tail = raw
+            return []
+        self.tail = raw[len(raw) - self.window + 1:]
+
+        windowed = np.convolve(raw, np.ones(self.window) / self.window, mode="valid")
+        self.pending = np.concatenate([self.pending, windowed])
+
+        statuses = []
+        while len(self.pending) >= SLOTS_PER_SEC:
+            second, self.pending = (
+                self.pending[:SLOTS_PER_SEC], self.pending[SLOTS_PER_SEC:]
+            )
+            statuses.append(self.close_second(second))
+        return statuses
+
+    def close_second(self, windowed):
+        self.buffer, loss, traffic = cap_buf.simulate_buffer(
+            windowed, self.capacity, self.buffer_time_sec, (self.buffer, 0, 0)
+        )
+        instr.count("slots_simulated", len(windowed))
+        self.sketch.add(windowed)
+        self.sketch.close_second()
+
+        self.seconds.append((loss, traffic))
+        self.loss_slots += loss
+        self.traffic_slots += traffic
+        if len(self.seconds) > self.horizon:
+            old_loss, old_traffic = self.seconds.popleft()
+            self.loss_slots -= old_loss
+            self.traffic_slots -= old_traffic
+        self.seconds_seen += 1
+
+        return self.status(loss, traffic)
+
+    def status(self, loss, traffic):
+        ratio = self.loss_slots / self.traffic_slots if self.traffic_slots else 0.0
+        needed = self.sketch.quantile(self.loss_percentile / 100)
+        over_no_buffer = (self.no_buffer_capacity is not None
+                          and needed > self.no_buffer_capacity)
+
+        if ratio > self.loss_limit:
+            level = "BREACH"
+        elif ratio > WARN_FRACTION * self.loss_limit or over_no_buffer:
+            level = "WARN"
+        else:
+            level = "OK"
+
+        return {
+            "Second": self.seconds_seen,
+            "Link": f"Link {self.link_id}",
+            "Capacity_Gbps": round(self.capacity, 3),
+            "Overflow_Ratio_1s": round(loss / traffic, 4) if traffic else 0.0,
+            "Overflow_Ratio_Window": round(ratio, 4),
+            "Needed_Capacity_Window_Gbps": round(needed, 3),
+            "No_Buffer_Capacity_Gbps": (None if self.no_buffer_capacity is None
+                                        else round(self.no_buffer_capacity, 3)),
+            "Status": level,
+        }
+
+
+# CONFIGURED CAPACITIES
+def load_capacities(path=CAPACITY_FILE, column="Required_Capacity_With_Buffer_Gbps"):
+    """
+    {link_id: Gbps} from a required_capacity_with_buffer.csv (or the
+    no-buffer CSV with column="Required_Capacity_No_Buffer_Gbps")
+    """
+    df = pd.read_csv(path)
+    link_ids = df["Link"].str.extract(r"(\d+)")[0].astype(int)
+    return dict(zip(link_ids, df[column]))
+
+
+def load_no_buffer_capacities(path=NO_BUFFER_CAPACITY_FILE):
+    """
+    {link_id: Gbps} the windowed quantile is checked against, or None if
+    there is no no-buffer CSV
+    """
+    if not os.path.exists(path):
+        return None
+    return load_capacities(path, "Required_Capacity_No_Buffer_Gbps")
+
+
+# MONITOR LOOP
+def record_alert(status, alert_file):
+    os.makedirs(os.path.dirname(alert_file), exist_ok=True)
+    pd.DataFrame([{"time": time.time(), **status}]).to_csv(
+        alert_file, mode="a", header=not os.path.exists(alert_file), index=False
+    )
+
+
+def poll_links(store, monitors, link_groups, consumed, alert_file=None):
+    statuses = []
+
+    for link_id, monitor in monitors.items():
+        cells = link_groups[link_id]
+        start, stop = store.link_span(cells)
+
+        # Rings need not start at index 0 (--from-end, late cells): the
+        # first poll starts wherever every cell of the link has slots
+        if link_id not in consumed:
+            if stop <= start:
+                continue
+            consumed[link_id] = start
+
+        # Fell further behind than the rings hold: restart from what is left
+        if consumed[link_id] < start:
+            print(f"[WARN] Link {link_id}: skipped {start - consumed[link_id]} slots")
+            consumed[link_id] = start
+
+        # A cell's file was rotated and its slots renumbered from 0
+        if consumed[link_id] > stop:
+            print(f"[WARN] Link {link_id}: slot numbering restarted")
+            consumed[link_id] = start
+        start = consumed[link_id]
+        if stop <= start:
+            continue
+
+        with instr.span("monitor_update", link=int(link_id), slots=stop - start):
+            new = monitor.update(store.link_traffic(cells, start, stop))
+        consumed[link_id] = stop
+
+        for status in new:
+            if status["Status"] != "OK":
+                no_buffer = status["No_Buffer_Capacity_Gbps"]
+                print(f"[ALERT] {status['Link']} {status['Status']}: "
+                      f"overflow {status['Overflow_Ratio_Window']:.2%} over "
+                      f"{monitor.horizon}s at {status['Capacity_Gbps']:.3f} Gbps, "
+                      f"no-buffer need {status['Needed_Capacity_Window_Gbps']:.3f}"
+                      + ("" if no_buffer is None else f" of {no_buffer:.3f}") + " Gbps")
+                if alert_file:
+                    record_alert(status, alert_file)
+        statuses.extend(new)
+
+    return statuses
+
+
+async def monitor(store, monitors, link_groups, poll_sec=1.0,
+                  alert_file=ALERT_FILE, verbose=True):
+    consumed = {}
+    while True:
+        await asyncio.sleep(poll_sec)
+        statuses = poll_links(store, monitors, link_groups, consumed, alert_file)
+        if verbose and statuses:
+            latest = pd.DataFrame(statuses).groupby("Link").tail(1)
+            print(latest.to_string(index=False))
+
+
+async def run(data_dir=live_tail.DATA_DIR, link_groups=None, capacities=None,
+              horizon_sec=HORIZON_SEC, ring_slots=live_tail.RING_SLOTS,
+              poll_sec=live_tail.POLL_SEC, from_end=False, duration_sec=None,
+              alert_file=ALERT_FILE, no_buffer_capacities=None, **params):
+    """
+    Tail the cells of every link in link_groups and monitor each link at
+    its configured capacity until cancelled (or for duration_sec)
+    """
+    no_buffer_capacities = no_buffer_capacities or {}
+    p = {**pipeline.PARAMS, **params}
+    cells = sorted({c for cs in link_groups.values() for c in cs})
+
+    store = live_tail.LiveStore(cells, data_dir, ring_slots, from_end)
+    monitors = {
+        link_id: LinkMonitor(
+            link_id, capacities[link_id], horizon_sec, p["window"],
+            p["loss_limit"], p["loss_percentile"], p["buffer_time_sec"],
+            no_buffer_capacities.get(link_id)
+        )
+        for link_id in sorted(link_groups) if link_id in capacities
+    }
+
+    tasks = [
+        asyncio.create_task(live_tail.tail_cell(s, poll_sec))
+        for s in store.streams.values()
+    ]
+    tasks.append(asyncio.create_task(
+        monitor(store, monitors, link_groups, 1.0, alert_file)
+    ))
+
+    try:
+        if duration_sec is None:
+            await asyncio.gather(*tasks)
+        else:
+            await asyncio.sleep(duration_sec)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    return monitors
+
+
+# MAIN
+def main():
+    parser = argparse.ArgumentParser(
+        description="Watch live link traffic against the configured capacities"
+    )
+    parser.add_argument("--data-dir", default=live_tail.DATA_DIR)
+    parser.add_argument("--mapping", default=live_tail.MAPPING_FILE)
+    parser.add_argument("--capacity-file", default=CAPACITY_FILE)
+    parser.add_argument("--no-buffer-capacity-file", default=NO_BUFFER_CAPACITY_FILE,
+                        help="no-buffer capacities the windowed quantile is checked against")
+    parser.add_argument("--capacity", type=float, default=None,
+                        help="one capacity (Gbps) for every link instead")
+    parser.add_argument("--horizon", type=int, default=HORIZON_SEC,
+                        help="seconds the rolling ratio and quantile cover")
+    parser.add_argument("--ring-slots", type=int, default=live_tail.RING_SLOTS)
+    parser.add_argument("--from-end", action="store_true")
+    parser.add_argument("--duration", type=float, default=None)
+    parser.add_argument("--alerts", default=ALERT_FILE,
+                        help="CSV the alerts are appended to")
+    instr.add_arguments(parser)
+    args = parser.parse_args()
+
+    instr.configure_from_args(args)
+
+    link_groups = link_traffic.link_groups_from_mapping(pd.read_csv(args.mapping))
+    no_buffer_capacities = None
+    if args.capacity is not None:
+        capacities = {link_id: args.capacity for link_id in link_groups}
+    else:
+        capacities = load_capacities(args.capacity_file)
+        no_buffer_capacities = load_no_buffer_capacities(args.no_buffer_capacity_file)
+
+    try:
+        asyncio.run(run(
+            args.data_dir, link_groups, capacities, args.horizon,
+            args.ring_slots, from_end=args.from_end,
+            duration_sec=args.duration, alert_file=args.alerts,
+            no_buffer_capacities=no_buffer_capacities
+        ))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+import os
+import argparse
+import numpy as np
+import pandas as pd
+import seaborn as sns
+import matplotlib.pyplot as plt
+
+import instrumentation as instr
+import pipeline
+import link_traffic_store
+import preprocess_member1 as member1
+import estimate_capacity_no_buffer as cap_no_buf
+import estimate_capacity_with_buffer as cap_buf
+import estimate_capacity_batched as batched
+
+# PATHS
+LINK_TRAFFIC_DIR = cap_no_buf.LINK_TRAFFIC_DIR
+OUT_DIR = os.path.join(pipeline.OUTPUT_DIR, "profiles")
+
+# PARAMETERS
+BUCKET_SEC = 15 * 60         # 15-minute buckets
+
+
+# BUCKETS
+def bucket_rows(traffic, bucket_slots):
+    """
+    One link trace as its whole buckets, a buckets × bucket_slots reshape
+    of the prefix (a view, no copy), and the short last bucket on its own
+    (empty if the trace ends on a bucket edge)
+    """
+    num_full = len(traffic) // bucket_slots
+    full = traffic[:num_full * bucket_slots].reshape(num_full, bucket_slots)
+    return full, traffic[num_full * bucket_slots:]
+
+
+def profile(link_traces, bucket_sec=BUCKET_SEC, window=cap_no_buf.WINDOW,
+            loss_percentile=cap_no_buf.LOSS_PERCENTILE,
+            loss_limit=cap_buf.LOSS_LIMIT,
+            buffer_time_sec=cap_buf.BUFFER_TIME_SEC,
+            batch_elements=batched.BATCH_ELEMENTS):
+    """
+    Both estimates per link and time bucket, each bucket on its own
+    (moving averages do not cross bucket edges). One link at a time, its
+    buckets read as rows of a view of the trace and estimated batched a
+    block of buckets at a time, so no copy of a whole link is made.
+    """
+    bucket_slots = max(1, int(round(bucket_sec / member1.SLOT_DURATION_SEC)))
+    frames = []
+    for link_id in sorted(link_traces):
+        full, tail = bucket_rows(link_traces[link_id], bucket_slots)
+        parts = [(full, bucket_slots)] + ([(tail[None, :], len(tail))] if len(tail) else [])
+
+        estimates, lengths = [], []
+        for rows, length in parts:
+            estimates.append(batched.estimate_blocks(
+                lambda start, stop, rows=rows, length=length:
+                    (rows[start:stop], np.full(stop - start, length)),
+                len(rows), length, window, loss_percentile, loss_limit,
+                buffer_time_sec, batch_elements, span="profile_batch"
+            ))
+            lengths.append(np.full(len(rows), length))
+        estimates, lengths = np.concatenate(estimates), np.concatenate(lengths)
+        if not len(lengths):
+            continue
+
+        buckets = np.arange(len(lengths))
+        frames.append(pd.DataFrame({
+            "Link": f"Link {link_id}",
+            "Bucket": buckets,
+            "Start_Sec": buckets * bucket_slots * member1.SLOT_DURATION_SEC,
+            "Slots": lengths,
+            "Avg_Traffic_Gbps": estimates[:, 0].round(3),
+            "Required_Capacity_No_Buffer_Gbps": estimates[:, 1].round(3),
+            "Required_Capacity_With_Buffer_Gbps": estimates[:, 2].round(3),
+        }))
+
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(frames, ignore_index=True)
+
+
+# HEATMAP
+def bucket_label(start_sec, bucket_sec=BUCKET_SEC):
+    """
+    hh:mm from the start of the recording (hh:mm:ss.sss for sub-minute buckets)
+    """
+    minutes, sec = divmod(start_sec, 60)
+    hours, minutes = divmod(int(minutes), 60)
+    if bucket_sec % 60 == 0:
+        return f"{hours:02d}:{minutes:02d}"
+    return f"{hours:02d}:{minutes:02d}:{sec:06.3f}"
+
+
+def plot_profile_heatmap(profile_df, column, title, out_file, bucket_sec=BUCKET_SEC):
+    with instr.span("plot_heatmap"):
+        table = profile_df.pivot(index="Link", columns="Start_Sec", values=column)
+        table = table.loc[sorted(table.index, key=lambda s: int(s.split()[-1]))]
+        table.columns = [bucket_label(s, bucket_sec) for s in table.columns]
+
+        plt.figure(figsize=(max(8, 0.4 * table.shape[1] + 3), max(3, 0.5 * table.shape[0] + 2)))
+        sns.heatmap(table, cmap="viridis", cbar_kws={"label": "Required capacity (Gbps)"})
+        plt.title(title)
+        plt.xlabel("Bucket start (from start of recording)")
+        plt.tight_layout()
+        plt.savefig(out_file, dpi=150)
+        plt.close()
+        instr.count_file(out_file)
+
+
+# MAIN
+def main(link_traffic_dir=LINK_TRAFFIC_DIR, out_dir=OUT_DIR, bucket_sec=BUCKET_SEC):
+    os.makedirs(out_dir, exist_ok=True)
+
+    link_traces = link_traffic_store.load_links(link_traffic_dir)
+    with instr.span("capacity_profile", links=len(link_traces)):
+        profile_df = profile(link_traces, bucket_sec)
+
+    out_file = os.path.join(out_dir, "capacity_profile.csv")
+    profile_df.to_csv(out_file, index=False)
+    instr.count_file(out_file)
+    print(f"Saved: {out_file}")
+
+    for column, label in [("Required_Capacity_No_Buffer_Gbps", "no_buffer"),
+                          ("Required_Capacity_With_Buffer_Gbps", "with_buffer")]:
+        heatmap_file = os.path.join(out_dir, f"capacity_profile_{label}.png")
+        plot_profile_heatmap(
+            profile_df, column,
+            f"Required capacity per {bucket_sec:g}-second bucket ({label.replace('_', ' ')})",
+            heatmap_file, bucket_sec
+        )
+        print(f"Saved: {heatmap_file}")
+
+    # Busy bucket per link
+    busiest = profile_df.loc[
+        profile_df.groupby("Link")["Required_Capacity_With_Buffer_Gbps"].idxmax()
+    ]
+    for _, row in busiest.iterrows():
+        print(f"{row['Link']}: busiest bucket starts at {bucket_label(row['Start_Sec'], bucket_sec)}, "
+              f"{row['Required_Capacity_With_Buffer_Gbps']:.3f} Gbps with buffer")
+
+    return profile_df
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Required capacity per link and time-of-day bucket, with heatmaps"
+    )
+    parser.add_argument("--link-traffic-dir", default=LINK_TRAFFIC_DIR)
+    parser.add_argument("--out-dir", default=OUT_DIR)
+    parser.add_argument("--bucket-sec", type=float, default=BUCKET_SEC)
+    instr.add_arguments(parser)
+    args = parser.parse_args()
+
+    instr.configure_from_args(args)
+    main(args.link_traffic_dir, args.out_dir, args.bucket_sec)
@@ -0,0 +1,320 @@
+import os
+import argparse
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+import instrumentation as instr
+import link_traffic_store
+import estimate_capacity_no_buffer as cap_no_buf
+import estimate_capacity_with_buffer as cap_buf
+
+# PATHS
+LINK_TRAFFIC_DIR = cap_no_buf.LINK_TRAFFIC_DIR
+OUT_DIR = cap_no_buf.OUT_DIR
+
+# PARAMETERS
+BATCH_ELEMENTS = 1 << 22     # links × slots simulated at once (~32 MB per array)
+
+
+# STACKING
+def stack_links(link_traces):
+    """
+    {link_id: per-slot Gbps} → (link_ids, links × slots array, lengths).
+    Shorter traces are zero-padded; lengths marks where each one ends.
+    """
+    link_ids = list(link_traces)
+    lengths = np.array([len(link_traces[k]) for k in link_ids], dtype=np.int64)
+    traffic = np.zeros((len(link_ids), lengths.max() if len(lengths) else 0))
+    for row, link_id in enumerate(link_ids):
+        traffic[row, :lengths[row]] = link_traces[link_id]
+    return link_ids, traffic, lengths
+
+
+def window_links(traffic, lengths, window):
+    """
+    WINDOW-slot moving average of every row in one pass. Returns
+    (windowed, valid) where valid[i] is the number of real windowed slots
+    of row i; rows shorter than the window are passed through unaveraged,
+    as in the per-link estimators.
+    """
+    if traffic.shape[1] < window:
+        return traffic.copy(), lengths.copy()
+
+    averaged = sliding_window_view(traffic, window, axis=1) @ (np.ones(window) / window)
+    short = lengths < window
+    if not short.any():
+        return averaged, lengths - window + 1
+
+    # Short rows keep all their raw slots, which can be more columns than
+    # the moving average of the longest row has
+    width = max(averaged.shape[1], int(lengths[short].max()))
+    windowed = np.zeros((len(traffic), width))
+    windowed[:, :averaged.shape[1]] = averaged
+    windowed[short] = traffic[short, :width]
+    return windowed, np.where(short, lengths, lengths - window + 1)
+
+
+def valid_mask(valid, num_slots):
+    return np.arange(num_slots) < valid[:, None]
+
+
+# QUANTILES
+def row_percentiles(values, valid, q):
+    """
+    np.percentile (linear) of the first valid[i] values of every row
+    """
+    if len(values) and np.all(valid == values.shape[1]):
+        return np.percentile(values, q, axis=1)
+
+    ordered = np.sort(np.where(valid_mask(valid, values.shape[1]), values, np.inf), axis=1)
+    rank = (q / 100.0) * np.maximum(valid - 1, 0)
+    below = np.floor(rank).astype(np.int64)
+    above = np.minimum(below + 1, np.maximum(valid - 1, 0))
+    rows = np.arange(len(values))
+    a, b = ordered[rows, below], ordered[rows, above]
+    return a + (b - a) * (rank - below)
+
+
+# BUFFER SIMULATION
+def clamp_scan(excess, busy, size, start=None):
+    """
+    Run b → clip(b + excess, 0, size) along every row, skipping steps where
+    busy is False (busy=None: every step counts), from the levels in start
+    (default empty). Returns (overflow, end levels) where overflow marks the
+    steps at which b + excess went above size.
+
+    A run of such maps is again clip(b + s, lo, hi), so each row is cut into
+    blocks of ~√steps:
+      1. fold each block into one (s, lo, hi), all blocks of all rows at once
+      2. chain the blocks to get the level each one starts from
+      3. replay every block from its start level, marking overflows
+    That is ~3·√steps numpy operations instead of a Python loop over every
+    step of every row.
+    """
+    num_rows, num_steps = excess.shape
+    block = max(1, int(np.ceil(np.sqrt(num_steps))))
+    num_blocks = -(-num_steps // block)
+    pad = num_blocks * block - num_steps
+
+    size = np.broadcast_to(np.asarray(size, dtype=float).reshape(-1, 1), (num_rows, 1))
+    excess = np.pad(excess, ((0, 0), (0, pad))).reshape(num_rows, num_blocks, block)
+    if busy is None:
+        busy = np.arange(num_blocks * block) < num_steps
+        busy = np.broadcast_to(busy.reshape(1, num_blocks, block), excess.shape)
+    else:
+        busy = np.pad(busy, ((0, 0), (0, pad))).reshape(num_rows, num_blocks, block)
+
+    # 1. Fold each block (skipped steps are the identity map)
+    shift = np.zeros((num_rows, num_blocks))
+    lo = np.full_like(shift, -np.inf)
+    hi = np.full_like(shift, np.inf)
+    for j in range(block):
+        e, b = excess[:, :, j], busy[:, :, j]
+        shift = np.where(b, shift + e, shift)
+        lo = np.where(b, np.clip(lo + e, 0.0, size), lo)
+        hi = np.where(b, np.clip(hi + e, 0.0, size), hi)
+
+    # 2. Level at the start of each block
+    level = np.zeros(num_rows) if start is None else np.asarray(start, dtype=float)
+    starts = np.empty((num_rows, num_blocks))
+    for i in range(num_blocks):
+        starts[:, i] = level
+        level = np.clip(level + shift[:, i], lo[:, i], hi[:, i])
+
+    # 3. Replay the blocks side by side
+    overflow = np.empty(excess.shape, dtype=bool)
+    level = starts
+    for j in range(block):
+        e, b = excess[:, :, j], busy[:, :, j]
+        filled = level + e
+        overflow[:, :, j] = b & (filled > size)
+        level = np.where(b, np.clip(filled, 0.0, size), level)
+
+    return overflow.reshape(num_rows, -1)[:, :num_steps], level[:, -1]
+
+
+def simulate_links(demand_gbps, busy, capacity_gbps,
+                   buffer_time_sec=cap_buf.BUFFER_TIME_SEC):
+    """
+    Loss and traffic slot counts of cap_buf.simulate_buffer for every row
+    at its own capacity (a busy slot adds its excess to the buffer, an idle
+    slot leaves it alone)
+    """
+    capacity_bits = capacity_gbps[:, None] * 1e9 * cap_buf.SLOT_TIME_SEC
+    excess = demand_gbps * 1e9 * cap_buf.SLOT_TIME_SEC - capacity_bits
+    overflow, _ = clamp_scan(excess, busy, capacity_gbps * 1e9 * buffer_time_sec)
+
+    traffic_slots = np.count_nonzero(busy, axis=1)
+    instr.count("slots_simulated", int(traffic_slots.sum()))
+    return np.count_nonzero(overflow, axis=1), traffic_slots
+
+
+def search_capacities(windowed, valid, loss_limit=cap_buf.LOSS_LIMIT,
+                      buffer_time_sec=cap_buf.BUFFER_TIME_SEC,
+                      max_iter=cap_buf.MAX_ITER):
+    """
+    cap_buf.bisect_capacity for every row in lockstep: each iteration is
+    one simulate_links() call at every row's midpoint. Returns
+    (capacities, probes) where probes[i] lists row i's (capacity, loss).
+    """
+    mask = valid_mask(valid, windowed.shape[1])
+    busy = mask & (windowed > 0)
+    num_busy = np.count_nonzero(busy, axis=1)
+
+    avg = np.where(
+        num_busy > 0, np.where(busy, windowed, 0.0).sum(axis=1) / np.maximum(num_busy, 1), 0.0
+    )
+    peak = np.where(mask, windowed, -np.inf).max(axis=1)
+
+    low = avg.copy()
+    high = np.where(peak > 0, peak * 1.2, avg)
+    probes = [[] for _ in range(len(windowed))]
+
+    for _ in range(max_iter):
+        mid = (low + high) / 2
+        loss_slots, traffic_slots = simulate_links(windowed, busy, mid, buffer_time_sec)
+        loss = np.where(traffic_slots > 0, loss_slots / np.maximum(traffic_slots, 1), 0.0)
+        for row in range(len(mid)):
+            probes[row].append((mid[row], loss[row]))
+
+        ok = loss <= loss_limit
+        high = np.where(ok, mid, high)
+        low = np.where(ok, low, mid)
+
+    return high, probes
+
+
+# BOTH ESTIMATES FOR ALL LINKS
+def estimate_rows(raw, raw_len, window=cap_no_buf.WINDOW,
+                  loss_percentile=cap_no_buf.LOSS_PERCENTILE,
+                  loss_limit=cap_buf.LOSS_LIMIT,
+                  buffer_time_sec=cap_buf.BUFFER_TIME_SEC,
+                  max_iter=cap_buf.MAX_ITER):
+    """
+    Both estimates for every row of a links × slots array (row i real up
+    to raw_len[i]). Returns (avg, no_buf, with_buf, probes).
+    """
+    instr.count("slots", int(raw_len.sum()))
+    windowed, valid = window_links(raw, raw_len, window)
+
+    # No buffer: mean of busy raw slots, percentile of the windowed trace
+    busy = valid_mask(raw_len, raw.shape[1]) & (raw > 0)
+    num_busy = np.count_nonzero(busy, axis=1)
+    avg = np.where(busy, raw, 0.0).sum(axis=1) / np.maximum(num_busy, 1)
+    no_buf = np.where(raw_len < window, raw.max(axis=1),
+                      row_percentiles(windowed, valid, loss_percentile))
+    no_buf[num_busy == 0] = 0.0
+
+    with_buf, probes = search_capacities(windowed, valid, loss_limit, buffer_time_sec, max_iter)
+    return avg, no_buf, with_buf, probes
+
+
+def estimate_blocks(block_rows, num_rows, num_slots, window=cap_no_buf.WINDOW,
+                    loss_percentile=cap_no_buf.LOSS_PERCENTILE,
+                    loss_limit=cap_buf.LOSS_LIMIT,
+                    buffer_time_sec=cap_buf.BUFFER_TIME_SEC,
+                    batch_elements=BATCH_ELEMENTS, span="estimate_block"):
+    """
+    estimate_rows() over num_rows rows of at most num_slots slots that are
+    built a block at a time: block_rows(start, stop) returns rows
+    [start, stop) as (raw, raw_len). A block holds at most batch_elements
+    values, so the full rows × slots array never exists. Returns a
+    num_rows × 3 array of (avg, no_buf, with_buf).
+    """
+    group = max(1, batch_elements // max(num_slots, 1))
+    estimates = np.empty((num_rows, 3))
+
+    for start in range(0, num_rows, group):
+        stop = min(start + group, num_rows)
+        with instr.span(span, links=stop - start):
+            raw, raw_len = block_rows(start, stop)
+            avg, no_buf, with_buf, _ = estimate_rows(
+                raw, raw_len, window, loss_percentile, loss_limit, buffer_time_sec
+            )
+        estimates[start:stop] = np.column_stack([avg, no_buf, with_buf])
+
+    return estimates
+
+
+def estimate_capacity(link_traces, window=cap_no_buf.WINDOW,
+                      loss_percentile=cap_no_buf.LOSS_PERCENTILE,
+                      loss_limit=cap_buf.LOSS_LIMIT,
+                      buffer_time_sec=cap_buf.BUFFER_TIME_SEC, curves=None,
+                      batch_elements=BATCH_ELEMENTS):
+    """
+    Same table as pipeline.estimate_capacity, computed on links × slots
+    arrays. Links go through in groups of at most batch_elements values.
+    """
+    link_ids, traffic, lengths = stack_links(link_traces)
+    if not link_ids:
+        return pd.DataFrame(columns=[
+            "Link", "Avg_Traffic_Gbps", "Required_Capacity_No_Buffer_Gbps",
+            "Required_Capacity_With_Buffer_Gbps"
+        ])
+
+    group = max(1, batch_elements // max(traffic.shape[1], 1))
+    rows = []
+
+    for start in range(0, len(link_ids), group):
+        ids = link_ids[start:start + group]
+        with instr.span("capacity_batched", links=len(ids)):
+            avg, no_buf, with_buf, probes = estimate_rows(
+                traffic[start:start + group], lengths[start:start + group],
+                window, loss_percentile, loss_limit, buffer_time_sec
+            )
+
+        for i, link_id in enumerate(ids):
+            if curves is not None:
+                curves[link_id] = sorted(probes[i])
+            rows.append({
+                "Link": f"Link {link_id}",
+                "Avg_Traffic_Gbps": round(float(avg[i]), 3),
+                "Required_Capacity_No_Buffer_Gbps": round(float(no_buf[i]), 3),
+                "Required_Capacity_With_Buffer_Gbps": round(float(with_buf[i]), 3)
+            })
+
+    return pd.DataFrame(rows)
+
+
+# MAIN
+def main(link_traffic_dir=LINK_TRAFFIC_DIR, out_dir=OUT_DIR,
+         window=cap_no_buf.WINDOW, loss_percentile=cap_no_buf.LOSS_PERCENTILE,
+         loss_limit=cap_buf.LOSS_LIMIT, buffer_time_sec=cap_buf.BUFFER_TIME_SEC):
+    """
+    Write both capacity CSVs, as the two per-link scripts would
+    """
+    os.makedirs(out_dir, exist_ok=True)
+
+    link_traces = link_traffic_store.load_links(link_traffic_dir)
+    capacity = estimate_capacity(
+        link_traces, window, loss_percentile, loss_limit, buffer_time_sec
+    )
+
+    files = {
+        "required_capacity_no_buffer.csv":
+            ["Link", "Avg_Traffic_Gbps", "Required_Capacity_No_Buffer_Gbps"],
+        "required_capacity_with_buffer.csv":
+            ["Link", "Required_Capacity_With_Buffer_Gbps"],
+    }
+    for fname, columns in files.items():
+        out_file = os.path.join(out_dir, fname)
+        capacity[columns].to_csv(out_file, index=False)
+        instr.count_file(out_file)
+        print(f"Saved: {out_file}")
+
+    print(capacity.to_string(index=False))
+    return capacity
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Estimate both capacities for every link in one batched pass"
+    )
+    parser.add_argument("--link-traffic-dir", default=LINK_TRAFFIC_DIR)
+    parser.add_argument("--out-dir", default=OUT_DIR)
+    instr.add_arguments(parser)
+    args = parser.parse_args()
+
+    instr.configure_from_args(args)
+    main(args.link_traffic_dir, args.out_dir)
@@ -0,0 +1,212 @@
+import os
+import argparse
+import tempfile
+import numpy as np
+import pandas as pd
+
+import instrumentation as instr
+import pipeline_chunked as chunked
+import preprocess_member1 as member1
+import build_link_slot_traffic as link_traffic
+import estimate_capacity_with_buffer as cap_buf
+import estimate_capacity_batched as batched
+
+# PATHS
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(BASE_DIR, "data")
+MAPPING_FILE = os.path.join(BASE_DIR, "output", "member3", "cell_to_link_mapping.csv")
+OUT_DIR = os.path.join(BASE_DIR, "output", "capacity")
+
+# PARAMETERS
+SYMBOL_TIME_SEC = member1.SLOT_DURATION_SEC / member1.SYMBOLS_PER_SLOT   # ~35.7 µs
+CHUNK_SLOTS = 1 << 13        # slots (× 14 symbols) streamed per step
+PROBES = 15                  # capacities simulated side by side per pass
+TOLERANCE_GBPS = 1e-4        # stop once the bracket is this narrow
+
+
+# PER-CELL SYMBOL TRACES
+def symbol_cell(file_path, work_dir, chunk_rows):
+    """
+    Per-symbol kbits of one cell spilled to disk, and the glitch threshold
+    member1.throughput_to_slots() would use. Returns (kbits memmap, upper).
+    """
+    spill = chunked.Spill(work_dir, "symbols")
+    last = -np.inf
+
+    # The C parser with round_trip floats gives the same values as the
+    # python engine member1 uses, ~3× faster
+    reader = pd.read_csv(
+        file_path, sep=r"\s+", header=None, names=["timestamp", "kbits"],
+        engine="c", float_precision="round_trip", chunksize=chunk_rows
+    )
+    for chunk in reader:
+        timestamps = chunk["timestamp"].values
+        if len(timestamps) and (timestamps[0] < last or np.any(np.diff(timestamps) < 0)):
+            raise ValueError(f"{file_path}: symbols must be time-ordered")
+        last = timestamps[-1] if len(timestamps) else last
+        spill.append(chunk["kbits"].values)
+        instr.count("rows_parsed", len(chunk))
+    instr.count_file(file_path, "bytes_read")
+
+    kbits = spill.close()
+    return kbits, chunked.linear_quantile(kbits, member1.GLITCH_QUANTILE, chunk_rows)
+
+
+def link_symbols(cells, work_dir, chunk_rows):
+    """
+    Bits per symbol summed over [(kbits, upper), ...], glitches zeroed and
+    trimmed to the shortest cell's whole slots; spilled, returned as memmap
+    """
+    num_symbols = min(len(kbits) for kbits, _ in cells)
+    num_symbols -= num_symbols % member1.SYMBOLS_PER_SLOT
+
+    spill = chunked.Spill(work_dir, "link_symbols")
+    for start in range(0, num_symbols, chunk_rows):
+        stop = min(start + chunk_rows, num_symbols)
+        total = np.zeros(stop - start)
+        for kbits, upper in cells:
+            kb = np.asarray(kbits[start:stop])
+            total += np.where(kb > upper, 0.0, kb) * 1000.0
+        spill.append(total)
+    return spill.close()
+
+
+# SYMBOL-LEVEL BUFFER
+def _check_chunk_rows(chunk_rows):
+    # Chunks are reshaped slot by slot, so they must hold whole slots
+    if chunk_rows <= 0 or chunk_rows % member1.SYMBOLS_PER_SLOT:
+        raise ValueError(
+            f"chunk_rows must be a positive multiple of {member1.SYMBOLS_PER_SLOT} "
+            f"symbols per slot, got {chunk_rows}"
+        )
+
+
+def loss_ratios(bits, capacities, buffer_time_sec=cap_buf.BUFFER_TIME_SEC,
+                chunk_rows=CHUNK_SLOTS * member1.SYMBOLS_PER_SLOT):
+    """
+    Slot loss ratio at each capacity (Gbps) for a per-symbol bit trace.
+    The buffer (capacity × buffer_time_sec bits) fills by each symbol's
+    bits and drains at capacity every symbol, idle ones included. A slot is
+    lost when any of its symbols overflows; the ratio is over slots that
+    carry traffic. Streams bits chunk by chunk, carrying the buffer level.
+    """
+    _check_chunk_rows(chunk_rows)
+    capacities = np.asarray(capacities, dtype=float)
+    per_symbol = capacities * 1e9 * SYMBOL_TIME_SEC
+    buffer_bits = capacities * 1e9 * buffer_time_sec
+
+    level = np.zeros(len(capacities))
+    loss_slots = np.zeros(len(capacities), dtype=np.int64)
+    traffic_slots = 0
+
+    for _, chunk in chunked.iter_chunks(bits, chunk_rows):
+        overflow, level = batched.clamp_scan(
+            chunk[None, :] - per_symbol[:, None], None, buffer_bits, level
+        )
+        busy = chunk.reshape(-1, member1.SYMBOLS_PER_SLOT).sum(axis=1) > 0
+        lost = overflow.reshape(len(capacities), -1, member1.SYMBOLS_PER_SLOT).any(axis=2)
+        loss_slots += np.count_nonzero(lost & busy, axis=1)
+        traffic_slots += int(np.count_nonzero(busy))
+        instr.count("symbols_simulated", len(chunk) * len(capacities))
+
+    if traffic_slots == 0:
+        return np.zeros(len(capacities))
+    return loss_slots / traffic_slots
+
+
+def search_capacity(bits, loss_limit=cap_buf.LOSS_LIMIT,
+                    buffer_time_sec=cap_buf.BUFFER_TIME_SEC, probes=PROBES,
+                    tolerance=TOLERANCE_GBPS,
+                    chunk_rows=CHUNK_SLOTS * member1.SYMBOLS_PER_SLOT):
+    """
+    Smallest capacity whose slot loss ratio stays within loss_limit. Each
+    pass over the trace tries `probes` evenly spaced capacities at once and
+    narrows the bracket (0, peak symbol rate] by probes + 1, so a long
+    trace is read ~log(peak / tolerance) / log(probes + 1) times instead of
+    30. Returns (capacity, peak Gbps, [(capacity, loss ratio), ...]).
+    """
+    _check_chunk_rows(chunk_rows)
+    peak = max((chunk.max() for _, chunk in chunked.iter_chunks(bits, chunk_rows)),
+               default=0.0) / SYMBOL_TIME_SEC / 1e9
+    low, high = 0.0, peak        # nothing overflows at the peak rate
+    tried = []
+
+    while high - low > tolerance:
+        capacities = np.linspace(low, high, probes + 2)[1:-1]
+        with instr.span("symbol_pass", probes=probes):
+            loss = loss_ratios(bits, capacities, buffer_time_sec, chunk_rows)
+        tried.extend(zip(capacities, loss))
+
+        within = np.flatnonzero(loss <= loss_limit)
+        if len(within) == 0:
+            low = capacities[-1]
+        else:
+            i = within[0]
+            high = capacities[i]
+            low = capacities[i - 1] if i > 0 else low
+
+    return high, peak, sorted(tried)
+
+
+# MAIN
+def main(data_dir=DATA_DIR, mapping_file=MAPPING_FILE, out_dir=OUT_DIR,
+         loss_limit=cap_buf.LOSS_LIMIT, buffer_time_sec=cap_buf.BUFFER_TIME_SEC,
+         chunk_slots=CHUNK_SLOTS, probes=PROBES):
+    os.makedirs(out_dir, exist_ok=True)
+    link_groups = link_traffic.link_groups_from_mapping(pd.read_csv(mapping_file))
+    chunk_rows = chunk_slots * member1.SYMBOLS_PER_SLOT
+    results = []
+
+    for link_id in sorted(link_groups):
+        with tempfile.TemporaryDirectory(prefix="symbols_") as work_dir:
+            cells = []
+            for cell_id in link_groups[link_id]:
+                thr_file = os.path.join(data_dir, "throughput", f"throughput-cell-{cell_id}.dat")
+                if not os.path.exists(thr_file):
+                    print(f"[SKIP] Throughput file missing for cell {cell_id}")
+                    continue
+                with instr.span("symbol_parse", cell=cell_id):
+                    cells.append(symbol_cell(thr_file, work_dir, chunk_rows))
+            if not cells:
+                continue
+
+            with instr.span("symbol_link", link=int(link_id), cells=len(cells)):
+                bits = link_symbols(cells, work_dir, chunk_rows)
+            with instr.span("capacity_symbol", link=int(link_id), symbols=len(bits)):
+                capacity, peak, _ = search_capacity(
+                    bits, loss_limit, buffer_time_sec, probes, TOLERANCE_GBPS, chunk_rows
+                )
+            del bits, cells
+
+        results.append({
+            "Link": f"Link {link_id}",
+            "Peak_Symbol_Rate_Gbps": round(peak, 3),
+            "Required_Capacity_Symbol_Gbps": round(capacity, 3)
+        })
+        print(f"Link {link_id}: {capacity:.3f} Gbps (symbol peak {peak:.3f} Gbps)")
+
+    out_file = os.path.join(out_dir, "required_capacity_symbol.csv")
+    summary_df = pd.DataFrame(results)
+    summary_df.to_csv(out_file, index=False)
+    instr.count_file(out_file)
+
+    print(f"\nSymbol-level capacity estimation complete.\nSaved: {out_file}")
+    return summary_df
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Buffered capacity from the raw per-symbol traces (no slot averaging)"
+    )
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--mapping", default=MAPPING_FILE)
+    parser.add_argument("--out-dir", default=OUT_DIR)
+    parser.add_argument("--chunk-slots", type=int, default=CHUNK_SLOTS)
+    parser.add_argument("--probes", type=int, default=PROBES,
+                        help="capacities tried per pass over the trace")
+    instr.add_arguments(parser)
+    args = parser.parse_args()
+
+    instr.configure_from_args(args)
+    main(args.data_dir, args.mapping, args.out_dir,
+         chunk_slots=args.chunk_slots, probes=args.probes)
@@ -2,30 +2,46 @@ import os
 import numpy as np
 import pandas as pd
 
+import instrumentation as instr
+import link_traffic_store
+
 # PATHS
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 LINK_TRAFFIC_DIR = os.path.join(BASE_DIR, "output", "link_traffic")
 OUT_DIR = os.path.join(BASE_DIR, "output", "capacity")
 
-os.makedirs(OUT_DIR, exist_ok=True)
-
 # CONSTANTS (FROM PROBLEM STATEMENT)
 SLOT_TIME_SEC = 500e-6          # 500 microseconds
 BUFFER_TIME_SEC = 143e-6        # 4 symbols = 143 microseconds
 LOSS_LIMIT = 0.01               # 1% slots allowed to overflow
 MAX_ITER = 30                   # binary search iterations
+WINDOW = 20                     # same as no-buffer case
 
 # BUFFER SIMULATION FUNCTION
-def loss_ratio_for_capacity(demand_gbps, capacity_gbps):
+def loss_ratio_for_capacity(demand_gbps, capacity_gbps,
+                            buffer_time_sec=BUFFER_TIME_SEC):
     """
     Simulate buffer behavior and return slot loss ratio
     """
+    instr.count("slots_simulated", len(demand_gbps))
+
+    _, loss_slots, traffic_slots = simulate_buffer(
+        demand_gbps, capacity_gbps, buffer_time_sec
+    )
+
+    return 0.0 if traffic_slots == 0 else loss_slots / traffic_slots
+
+def simulate_buffer(demand_gbps, capacity_gbps,
+                    buffer_time_sec=BUFFER_TIME_SEC, state=(0.0, 0, 0)):
+    """
+    Run the buffer over demand_gbps starting from state = (buffer bits,
+    loss slots, traffic slots) and return the state at the end, so a long
+    trace can be fed one chunk at a time
+    """
     capacity_bits = capacity_gbps * 1e9 * SLOT_TIME_SEC
-    buffer_bits = capacity_gbps * 1e9 * BUFFER_TIME_SEC
+    buffer_bits = capacity_gbps * 1e9 * buffer_time_sec
 
-    buffer = 0.0
-    loss_slots = 0
-    traffic_slots = 0
+    buffer, loss_slots, traffic_slots = state
 
     for rate in demand_gbps:
         if rate <= 0:
@@ -43,26 +59,20 @@ def loss_ratio_for_capacity(demand_gbps, capacity_gbps):
         else:
             buffer = max(0.0, buffer + excess)
 
-    return 0.0 if traffic_slots == 0 else loss_slots / traffic_slots
-
-# PROCESS EACH LINK
-results = []
-
-for fname in sorted(os.listdir(LINK_TRAFFIC_DIR)):
-    if not fname.endswith("_slot_traffic.csv"):
-        continue
-
-    link_id = fname.split("_")[1]
-    df = pd.read_csv(os.path.join(LINK_TRAFFIC_DIR, fname))
+    return buffer, loss_slots, traffic_slots
 
-    WINDOW = 20  # same as no-buffer case
-
-    traffic_raw = df["data_rate_gbps"].values
-
-    if len(traffic_raw) >= WINDOW:
+# BINARY SEARCH FOR MINIMUM CAPACITY
+def search_capacity(traffic_raw, loss_limit=LOSS_LIMIT,
+                    buffer_time_sec=BUFFER_TIME_SEC, window=WINDOW,
+                    max_iter=MAX_ITER):
+    """
+    Return (required capacity, probes) for one link trace, where probes is
+    the list of (capacity_gbps, loss_ratio) points tried by the search
+    """
+    if len(traffic_raw) >= window:
         traffic = np.convolve(
             traffic_raw,
-            np.ones(WINDOW) / WINDOW,
+            np.ones(window) / window,
             mode="valid"
         )
     else:
@@ -72,32 +82,80 @@ for fname in sorted(os.listdir(LINK_TRAFFIC_DIR)):
     avg = traffic[traffic > 0].mean() if np.any(traffic > 0) else 0.0
     peak = traffic.max()
 
+    return bisect_capacity(
+        avg, peak,
+        lambda capacity: loss_ratio_for_capacity(traffic, capacity, buffer_time_sec),
+        loss_limit, max_iter
+    )
+
+def bisect_capacity(avg, peak, loss_at, loss_limit=LOSS_LIMIT,
+                    max_iter=MAX_ITER):
+    """
+    Bisect between the average and 1.2 × peak for the smallest capacity
+    whose loss_at(capacity) stays within loss_limit; returns (capacity, probes)
+    """
     low = avg
     high = peak * 1.2 if peak > 0 else avg
 
-    # Binary search for minimum capacity
-    for _ in range(MAX_ITER):
+    probes = []
+
+    for _ in range(max_iter):
         mid = (low + high) / 2
-        loss = loss_ratio_for_capacity(traffic, mid)
+        loss = loss_at(mid)
+        probes.append((mid, loss))
 
-        if loss <= LOSS_LIMIT:
+        if loss <= loss_limit:
             high = mid
         else:
             low = mid
 
-    results.append({
-        "Link": f"Link {link_id}",
-        "Required_Capacity_With_Buffer_Gbps": round(high, 3)
-    })
+    return high, probes
+
+def required_capacity_with_buffer(traffic_raw, loss_limit=LOSS_LIMIT,
+                                  buffer_time_sec=BUFFER_TIME_SEC,
+                                  window=WINDOW):
+    return search_capacity(
+        traffic_raw, loss_limit, buffer_time_sec, window
+    )[0]
+
+# MAIN
+def main(link_traffic_dir=LINK_TRAFFIC_DIR, out_dir=OUT_DIR,
+         loss_limit=LOSS_LIMIT, buffer_time_sec=BUFFER_TIME_SEC,
+         window=WINDOW):
+    os.makedirs(out_dir, exist_ok=True)
+
+    # PROCESS EACH LINK
+    results = []
+
+    for link_id, file_path in link_traffic_store.link_files(link_traffic_dir).items():
+        traffic_raw = link_traffic_store.load_link(file_path)
+
+        with instr.span("capacity_with_buffer", link=int(link_id)):
+            capacity = required_capacity_with_buffer(
+                traffic_raw, loss_limit, buffer_time_sec, window
+            )
+
+        results.append({
+            "Link": f"Link {link_id}",
+            "Required_Capacity_With_Buffer_Gbps": round(capacity, 3)
+        })
+
+        print(f"Link {link_id}: {capacity:.3f} Gbps")
+
+    # SAVE RESULTS
+    out_file = os.path.join(
+        out_dir, "required_capacity_with_buffer.csv"
+    )
+
+    summary_df = pd.DataFrame(results)
+    summary_df.to_csv(out_file, index=False)
+    instr.count_file(out_file)
 
-    print(f"Link {link_id}: {high:.3f} Gbps")
+    print("\nBuffered capacity estimation complete.")
+    print(f"Saved: {out_file}")
 
-# SAVE RESULTS
-out_file = os.path.join(
-    OUT_DIR, "required_capacity_with_buffer.csv"
-)
+    return summary_df
 
-pd.DataFrame(results).to_csv(out_file, index=False)
 
-print("\nBuffered capacity estimation complete.")
-print(f"Saved: {out_file}")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+import os
+import itertools
+import argparse
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+import instrumentation as instr
+import pipeline
+import link_traffic_store
+import build_link_slot_traffic as link_traffic
+import estimate_capacity_no_buffer as cap_no_buf
+import estimate_capacity_with_buffer as cap_buf
+import estimate_capacity_batched as batched
+
+# PATHS
+LINK_TRAFFIC_DIR = cap_no_buf.LINK_TRAFFIC_DIR
+CLEAN_DIR = link_traffic.CLEAN_DIR
+MAPPING_FILE = os.path.join(link_traffic.TOPO_DIR, "cell_to_link_mapping.csv")
+OUT_DIR = os.path.join(pipeline.OUTPUT_DIR, "failover")
+
+# REROUTING POLICIES
+#   ring          each failed link's traffic moves whole to the next surviving link id
+#   least_loaded  failed links, heaviest first, move whole to the survivor with
+#                 the lowest mean traffic so far
+#   spread        the failed links' cells, heaviest first, move one by one to the
+#                 survivor with the lowest mean traffic so far (needs cleaned/)
+POLICIES = ["ring", "least_loaded", "spread"]
+
+
+# Columns of the worst-case table
+WORST_CASE_COLUMNS = [
+    "Link",
+    "Normal_No_Buffer_Gbps", "Worst_No_Buffer_Gbps", "Worst_No_Buffer_Failure",
+    "Normal_With_Buffer_Gbps", "Worst_With_Buffer_Gbps", "Worst_With_Buffer_Failure",
+]
+
+
+# SCENARIOS
+def failures(link_ids, max_failed=1):
+    """
+    Every set of 1..max_failed failed links that leaves at least one survivor
+    """
+    return [
+        failed
+        for k in range(1, max_failed + 1)
+        for failed in itertools.combinations(sorted(link_ids), k)
+        if len(failed) < len(link_ids)
+    ]
+
+
+def _lightest_first(items, loads):
+    """
+    {survivor: [item, ...]} placing items (heaviest first) one by one on
+    the survivor with the lowest running load; items are (source, load)
+    """
+    loads = dict(loads)
+    placed = {k: [] for k in loads}
+    for source, load in sorted(items, key=lambda item: -item[1]):
+        target = min(loads, key=lambda k: (loads[k], k))
+        placed[target].append(source)
+        loads[target] += load
+    return placed
+
+
+def reroute(failed, link_ids, link_groups, means, policy):
+    """
+    {survivor: [extra source, ...]} for one failure set. Sources are
+    ("link", id) for a whole failed link's traffic or ("cell", id).
+    """
+    survivors = [k for k in sorted(link_ids) if k not in failed]
+    if policy == "ring":
+        order = sorted(link_ids)
+        placed = {k: [] for k in survivors}
+        for link_id in failed:
+            i = order.index(link_id)
+            target = next(order[(i + j) % len(order)] for j in range(1, len(order))
+                          if order[(i + j) % len(order)] not in failed)
+            placed[target].append(("link", link_id))
+        return placed
+
+    loads = {k: means["link", k] for k in survivors}
+    if policy == "least_loaded":
+        items = [(("link", k), means["link", k]) for k in failed]
+    elif policy == "spread":
+        items = [(("cell", c), means["cell", c]) for k in failed for c in link_groups[k]]
+    else:
+        raise ValueError(f"policy must be one of {POLICIES}")
+    return _lightest_first(items, loads)
+
+
+# BATCHED EVALUATION
+def survivor_matrix(scenarios, sources):
+    """
+    Sparse 0/1 matrix with a row per distinct survivor trace, each row its
+    own cached link sum plus the sources rerouted onto it; columns follow
+    `sources`. Returns (matrix, rows) with rows listing
+    (failed, survivor, extra sources, row index).
+    """
+    column = {source: i for i, source in enumerate(sources)}
+    unique = {}
+    rows = []
+    for failed, placed in scenarios:
+        for survivor, extra in placed.items():
+            key = frozenset([("link", survivor)] + extra)
+            rows.append((failed, survivor, extra, unique.setdefault(key, len(unique))))
+
+    indptr = np.zeros(len(unique) + 1, dtype=np.int64)
+    indices = []
+    for key, row in sorted(unique.items(), key=lambda item: item[1]):
+        indices.extend(sorted(column[s] for s in key))
+        indptr[row + 1] = indptr[row] + len(key)
+    matrix = sparse.csr_matrix(
+        (np.ones(len(indices)), np.array(indices, dtype=np.int64), indptr),
+        shape=(len(unique), len(sources))
+    )
+    return matrix, rows
+
+
+def analyse(link_traces, link_groups, cell_traces=None, policy="least_loaded",
+            max_failed=1, window=cap_no_buf.WINDOW,
+            loss_percentile=cap_no_buf.LOSS_PERCENTILE,
+            loss_limit=cap_buf.LOSS_LIMIT,
+            buffer_time_sec=cap_buf.BUFFER_TIME_SEC,
+            batch_elements=batched.BATCH_ELEMENTS):
+    """
+    Both estimates for every surviving link under every failure set. Each
+    rerouted trace is the survivor's cached link sum plus the rerouted link
+    sums or cells, i.e. a row of a sparse matrix times the sources × slots
+    matrix; identical rows across failures are computed once, and blocks
+    of rows go straight to the batched estimator.
+    """
+    link_ids = sorted(link_traces)
+    sources = [("link", k) for k in link_ids]
+    traces = [link_traces[k] for k in link_ids]
+    if policy == "spread":
+        if cell_traces is None:
+            raise ValueError("the spread policy needs the per-cell traces")
+        cells = sorted(c for k in link_ids for c in link_groups[k])
+        sources += [("cell", c) for c in cells]
+        traces += [cell_traces[c] for c in cells]
+
+    num_slots = min(len(t) for t in traces)
+    traffic = np.stack([t[:num_slots] for t in traces])
+    means = dict(zip(sources, traffic.mean(axis=1)))
+
+    scenarios = [(failed, reroute(failed, link_ids, link_groups, means, policy))
+                 for failed in failures(link_ids, max_failed)]
+    scenarios.insert(0, ((), {k: [] for k in link_ids}))
+    matrix, rows = survivor_matrix(scenarios, sources)
+    print(f"{len(scenarios) - 1} failure sets, {len(rows)} survivor links, "
+          f"{matrix.shape[0]} distinct traces of {num_slots} slots ({policy})")
+
+    estimates = batched.estimate_blocks(
+        lambda start, stop: (matrix[start:stop] @ traffic, np.full(stop - start, num_slots)),
+        matrix.shape[0], num_slots, window, loss_percentile, loss_limit,
+        buffer_time_sec, batch_elements, span="failover_batch"
+    )
+
+    return pd.DataFrame([
+        {
+            "Failed": " + ".join(f"Link {k}" for k in failed) or "none",
+            "Link": f"Link {survivor}",
+            "Rerouted": ", ".join(f"{kind.title()} {i}" for kind, i in sorted(extra)),
+            "Avg_Traffic_Gbps": round(float(estimates[row, 0]), 3),
+            "Required_Capacity_No_Buffer_Gbps": round(float(estimates[row, 1]), 3),
+            "Required_Capacity_With_Buffer_Gbps": round(float(estimates[row, 2]), 3),
+        }
+        for failed, survivor, extra, row in rows
+    ])
+
+
+def worst_case(scenarios_df):
+    """
+    Per link: capacity with every link up, the worst over all failure sets
+    and the failure that causes it, for both estimators (no rows when there
+    are no failure sets, e.g. a single link)
+    """
+    normal = scenarios_df[scenarios_df["Failed"] == "none"].set_index("Link")
+    failed = scenarios_df[scenarios_df["Failed"] != "none"]
+    rows = []
+    for link, group in failed.groupby("Link", sort=False):
+        row = {"Link": link}
+        for label in ["No_Buffer", "With_Buffer"]:
+            column = f"Required_Capacity_{label}_Gbps"
+            worst = group.loc[group[column].idxmax()]
+            row[f"Normal_{label}_Gbps"] = normal.loc[link, column]
+            row[f"Worst_{label}_Gbps"] = worst[column]
+            row[f"Worst_{label}_Failure"] = worst["Failed"]
+        rows.append(row)
+    if not rows:
+        return pd.DataFrame(columns=WORST_CASE_COLUMNS)
+    return pd.DataFrame(rows, columns=WORST_CASE_COLUMNS).sort_values(
+        "Link", key=lambda s: s.str.extract(r"(\d+)")[0].astype(int)
+    ).reset_index(drop=True)
+
+
+# MAIN
+def main(link_traffic_dir=LINK_TRAFFIC_DIR, mapping_file=MAPPING_FILE,
+         clean_dir=CLEAN_DIR, out_dir=OUT_DIR, policy="least_loaded", max_failed=1):
+    os.makedirs(out_dir, exist_ok=True)
+
+    link_groups = link_traffic.link_groups_from_mapping(pd.read_csv(mapping_file))
+    link_traces = link_traffic_store.load_links(link_traffic_dir)
+    cell_traces = None
+    if policy == "spread":
+        cell_traces = link_traffic.load_cell_traces(
+            clean_dir, sorted(c for k in link_traces for c in link_groups[k])
+        )
+
+    with instr.span("failover", links=len(link_traces), max_failed=max_failed):
+        scenarios_df = analyse(link_traces, link_groups, cell_traces, policy, max_failed)
+    worst = worst_case(scenarios_df)
+
+    scenarios_out = os.path.join(out_dir, "failover_scenarios.csv")
+    worst_out = os.path.join(out_dir, "failover_worst_case.csv")
+    scenarios_df.to_csv(scenarios_out, index=False)
+    worst.to_csv(worst_out, index=False)
+
+    print(worst.to_string(index=False))
+    for path in [scenarios_out, worst_out]:
+        instr.count_file(path)
+        print(f"Saved: {path}")
+
+    return worst
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Capacity each surviving link needs when links fail and their cells are rerouted"
+    )
+    parser.add_argument("--link-traffic-dir", default=LINK_TRAFFIC_DIR)
+    parser.add_argument("--mapping", default=MAPPING_FILE)
+    parser.add_argument("--clean-dir", default=CLEAN_DIR,
+                        help="per-cell traces, used by the spread policy")
+    parser.add_argument("--out-dir", default=OUT_DIR)
+    parser.add_argument("--policy", choices=POLICIES, default="least_loaded")
+    parser.add_argument("--double", action="store_true",
+                        help="also fail every pair of links")
+    instr.add_arguments(parser)
+    args = parser.parse_args()
+
+    instr.configure_from_args(args)
+    main(args.link_traffic_dir, args.mapping, args.clean_dir, args.out_dir,
+         args.policy, 2 if args.double else 1)
@@ -0,0 +1,284 @@
+import os
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+import numpy as np
+import pandas as pd
+
+# PATHS
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(BASE_DIR, "data")
+
+# CONSTANTS (same framing as preprocess_member1)
+SYMBOLS_PER_SLOT = 14
+SLOT_DURATION_SEC = 500e-6
+SYMBOL_DURATION_SEC = SLOT_DURATION_SEC / SYMBOLS_PER_SLOT
+PACKET_BITS = 1500 * 8
+
+# DEFAULT PARAMETERS
+NUM_CELLS = 24
+NUM_LINKS = 3
+DURATION_SEC = 60.0
+BURST_SLOTS = 20          # mean length of an on-period (burstiness)
+ACTIVITY = 0.4            # fraction of slots a cell is transmitting
+CELL_GBPS = 1.0           # mean rate of a cell while active
+CONGESTION = 0.03         # fraction of active slots a shared link overflows
+NOISE_LOSS = 0.002        # per-packet loss probability outside congestion
+LATE_FRACTION = 0.3       # share of lost packets reported as too_late
+START_TIME = 1_700_000_000.0
+CHUNK_SLOTS = 1 << 16
+
+
+# TEXT FORMATTING (vectorized, no per-row Python)
+def format_rows(columns):
+    """
+    Render rows of non-negative numbers as whitespace-separated text.
+    columns is a list of (values, decimals); returns bytes, one line per row.
+    """
+    n = len(columns[0][0])
+
+    scaled_cols = []
+    for values, decimals in columns:
+        scaled = np.rint(
+            np.asarray(values, dtype=float) * 10 ** decimals
+        ).astype(np.int64)
+        max_value = int(scaled.max()) if n else 0
+        width = max(len(str(max_value)), decimals + 1)
+        scaled_cols.append((scaled, decimals, width))
+
+    # One fixed-width character grid per chunk, plus a mask of kept cells
+    row_width = sum(w + (1 if d else 0) + 1 for _, d, w in scaled_cols)
+    chars = np.empty((n, row_width), dtype=np.uint8)
+    keep = np.ones((n, row_width), dtype=bool)
+
+    pos = 0
+    for j, (scaled, decimals, width) in enumerate(scaled_cols):
+        int_width = width - decimals
+        end = pos + width + (1 if decimals else 0)
+
+        # Digits from least to most significant, one divmod per position
+        rest = scaled
+        col = end - 1
+        for k in range(width):
+            if decimals and k == decimals:
+                chars[:, col] = ord(".")
+                col -= 1
+            rest, digit = np.divmod(rest, 10)
+            chars[:, col] = digit + ord("0")
+            col -= 1
+
+        # Drop leading zeros of the integer part (always keep the units digit)
+        if int_width > 1:
+            ndigits = np.searchsorted(
+                10 ** np.arange(1, int_width), scaled // 10 ** decimals,
+                side="right"
+            ) + 1
+            keep[:, pos:pos + int_width - 1] = (
+                np.arange(int_width - 1) >= (int_width - ndigits)[:, None]
+            )
+
+        chars[:, end] = ord("\n") if j == len(scaled_cols) - 1 else ord(" ")
+        pos = end + 1
+
+    return chars[keep].tobytes()
+
+
+# TRAFFIC MODEL
+def on_off_activity(rng, num_slots, burst_slots, activity):
+    """
+    Two-state on/off process with geometric run lengths; True = active
+    """
+    mean_on = max(burst_slots, 1.0)
+    mean_off = max(mean_on * (1.0 - activity) / max(activity, 1e-9), 1.0)
+
+    # Enough alternating runs to cover the duration with high probability
+    num_runs = int(2 * num_slots / (mean_on + mean_off)) + 64
+    on_runs = rng.geometric(1.0 / mean_on, num_runs)
+    off_runs = rng.geometric(1.0 / mean_off, num_runs)
+
+    while on_runs.sum() + off_runs.sum() < num_slots:
+        on_runs = np.concatenate([on_runs, rng.geometric(1.0 / mean_on, num_runs)])
+        off_runs = np.concatenate([off_runs, rng.geometric(1.0 / mean_off, num_runs)])
+
+    runs = np.empty(2 * len(on_runs), dtype=np.int64)
+    states = np.empty(2 * len(on_runs), dtype=bool)
+    start_on = rng.random() < activity
+    runs[0::2], runs[1::2] = (on_runs, off_runs) if start_on else (off_runs, on_runs)
+    states[0::2], states[1::2] = start_on, not start_on
+
+    return np.repeat(states, runs)[:num_slots]
+
+
+def cell_slot_kbits(rng, num_slots, burst_slots, activity, cell_gbps):
+    """
+    Payload per slot (kbits) for one cell
+    """
+    active = on_off_activity(rng, num_slots, burst_slots, activity)
+    mean_kbits = cell_gbps * 1e9 * SLOT_DURATION_SEC / 1000.0
+    level = rng.lognormal(mean=-0.125, sigma=0.5, size=num_slots) * mean_kbits
+    return np.where(active, level, 0.0)
+
+
+def slot_losses(rng, kbits, congested_fraction, noise_loss, late_fraction):
+    """
+    Per-slot tx / rx / too_late counters for one cell
+    """
+    tx = np.ceil(kbits * 1000.0 / PACKET_BITS).astype(np.int64)
+    p_loss = np.clip(congested_fraction + noise_loss, 0.0, 1.0)
+    lost = rng.binomial(tx, p_loss)
+    too_late = rng.binomial(lost, late_fraction)
+    rx = tx - (lost - too_late)
+    return tx, rx, too_late
+
+
+# GENERATOR
+def generate(out_dir=DATA_DIR, num_cells=NUM_CELLS, num_links=NUM_LINKS,
+             duration_sec=DURATION_SEC, burst_slots=BURST_SLOTS,
+             activity=ACTIVITY, cell_gbps=CELL_GBPS, congestion=CONGESTION,
+             noise_loss=NOISE_LOSS, seed=0, start_time=START_TIME, jobs=1):
+    """
+    Write throughput-cell-N.dat / pkt-stats-cell-N.dat for every cell plus
+    ground_truth_cell_to_link.csv into out_dir; return the mapping table.
+    Output is identical for a given seed whatever the number of jobs.
+    """
+    seeds = np.random.SeedSequence(seed)
+    rng = np.random.default_rng(seeds.spawn(1)[0])
+    cell_seeds = seeds.spawn(num_cells)
+    num_slots = int(round(duration_sec / SLOT_DURATION_SEC))
+
+    throughput_dir = os.path.join(out_dir, "throughput")
+    pktstats_dir = os.path.join(out_dir, "pkt-stats")
+    os.makedirs(throughput_dir, exist_ok=True)
+    os.makedirs(pktstats_dir, exist_ok=True)
+
+    # Balanced random cell → link assignment
+    link_of_cell = rng.permutation(np.arange(num_cells) % num_links) + 1
+
+    mapping_df = pd.DataFrame({
+        "Cell": [f"Cell {c}" for c in range(1, num_cells + 1)],
+        "Link_ID": link_of_cell
+    })
+    mapping_df.to_csv(
+        os.path.join(out_dir, "ground_truth_cell_to_link.csv"), index=False
+    )
+
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = []
+
+        for link_id in range(1, num_links + 1):
+            cells = np.flatnonzero(link_of_cell == link_id) + 1
+            if len(cells) == 0:
+                continue
+
+            kbits = np.vstack([
+                cell_slot_kbits(rng, num_slots, burst_slots, activity, cell_gbps)
+                for _ in cells
+            ])
+
+            # Shared-link congestion: the link overflows in the top
+            # `congestion` fraction of its active slots, and every cell on
+            # it loses packets in those slots
+            link_kbits = kbits.sum(axis=0)
+            active = link_kbits > 0
+            capacity = (
+                np.quantile(link_kbits[active], 1.0 - congestion)
+                if active.any() else 0.0
+            )
+            overflow = np.where(
+                link_kbits > capacity,
+                (link_kbits - capacity) / np.maximum(link_kbits, 1e-12),
+                0.0
+            )
+
+            for row, cell_id in enumerate(cells):
+                # Bound the queue so only a few cells' traces are in flight
+                while len(futures) >= 2 * jobs:
+                    done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        future.result()
+                        futures.remove(future)
+
+                futures.append(pool.submit(
+                    write_cell, cell_seeds[cell_id - 1], cell_id, kbits[row],
+                    overflow, start_time, throughput_dir, pktstats_dir,
+                    noise_loss
+                ))
+
+            print(f"Link {link_id}: cells {cells.tolist()}")
+
+        for future in futures:
+            future.result()
+
+    return mapping_df
+
+
+def write_cell(seed, cell_id, kbits, overflow, start_time,
+               throughput_dir, pktstats_dir, noise_loss=NOISE_LOSS):
+    rng = np.random.default_rng(seed)
+    slot_times = start_time + np.arange(len(kbits)) * SLOT_DURATION_SEC
+    thr_path = os.path.join(throughput_dir, f"throughput-cell-{cell_id}.dat")
+    pkt_path = os.path.join(pktstats_dir, f"pkt-stats-cell-{cell_id}.dat")
+
+    with open(thr_path, "wb") as thr, open(pkt_path, "wb") as pkt:
+        for start in range(0, len(kbits), CHUNK_SLOTS):
+            stop = min(start + CHUNK_SLOTS, len(kbits))
+            slot_kbits = kbits[start:stop]
+
+            # Spread each slot's payload over its 14 symbols
+            weights = rng.gamma(4.0, 1.0, (stop - start, SYMBOLS_PER_SLOT))
+            weights /= weights.sum(axis=1, keepdims=True)
+            symbol_kbits = (slot_kbits[:, None] * weights).ravel()
+            symbol_times = (
+                slot_times[start:stop, None]
+                + np.arange(SYMBOLS_PER_SLOT) * SYMBOL_DURATION_SEC
+            ).ravel()
+
+            thr.write(format_rows([(symbol_times, 6), (symbol_kbits, 3)]))
+
+            tx, rx, too_late = slot_losses(
+                rng, slot_kbits, overflow[start:stop], noise_loss, LATE_FRACTION
+            )
+            pkt.write(format_rows([
+                (slot_times[start:stop], 6), (tx, 0), (rx, 0), (too_late, 0)
+            ]))
+
+
+# MAIN
+def main():
+    parser = argparse.ArgumentParser(
+        description="Generate synthetic fronthaul traces with known topology"
+    )
+    parser.add_argument("--out", default=DATA_DIR)
+    parser.add_argument("--cells", type=int, default=NUM_CELLS)
+    parser.add_argument("--links", type=int, default=NUM_LINKS)
+    parser.add_argument("--duration", type=float, default=DURATION_SEC,
+                        help="seconds of traffic")
+    parser.add_argument("--burstiness", type=float, default=BURST_SLOTS,
+                        help="mean on-period length in slots")
+    parser.add_argument("--activity", type=float, default=ACTIVITY)
+    parser.add_argument("--cell-gbps", type=float, default=CELL_GBPS)
+    parser.add_argument("--congestion", type=float, default=CONGESTION,
+                        help="fraction of active slots each link overflows")
+    parser.add_argument("--noise-loss", type=float, default=NOISE_LOSS)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--jobs", type=int, default=os.cpu_count(),
+                        help="worker processes writing cell files")
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    generate(
+        args.out, args.cells, args.links, args.duration, args.burstiness,
+        args.activity, args.cell_gbps, args.congestion, args.noise_loss,
+        args.seed, jobs=args.jobs
+    )
+
+    size = sum(
+        os.path.getsize(os.path.join(root, f))
+        for root, _, files in os.walk(args.out) for f in files
+    )
+    print(f"\nWrote {size / 1e6:.1f} MB to {args.out} "
+          f"in {time.perf_counter() - t0:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
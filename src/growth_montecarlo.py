@@ -0,0 +1,225 @@
+import os
+import argparse
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+
+import instrumentation as instr
+import pipeline
+import build_link_slot_traffic as link_traffic
+import estimate_capacity_no_buffer as cap_no_buf
+import estimate_capacity_with_buffer as cap_buf
+import estimate_capacity_batched as batched
+import topology_whatif as whatif
+
+# PATHS
+CLEAN_DIR = link_traffic.CLEAN_DIR
+MAPPING_FILE = os.path.join(link_traffic.TOPO_DIR, "cell_to_link_mapping.csv")
+OUT_DIR = os.path.join(pipeline.OUTPUT_DIR, "growth")
+
+# PARAMETERS
+NUM_SCENARIOS = 200
+YEARS = 3
+GROWTH_PER_YEAR = 0.25       # planned traffic growth per cell and year
+GROWTH_SIGMA = 0.15          # log-normal spread of each cell's growth factor
+BURST_QUANTILE = 0.9         # a cell's busy slots above this quantile are bursts
+BURST_SCALE_MAX = 1.5        # bursts scaled by U(1, BURST_SCALE_MAX) per cell
+SEED = 0
+MAX_WORKERS = os.cpu_count()
+PERCENTILES = [5, 50, 95]
+
+
+# SCENARIOS
+def burst_part(traffic, quantile=BURST_QUANTILE):
+    """
+    The slots of each cell (row) above its busy-slot quantile, zero
+    elsewhere: the part of the trace that burst scaling multiplies
+    """
+    busy = np.where(traffic > 0, traffic, np.nan)
+    threshold = np.nanquantile(busy, quantile, axis=1)
+    return np.where(traffic > np.nan_to_num(threshold, nan=np.inf)[:, None], traffic, 0.0)
+
+
+def draw_scenarios(planned, num_scenarios, seed=SEED, sigma=GROWTH_SIGMA,
+                   burst_max=BURST_SCALE_MAX):
+    """
+    (growth, burst) factors, scenarios × cells each. The log-normal spread
+    has mean 1 (mu = -sigma²/2), so on average a cell grows as planned.
+    Every scenario has its own child seed, so results do not depend on how
+    they are batched.
+    """
+    growth = np.empty((num_scenarios, len(planned)))
+    burst = np.empty_like(growth)
+    for i, child in enumerate(np.random.SeedSequence(seed).spawn(num_scenarios)):
+        rng = np.random.default_rng(child)
+        growth[i] = planned * rng.lognormal(-sigma ** 2 / 2, sigma, len(planned))
+        burst[i] = rng.uniform(1.0, burst_max, len(planned))
+    return growth, burst
+
+
+# WORKERS
+# The cell matrices are handed to every worker once, at start-up
+_SHARED = {}
+
+
+def _init_worker(matrix, traffic, bursts, params):
+    _SHARED.update(matrix=matrix, traffic=traffic, bursts=bursts, params=params)
+
+
+def evaluate_scenarios(growth, burst):
+    """
+    Both estimates for every link of every scenario in the batch. A
+    scenario scales cell c by growth[c] and its bursts by a further
+    burst[c], which is linear in the cell traces, so the link traces of
+    all scenarios come from two products of weighted assignment matrices
+    with the cell × slot and burst × slot matrices.
+    Returns scenarios × links arrays (avg, no buffer, with buffer).
+    """
+    matrix, traffic, bursts = _SHARED["matrix"], _SHARED["traffic"], _SHARED["bursts"]
+    num_links, num_slots = matrix.shape[0], traffic.shape[1]
+
+    weights = matrix[None, :, :] * growth[:, None, :]
+    extra = weights * (burst[:, None, :] - 1.0)
+    links = (weights.reshape(-1, weights.shape[2]) @ traffic
+             + extra.reshape(-1, extra.shape[2]) @ bursts)
+
+    avg, no_buf, with_buf, _ = batched.estimate_rows(
+        links, np.full(len(links), num_slots), *_SHARED["params"]
+    )
+    return tuple(x.reshape(len(growth), num_links) for x in (avg, no_buf, with_buf))
+
+
+def run_scenarios(cell_traces, link_groups, growth, burst,
+                  window=cap_no_buf.WINDOW,
+                  loss_percentile=cap_no_buf.LOSS_PERCENTILE,
+                  loss_limit=cap_buf.LOSS_LIMIT,
+                  buffer_time_sec=cap_buf.BUFFER_TIME_SEC,
+                  max_workers=MAX_WORKERS,
+                  batch_elements=batched.BATCH_ELEMENTS):
+    """
+    Scenarios × links arrays (avg, no buffer, with buffer) for the growth /
+    burst factors of draw_scenarios(). Scenarios go to the process pool in
+    batches of about batch_elements link slots.
+    """
+    cell_ids, traffic = whatif.cell_matrix(cell_traces)
+    link_ids = sorted(link_groups)
+    matrix, _ = whatif.assignment_matrix({"links": link_groups}, cell_ids)
+    matrix = matrix.toarray()
+    params = (window, loss_percentile, loss_limit, buffer_time_sec)
+
+    per_batch = max(1, batch_elements // (len(link_ids) * traffic.shape[1]))
+    batches = range(0, len(growth), per_batch)
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                             initargs=(matrix, traffic, burst_part(traffic), params)) as pool:
+        results = list(pool.map(
+            evaluate_scenarios,
+            [growth[i:i + per_batch] for i in batches],
+            [burst[i:i + per_batch] for i in batches],
+        ))
+    instr.count("scenarios", len(growth))
+
+    return link_ids, tuple(np.concatenate([r[k] for r in results]) for k in range(3))
+
+
+# TABLES
+def scenario_table(link_ids, estimates):
+    avg, no_buf, with_buf = estimates
+    scenario, link = np.divmod(np.arange(avg.size), len(link_ids))
+    return pd.DataFrame({
+        "Scenario": scenario,
+        "Link": [f"Link {link_ids[i]}" for i in link],
+        "Avg_Traffic_Gbps": avg.ravel().round(3),
+        "Required_Capacity_No_Buffer_Gbps": no_buf.ravel().round(3),
+        "Required_Capacity_With_Buffer_Gbps": with_buf.ravel().round(3),
+    })
+
+
+def distribution_table(link_ids, estimates, baseline, percentiles=PERCENTILES):
+    """
+    Per link: today's capacity and the mean / percentiles / max over the
+    scenarios, for both estimators
+    """
+    rows = []
+    for i, link_id in enumerate(link_ids):
+        row = {"Link": f"Link {link_id}"}
+        for label, values, today in [("No_Buffer", estimates[1][:, i], baseline[0][i]),
+                                     ("With_Buffer", estimates[2][:, i], baseline[1][i])]:
+            row[f"{label}_Today_Gbps"] = round(float(today), 3)
+            row[f"{label}_Mean_Gbps"] = round(float(values.mean()), 3)
+            for q in percentiles:
+                row[f"{label}_P{q}_Gbps"] = round(float(np.percentile(values, q)), 3)
+            row[f"{label}_Max_Gbps"] = round(float(values.max()), 3)
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+# MAIN
+def main(clean_dir=CLEAN_DIR, mapping_file=MAPPING_FILE, out_dir=OUT_DIR,
+         growth_file=None, num_scenarios=NUM_SCENARIOS, years=YEARS,
+         growth_per_year=GROWTH_PER_YEAR, sigma=GROWTH_SIGMA,
+         burst_max=BURST_SCALE_MAX, seed=SEED, max_workers=MAX_WORKERS):
+    os.makedirs(out_dir, exist_ok=True)
+
+    link_groups = link_traffic.link_groups_from_mapping(pd.read_csv(mapping_file))
+    cells = sorted(c for cs in link_groups.values() for c in cs)
+    cell_traces = link_traffic.load_cell_traces(clean_dir, cells)
+
+    # Planned growth over the horizon, per cell (optional Cell / Growth_Per_Year table)
+    rates = pd.Series(growth_per_year, index=cells)
+    if growth_file:
+        table = pd.read_csv(growth_file)
+        ids = table["Cell"].astype(str).str.extract(r"(\d+)")[0].astype(int)
+        rates.update(pd.Series(table["Growth_Per_Year"].values, index=ids.values))
+    planned = (1.0 + rates.values) ** years
+    print(f"{num_scenarios} scenarios over {years} years, planned growth "
+          f"x{planned.min():.2f}-x{planned.max():.2f} per cell")
+
+    growth, burst = draw_scenarios(planned, num_scenarios, seed, sigma, burst_max)
+    with instr.span("growth_montecarlo", scenarios=num_scenarios):
+        link_ids, estimates = run_scenarios(
+            cell_traces, link_groups, growth, burst, max_workers=max_workers
+        )
+
+    # Today = a scenario without growth or bursts, on the same trimmed slots
+    ones = np.ones((1, len(cells)))
+    _, today = run_scenarios(cell_traces, link_groups, ones, ones, max_workers=1)
+    baseline = (today[1][0], today[2][0])
+
+    scenarios_out = os.path.join(out_dir, "growth_scenarios.csv")
+    distribution_out = os.path.join(out_dir, "growth_capacity_distribution.csv")
+    scenario_table(link_ids, estimates).to_csv(scenarios_out, index=False)
+    distribution = distribution_table(link_ids, estimates, baseline)
+    distribution.to_csv(distribution_out, index=False)
+
+    print(distribution.to_string(index=False))
+    for path in [scenarios_out, distribution_out]:
+        instr.count_file(path)
+        print(f"Saved: {path}")
+
+    return distribution
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Monte Carlo of link capacity under per-cell traffic growth and burst scaling"
+    )
+    parser.add_argument("--clean-dir", default=CLEAN_DIR)
+    parser.add_argument("--mapping", default=MAPPING_FILE)
+    parser.add_argument("--out-dir", default=OUT_DIR)
+    parser.add_argument("--growth-file", default=None,
+                        help="per-cell Cell / Growth_Per_Year table (default: --growth-per-year)")
+    parser.add_argument("--scenarios", type=int, default=NUM_SCENARIOS)
+    parser.add_argument("--years", type=float, default=YEARS)
+    parser.add_argument("--growth-per-year", type=float, default=GROWTH_PER_YEAR)
+    parser.add_argument("--sigma", type=float, default=GROWTH_SIGMA,
+                        help="log-normal spread of the per-cell growth factor")
+    parser.add_argument("--burst-max", type=float, default=BURST_SCALE_MAX)
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--jobs", type=int, default=MAX_WORKERS)
+    instr.add_arguments(parser)
+    args = parser.parse_args()
+
+    instr.configure_from_args(args)
+    main(args.clean_dir, args.mapping, args.out_dir, args.growth_file,
+         args.scenarios, args.years, args.growth_per_year, args.sigma,
+         args.burst_max, args.seed, args.jobs)
@@ -0,0 +1,229 @@
+import os
+import argparse
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+
+import instrumentation as instr
+import build_link_slot_traffic as link_traffic
+import estimate_capacity_no_buffer as cap_no_buf
+import estimate_capacity_with_buffer as cap_buf
+import estimate_capacity_batched as batched
+
+# PATHS
+CLEAN_DIR = link_traffic.CLEAN_DIR
+MAPPING_FILE = os.path.join(link_traffic.TOPO_DIR, "cell_to_link_mapping.csv")
+OUT_DIR = cap_no_buf.OUT_DIR
+
+# PARAMETERS
+MAX_WORKERS = os.cpu_count()
+
+
+# TREE
+# The tree is a list of tiers from the bottom up: [(name, {node: [children]})].
+# The first tier groups cells into links (the member3 mapping); every tier
+# above groups the nodes of the tier below, e.g. links into aggregation
+# switches from a Link_ID / Switch_ID table.
+def tier_from_mapping(mapping_df):
+    """
+    (tier name, {parent: [child, ...]}) from a two-column child / parent
+    table. The name comes from the parent column ("Switch_ID" → "Switch");
+    numbered child labels such as "Link 3" are reduced to their number.
+    """
+    child, parent = mapping_df.columns[:2]
+    children = mapping_df[child]
+    if not pd.api.types.is_numeric_dtype(children):
+        numbers = children.astype(str).str.extract(r"(\d+)$")[0]
+        if numbers.notna().all():
+            children = numbers.astype(int)
+    groups = pd.Series(children.values, index=mapping_df[parent].values).groupby(level=0).apply(list)
+    return parent.removesuffix("_ID"), groups.to_dict()
+
+
+def check_tiers(tiers):
+    for (below, lower), (name, upper) in zip(tiers, tiers[1:]):
+        placed = [c for cs in upper.values() for c in cs]
+        unknown = set(placed).difference(lower)
+        if unknown:
+            raise KeyError(f"{name} tier: unknown {below} nodes {sorted(unknown)}")
+        if len(placed) != len(set(placed)):
+            raise ValueError(f"{name} tier: a {below} node has several parents")
+        orphans = set(lower).difference(placed)
+        if orphans:
+            print(f"[WARN] {below} nodes {sorted(orphans)} have no {name} parent")
+
+
+def subtrees(tiers, split):
+    """
+    [(root, [tier groups restricted to the subtree, tiers 0..split])] for
+    every node of tier `split`
+    """
+    result = []
+    for root in sorted(tiers[split][1]):
+        groups = [None] * (split + 1)
+        nodes = [root]
+        for level in range(split, -1, -1):
+            groups[level] = {n: tiers[level][1][n] for n in nodes}
+            nodes = [c for n in nodes for c in groups[level][n]]
+        result.append((root, groups))
+    return result
+
+
+# ESTIMATION
+def estimate_nodes(traces, params):
+    """
+    {node: (avg, no buffer, with buffer)} for {node: per-slot Gbps},
+    all rows in one batched call
+    """
+    ids, traffic, lengths = batched.stack_links(traces)
+    if not ids:
+        return {}
+    avg, no_buf, with_buf, _ = batched.estimate_rows(traffic, lengths, *params)
+    return {node: (avg[i], no_buf[i], with_buf[i]) for i, node in enumerate(ids)}
+
+
+def tier_sums(groups, child_sums):
+    """
+    {node: per-slot Gbps} of one tier, each node the slot-wise sum of its
+    children's sums (trimmed to the shortest)
+    """
+    return {
+        node: link_traffic.sum_cell_traces([child_sums[c] for c in children])
+        for node, children in groups.items() if children
+    }
+
+
+def evaluate_subtree(clean_dir, names, groups, params):
+    """
+    Worker: read the subtree's cells, build every tier's sums from the one
+    below and estimate each tier batched. Returns (rows, root sum).
+    """
+    cells = sorted(c for cs in groups[0].values() for c in cs)
+    sums = link_traffic.load_cell_traces(clean_dir, cells)
+    rows = []
+    for name, tier_groups in zip(names, groups):
+        sums = tier_sums(tier_groups, sums)
+        rows.extend((name, node, estimates) for node, estimates in estimate_nodes(sums, params).items())
+    (root, trace), = sums.items()
+    return rows, root, trace
+
+
+def evaluate_tree(clean_dir, tiers, window=cap_no_buf.WINDOW,
+                  loss_percentile=cap_no_buf.LOSS_PERCENTILE,
+                  loss_limit=cap_buf.LOSS_LIMIT,
+                  buffer_time_sec=cap_buf.BUFFER_TIME_SEC,
+                  max_workers=MAX_WORKERS):
+    """
+    Both capacity estimates for every node of every tier. The subtrees
+    under the top tier are independent and go to a process pool; the top
+    tier is then summed from their root traces in this process.
+    Returns {tier: {node: (avg, no buffer, with buffer)}}.
+    """
+    params = (window, loss_percentile, loss_limit, buffer_time_sec)
+    names = [name for name, _ in tiers]
+    split = max(0, len(tiers) - 2)
+    results = {name: {} for name in names}
+    root_sums = {}
+
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        futures = [
+            pool.submit(evaluate_subtree, clean_dir, names[:split + 1], groups, params)
+            for _, groups in subtrees(tiers, split)
+        ]
+        for future in futures:
+            rows, root, trace = future.result()
+            for name, node, estimates in rows:
+                results[name][node] = estimates
+            root_sums[root] = trace
+
+    sums = root_sums
+    for name, groups in tiers[split + 1:]:
+        with instr.span("tier_capacity", tier=name, nodes=len(groups)):
+            sums = tier_sums(groups, sums)
+            results[name].update(estimate_nodes(sums, params))
+    return results
+
+
+def capacity_table(tiers, results):
+    """
+    One row per node, bottom tier first, with the sum of its children's
+    estimates next to its own on every tier above the links
+    """
+    rows = []
+    cells_under = {}
+    for level, (name, groups) in enumerate(tiers):
+        parent_of = {c: p for p, cs in tiers[level + 1][1].items() for c in cs} \
+            if level + 1 < len(tiers) else {}
+        below = results[tiers[level - 1][0]] if level else None
+
+        for node in sorted(results[name]):
+            children = groups[node]
+            cells_under[name, node] = (
+                len(children) if level == 0
+                else sum(cells_under[tiers[level - 1][0], c] for c in children)
+            )
+            avg, no_buf, with_buf = results[name][node]
+            row = {
+                "Tier": name,
+                "Node": node,
+                "Parent": parent_of.get(node, ""),
+                "Children": len(children),
+                "Cells": cells_under[name, node],
+                "Avg_Traffic_Gbps": round(float(avg), 3),
+                "Required_Capacity_No_Buffer_Gbps": round(float(no_buf), 3),
+                "Required_Capacity_With_Buffer_Gbps": round(float(with_buf), 3),
+            }
+            if below is not None:
+                row["Sum_Of_Children_No_Buffer_Gbps"] = round(
+                    float(sum(below[c][1] for c in children)), 3)
+                row["Sum_Of_Children_With_Buffer_Gbps"] = round(
+                    float(sum(below[c][2] for c in children)), 3)
+            rows.append(row)
+    return pd.DataFrame(rows)
+
+
+# MAIN
+def main(clean_dir=CLEAN_DIR, mapping_file=MAPPING_FILE, tier_files=(),
+         out_dir=OUT_DIR, window=cap_no_buf.WINDOW,
+         loss_percentile=cap_no_buf.LOSS_PERCENTILE,
+         loss_limit=cap_buf.LOSS_LIMIT, buffer_time_sec=cap_buf.BUFFER_TIME_SEC,
+         max_workers=MAX_WORKERS):
+    os.makedirs(out_dir, exist_ok=True)
+
+    tiers = [("Link", link_traffic.link_groups_from_mapping(pd.read_csv(mapping_file)))]
+    for path in tier_files:
+        tiers.append(tier_from_mapping(pd.read_csv(path)))
+    check_tiers(tiers)
+    print("Tiers: " + " → ".join(f"{name} ({len(groups)})" for name, groups in tiers))
+
+    with instr.span("hierarchical_capacity", tiers=len(tiers)):
+        results = evaluate_tree(
+            clean_dir, tiers, window, loss_percentile, loss_limit,
+            buffer_time_sec, max_workers
+        )
+    table = capacity_table(tiers, results)
+
+    out_file = os.path.join(out_dir, "hierarchical_capacity.csv")
+    table.to_csv(out_file, index=False)
+    instr.count_file(out_file)
+
+    print(table.to_string(index=False))
+    print(f"Saved: {out_file}")
+    return table
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Required capacity at every tier of a cell → link → aggregation tree"
+    )
+    parser.add_argument("--clean-dir", default=CLEAN_DIR)
+    parser.add_argument("--mapping", default=MAPPING_FILE)
+    parser.add_argument("--tier", nargs="*", default=[],
+                        help="child / parent CSVs for the tiers above the links, bottom up "
+                             "(e.g. Link_ID,Switch_ID)")
+    parser.add_argument("--out-dir", default=OUT_DIR)
+    parser.add_argument("--jobs", type=int, default=MAX_WORKERS)
+    instr.add_arguments(parser)
+    args = parser.parse_args()
+
+    instr.configure_from_args(args)
+    main(args.clean_dir, args.mapping, args.tier, args.out_dir, max_workers=args.jobs)
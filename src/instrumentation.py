@@ -0,0 +1,347 @@
+import os
+import io
+import sys
+import json
+import time
+import atexit
+import pstats
+import itertools
+import cProfile
+import threading
+import contextlib
+import tracemalloc
+import multiprocessing
+
+# PATHS
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TRACE_FILE = os.path.join(BASE_DIR, "output", "trace.json")
+
+# ENVIRONMENT TOGGLES
+# FRONTHAUL_TRACE=1 (or a file path) records spans/counters for the process
+# and writes them on exit; the other two add memory / cProfile capture.
+ENV_TRACE = "FRONTHAUL_TRACE"
+ENV_MEMORY = "FRONTHAUL_TRACE_MEMORY"
+ENV_PROFILE = "FRONTHAUL_PROFILE"
+
+PROFILE_TOP = 30          # functions kept from the cProfile capture
+ALLOC_TOP = 20            # allocation sites kept from tracemalloc
+
+
+# TRACE STATE
+class Tracer:
+    """
+    Collects nested timing spans and counters for one process
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.memory = False
+        self.profile = None
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.reset()
+
+    def reset(self):
+        self.t0 = time.perf_counter()
+        self.epoch = time.time()
+        self.ids = itertools.count()
+        self.spans = []
+        self.counters = {}
+        self.worker_profiles = []
+
+    def stack(self):
+        if not hasattr(self.local, "stack"):
+            self.local.stack = []
+        return self.local.stack
+
+
+_TRACER = Tracer()
+
+
+def enable(memory=False, profile=False):
+    """
+    Start recording (and optionally tracemalloc / cProfile) in this process
+    """
+    _TRACER.reset()
+    _TRACER.enabled = True
+    _TRACER.memory = memory
+
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+    # A fresh profiler per enable() so reused worker processes report only
+    # the stage they just ran
+    if _TRACER.profile is not None:
+        _TRACER.profile.disable()
+        _TRACER.profile = None
+    if profile:
+        _TRACER.profile = cProfile.Profile()
+        _TRACER.profile.enable()
+
+
+def reset():
+    """
+    Drop what has been recorded so far, keeping the current options
+    """
+    if _TRACER.enabled:
+        enable(_TRACER.memory, _TRACER.profile is not None)
+
+
+def disable():
+    _TRACER.enabled = False
+    if _TRACER.profile is not None:
+        _TRACER.profile.disable()
+    if _TRACER.memory and tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+def enabled():
+    return _TRACER.enabled
+
+
+# SPANS + COUNTERS
+@contextlib.contextmanager
+def _span(name, attrs):
+    stack = _TRACER.stack()
+    parent = stack[-1] if stack else None
+
+    record = {
+        "name": name,
+        "attrs": attrs,
+        "parent": parent["id"] if parent else None,
+        "depth": len(stack),
+        "pid": os.getpid(),
+        "start_sec": time.perf_counter() - _TRACER.t0,
+        "counters": {},
+    }
+    with _TRACER.lock:
+        record["id"] = next(_TRACER.ids)
+        _TRACER.spans.append(record)
+
+    # Peak memory per span: reset the tracemalloc peak on entry and hand the
+    # child's peak up to the parent on exit
+    if _TRACER.memory:
+        if parent is not None:
+            parent["mem_peak_bytes"] = max(
+                parent.get("mem_peak_bytes", 0), tracemalloc.get_traced_memory()[1]
+            )
+        tracemalloc.reset_peak()
+        record["mem_start_bytes"] = tracemalloc.get_traced_memory()[0]
+        record["mem_peak_bytes"] = 0
+
+    stack.append(record)
+    cpu = time.thread_time()
+    try:
+        yield record
+    finally:
+        record["wall_sec"] = time.perf_counter() - _TRACER.t0 - record["start_sec"]
+        record["cpu_sec"] = time.thread_time() - cpu
+        stack.pop()
+
+        # Counters are inclusive: a span also reports its children's
+        if parent is not None:
+            for key, n in record["counters"].items():
+                parent["counters"][key] = parent["counters"].get(key, 0) + n
+
+        if _TRACER.memory:
+            record["mem_peak_bytes"] = max(
+                record["mem_peak_bytes"], tracemalloc.get_traced_memory()[1]
+            )
+            tracemalloc.reset_peak()
+            if parent is not None:
+                parent["mem_peak_bytes"] = max(
+                    parent.get("mem_peak_bytes", 0), record["mem_peak_bytes"]
+                )
+
+
+def span(name, **attrs):
+    """
+    Time a block: `with span("capacity_with_buffer", link=3): ...`.
+    Costs one attribute check when tracing is off.
+    """
+    if not _TRACER.enabled:
+        return contextlib.nullcontext()
+    return _span(name, attrs)
+
+
+def count(name, n=1):
+    """
+    Add n to a counter, both globally and on the innermost open span
+    """
+    if not _TRACER.enabled:
+        return
+    with _TRACER.lock:
+        _TRACER.counters[name] = _TRACER.counters.get(name, 0) + n
+    stack = _TRACER.stack()
+    if stack:
+        counters = stack[-1]["counters"]
+        counters[name] = counters.get(name, 0) + n
+
+
+def count_file(path, name="bytes_written"):
+    if _TRACER.enabled and os.path.exists(path):
+        count(name, os.path.getsize(path))
+
+
+# EXPORT
+def _profile_summary(profile):
+    out = io.StringIO()
+    stats = pstats.Stats(profile, stream=out)
+    rows = []
+
+    for (filename, line, func), (cc, nc, tt, ct, _) in stats.stats.items():
+        rows.append({
+            "function": f"{os.path.basename(filename)}:{line}({func})",
+            "calls": nc,
+            "self_sec": round(tt, 6),
+            "cumulative_sec": round(ct, 6),
+        })
+
+    rows.sort(key=lambda r: r["cumulative_sec"], reverse=True)
+    return rows[:PROFILE_TOP]
+
+
+def _allocation_summary():
+    snapshot = tracemalloc.take_snapshot().filter_traces([
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, __file__),
+        tracemalloc.Filter(False, cProfile.__file__),
+    ])
+    return [
+        {
+            "site": f"{os.path.basename(stat.traceback[0].filename)}:"
+                    f"{stat.traceback[0].lineno}",
+            "bytes": stat.size,
+            "blocks": stat.count,
+        }
+        for stat in snapshot.statistics("lineno")[:ALLOC_TOP]
+    ]
+
+
+def snapshot():
+    """
+    The trace so far as a JSON-serialisable dict
+    """
+    trace = {
+        "epoch": _TRACER.epoch,
+        "argv": sys.argv,
+        "pid": os.getpid(),
+        "elapsed_sec": time.perf_counter() - _TRACER.t0,
+        "spans": [dict(s) for s in _TRACER.spans if "wall_sec" in s],
+        "counters": dict(_TRACER.counters),
+    }
+    if _TRACER.profile is not None:
+        _TRACER.profile.disable()
+        trace["profile"] = _profile_summary(_TRACER.profile)
+        _TRACER.profile.enable()
+    if _TRACER.memory and tracemalloc.is_tracing():
+        trace["memory_peak_bytes"] = tracemalloc.get_traced_memory()[1]
+        trace["allocations"] = _allocation_summary()
+    return trace
+
+
+def merge(trace, parent=None):
+    """
+    Fold a trace recorded in another process (e.g. a runner worker) into
+    this one, re-basing its spans onto this process's clock
+    """
+    if not _TRACER.enabled:
+        return
+
+    offset = trace["epoch"] - _TRACER.epoch
+    with _TRACER.lock:
+        new_ids = {s["id"]: next(_TRACER.ids) for s in trace["spans"]}
+        for s in trace["spans"]:
+            s = dict(s)
+            s["id"] = new_ids[s["id"]]
+            s["start_sec"] += offset
+            s["parent"] = new_ids.get(s["parent"], parent)
+            _TRACER.spans.append(s)
+
+        for name, n in trace["counters"].items():
+            _TRACER.counters[name] = _TRACER.counters.get(name, 0) + n
+
+        if "profile" in trace or "allocations" in trace:
+            _TRACER.worker_profiles.append({
+                "pid": trace["pid"],
+                "root": next(
+                    (s["name"] for s in trace["spans"] if s["parent"] is None),
+                    None
+                ),
+                "functions": trace.get("profile", []),
+                "allocations": trace.get("allocations", []),
+            })
+
+
+def write(path=TRACE_FILE):
+    trace = snapshot()
+
+    # Worker profiles are kept per worker rather than summed
+    if _TRACER.worker_profiles:
+        trace["worker_profiles"] = list(_TRACER.worker_profiles)
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(trace, f, indent=1)
+    return path
+
+
+# ENVIRONMENT SETUP
+def _env_flag(name):
+    return os.environ.get(name, "").lower() not in ("", "0", "false", "no")
+
+
+def trace_path_from_env():
+    value = os.environ.get(ENV_TRACE, "")
+    if value.lower() in ("", "0", "false", "no"):
+        return None
+    if value.lower() in ("1", "true", "yes"):
+        return TRACE_FILE
+    return value
+
+
+def configure_from_env():
+    """
+    Enable tracing when FRONTHAUL_TRACE is set. The top-level process writes
+    the trace on exit; worker processes leave that to whoever spawned them.
+    """
+    path = trace_path_from_env()
+    if path is None or _TRACER.enabled:
+        return
+
+    enable(memory=_env_flag(ENV_MEMORY), profile=_env_flag(ENV_PROFILE))
+    if multiprocessing.parent_process() is None:
+        atexit.register(write, path)
+
+
+def add_arguments(parser):
+    """
+    --trace / --trace-memory / --profile for a script's argparse CLI
+    """
+    parser.add_argument("--trace", nargs="?", const="", metavar="PATH",
+                        help="write a JSON timing trace (default <out>/trace.json)")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="also record tracemalloc peaks (slower)")
+    parser.add_argument("--profile", action="store_true",
+                        help="also capture a cProfile summary (slower)")
+
+
+def configure_from_args(args, default_path=TRACE_FILE):
+    """
+    Apply the add_arguments() flags by setting the environment toggles, so
+    worker processes pick them up too. Returns the trace path or None.
+    """
+    if args.trace is None and not (args.trace_memory or args.profile):
+        return trace_path_from_env()
+
+    os.environ[ENV_TRACE] = args.trace or default_path
+    if args.trace_memory:
+        os.environ[ENV_MEMORY] = "1"
+    if args.profile:
+        os.environ[ENV_PROFILE] = "1"
+
+    configure_from_env()
+    return os.environ[ENV_TRACE]
+
+
+configure_from_env()
@@ -0,0 +1,292 @@
+import os
+import re
+import sys
+import json
+import zlib
+import struct
+import argparse
+import numpy as np
+import pandas as pd
+
+import instrumentation as instr
+
+# FORMAT
+# link_N_slot_traffic.fhlt holds one link's per-slot Gbps trace. The slot
+# index is implicit. Values are stored in independently compressed blocks
+# of CHUNK_SLOTS slots, so any slot range can be read by decoding only the
+# blocks it touches:
+#
+#   "FHLT" | block 0 | block 1 | ... | footer (JSON) | footer length (u64) | "FHLT"
+#
+# Each block is zlib over the byte-shuffled values in one of these codecs:
+#   i4  int32 count of SCALE_GBPS steps (1 bit per 500 µs slot). Used when
+#       every value is a whole number of bits, which is always the case for
+#       traces built from the raw kbits (3 decimals).
+#   f8  raw float64 for anything else (lossless).
+EXTENSION = ".fhlt"
+MAGIC = b"FHLT"
+VERSION = 1
+TRAILER = struct.Struct("<Q4s")
+CHUNK_SLOTS = 1 << 16
+SCALE_GBPS = 2e-6                     # 1 bit per 500 µs slot
+SCALE_TOLERANCE = 1e-9                # float noise allowed on a whole bit
+COMPRESS_LEVEL = 6
+LINK_FILE = re.compile(r"link_(\d+)_slot_traffic(" + re.escape(EXTENSION) + r"|\.csv)")
+
+
+def _shuffle(values):
+    # Bytes of equal significance side by side compress far better
+    return values.view(np.uint8).reshape(-1, values.dtype.itemsize).T.tobytes()
+
+
+def _unshuffle(data, dtype, count):
+    dtype = np.dtype(dtype)
+    raw = np.frombuffer(data, dtype=np.uint8).reshape(dtype.itemsize, count)
+    return np.ascontiguousarray(raw.T).view(dtype).ravel()
+
+
+def encode_block(values, scale=SCALE_GBPS):
+    """
+    Return (codec, compressed bytes) for one block of Gbps values
+    """
+    values = np.asarray(values, dtype=np.float64)
+    steps = np.rint(values / scale)
+
+    if (len(values) and np.all(np.abs(steps * scale - values) <= SCALE_TOLERANCE)
+            and steps.min() >= 0 and steps.max() <= np.iinfo(np.int32).max):
+        codec, data = "i4", _shuffle(steps.astype("<i4"))
+    else:
+        codec, data = "f8", _shuffle(values.astype("<f8"))
+
+    return codec, zlib.compress(data, COMPRESS_LEVEL)
+
+
+def decode_block(codec, data, count, scale=SCALE_GBPS):
+    raw = zlib.decompress(data)
+    if codec == "i4":
+        return _unshuffle(raw, "<i4", count) * scale
+    return _unshuffle(raw, "<f8", count).astype(np.float64)
+
+
+# WRITING
+class Writer:
+    """
+    Append-only writer; values can be added in pieces of any size
+    """
+
+    def __init__(self, path, chunk_slots=CHUNK_SLOTS, scale=SCALE_GBPS):
+        self.path = path
+        self.chunk_slots = chunk_slots
+        self.scale = scale
+        self.file = open(path, "wb")
+        self.file.write(MAGIC)
+        self.blocks = []
+        self.pending = []
+        self.pending_slots = 0
+        self.slots = 0
+
+    def append(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        self.pending.append(values)
+        self.pending_slots += len(values)
+
+        if self.pending_slots >= self.chunk_slots:
+            buffered = np.concatenate(self.pending)
+            whole = len(buffered) // self.chunk_slots * self.chunk_slots
+            for start in range(0, whole, self.chunk_slots):
+                self._write_block(buffered[start:start + self.chunk_slots])
+            self.pending = [buffered[whole:]]
+            self.pending_slots = len(buffered) - whole
+
+    def _write_block(self, values):
+        codec, data = encode_block(values, self.scale)
+        self.blocks.append([self.file.tell(), len(data), codec, len(values)])
+        self.file.write(data)
+        self.slots += len(values)
+
+    def close(self):
+        if self.pending_slots:
+            self._write_block(np.concatenate(self.pending))
+        self.pending = []
+
+        footer = json.dumps({
+            "version": VERSION,
+            "slots": self.slots,
+            "chunk_slots": self.chunk_slots,
+            "scale": self.scale,
+            "blocks": self.blocks,
+        }).encode()
+        self.file.write(footer)
+        self.file.write(TRAILER.pack(len(footer), MAGIC))
+        self.file.close()
+        instr.count_file(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def write(path, values, chunk_slots=CHUNK_SLOTS):
+    with Writer(path, chunk_slots) as writer:
+        writer.append(values)
+
+
+# READING
+class Reader:
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a link-traffic file")
+            f.seek(-TRAILER.size, os.SEEK_END)
+            footer_len, magic = TRAILER.unpack(f.read(TRAILER.size))
+            if magic != MAGIC:
+                raise ValueError(f"{path} is truncated (no footer)")
+            f.seek(-TRAILER.size - footer_len, os.SEEK_END)
+            footer = json.loads(f.read(footer_len))
+
+        if footer["version"] != VERSION:
+            raise ValueError(f"{path}: unsupported version {footer['version']}")
+        self.slots = footer["slots"]
+        self.chunk_slots = footer["chunk_slots"]
+        self.scale = footer["scale"]
+        self.blocks = footer["blocks"]
+
+    def __len__(self):
+        return self.slots
+
+    def read(self, start=0, stop=None):
+        """
+        Slots [start, stop) as float64 Gbps, decoding only the blocks needed
+        """
+        stop = self.slots if stop is None else min(stop, self.slots)
+        start = max(start, 0)
+        if stop <= start:
+            return np.empty(0)
+
+        first = start // self.chunk_slots
+        last = (stop - 1) // self.chunk_slots
+        parts = []
+
+        with open(self.path, "rb") as f:
+            for offset, size, codec, count in self.blocks[first:last + 1]:
+                f.seek(offset)
+                parts.append(decode_block(codec, f.read(size), count, self.scale))
+        instr.count("bytes_read", sum(b[1] for b in self.blocks[first:last + 1]))
+
+        values = np.concatenate(parts)
+        skip = start - first * self.chunk_slots
+        return values[skip:skip + stop - start]
+
+
+def read(path, start=0, stop=None):
+    return Reader(path).read(start, stop)
+
+
+# LINK DIRECTORIES
+def link_path(link_dir, link_id):
+    return os.path.join(link_dir, f"link_{link_id}_slot_traffic{EXTENSION}")
+
+
+def link_files(link_dir):
+    """
+    {link_id: path} for every link trace in link_dir, ordered by link id.
+    Older link_N_slot_traffic.csv files are picked up when no .fhlt
+    version exists.
+    """
+    found = {}
+    for fname in os.listdir(link_dir):
+        match = LINK_FILE.fullmatch(fname)
+        if match is None:
+            continue
+        link_id = int(match.group(1))
+        if match.group(2) == EXTENSION or link_id not in found:
+            found[link_id] = os.path.join(link_dir, fname)
+    return {link_id: found[link_id] for link_id in sorted(found)}
+
+
+def clear_links(link_dir):
+    """
+    Remove every link_N_slot_traffic file (.fhlt or legacy .csv) from
+    link_dir, so a run with fewer links leaves no stale traces behind
+    """
+    if not os.path.isdir(link_dir):
+        return
+    for fname in os.listdir(link_dir):
+        if LINK_FILE.fullmatch(fname):
+            os.remove(os.path.join(link_dir, fname))
+
+
+def load_link(path, start=0, stop=None):
+    """
+    Per-slot Gbps of one link file (.fhlt or legacy .csv)
+    """
+    if path.endswith(EXTENSION):
+        return read(path, start, stop)
+
+    instr.count_file(path, "bytes_read")
+    return pd.read_csv(path)["data_rate_gbps"].values[start:stop]
+
+
+def load_links(link_dir):
+    """
+    {link_id: per-slot Gbps} for every link trace in link_dir
+    """
+    return {link_id: load_link(path) for link_id, path in link_files(link_dir).items()}
+
+
+# MAIN
+def convert(link_dir, remove=False):
+    """
+    Rewrite every legacy CSV in link_dir as .fhlt
+    """
+    for link_id, path in link_files(link_dir).items():
+        if not path.endswith(".csv"):
+            continue
+        out_file = link_path(link_dir, link_id)
+        write(out_file, load_link(path))
+        print(f"Link {link_id}: {os.path.getsize(path) / 1e6:.2f} MB → "
+              f"{os.path.getsize(out_file) / 1e6:.3f} MB")
+        if remove:
+            os.remove(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Link-traffic file utilities")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    conv = sub.add_parser("convert", help="CSV link traces → .fhlt")
+    conv.add_argument("link_dir")
+    conv.add_argument("--remove", action="store_true", help="delete the CSVs")
+
+    info = sub.add_parser("info", help="blocks and codecs of a .fhlt file")
+    info.add_argument("path")
+
+    cat = sub.add_parser("cat", help="print a slot range as CSV")
+    cat.add_argument("path")
+    cat.add_argument("--start", type=int, default=0)
+    cat.add_argument("--stop", type=int, default=None)
+
+    args = parser.parse_args()
+
+    if args.command == "convert":
+        convert(args.link_dir, args.remove)
+    elif args.command == "info":
+        reader = Reader(args.path)
+        codecs = pd.Series([b[2] for b in reader.blocks]).value_counts().to_dict()
+        print(f"{reader.slots} slots in {len(reader.blocks)} blocks "
+              f"of {reader.chunk_slots}, codecs {codecs}, "
+              f"{os.path.getsize(args.path) / reader.slots:.2f} bytes/slot")
+    elif args.command == "cat":
+        values = read(args.path, args.start, args.stop)
+        start = max(args.start, 0)
+        pd.DataFrame({
+            "slot_index": np.arange(start, start + len(values)),
+            "data_rate_gbps": values
+        }).to_csv(sys.stdout, index=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,455 @@
+import io
+import os
+import asyncio
+import argparse
+import numpy as np
+import pandas as pd
+
+import instrumentation as instr
+import pipeline
+import preprocess_member1 as member1
+import build_link_slot_traffic as link_traffic
+import estimate_capacity_no_buffer as cap_no_buf
+import estimate_capacity_with_buffer as cap_buf
+
+# PATHS
+DATA_DIR = pipeline.DATA_DIR
+MAPPING_FILE = os.path.join(pipeline.OUTPUT_DIR, "member3", "cell_to_link_mapping.csv")
+
+# PARAMETERS
+RING_SLOTS = 20_000          # slots kept per cell (10 s of trace)
+GLITCH_SYMBOLS = 14 * 20_000 # recent symbols the glitch quantile is taken over
+POLL_SEC = 0.2               # wait between reads when a file has not grown
+REPORT_SEC = 5.0             # estimator refresh period
+READ_BYTES = 1 << 20         # most bytes parsed per read
+
+
+# RING BUFFERS
+class RingBuffer:
+    """
+    Fixed-size store of the newest rows of a per-slot trace. Rows are
+    addressed by absolute index (0 = first row ever appended, or the index
+    given to start_at()), so traces of different cells can be aligned slot
+    by slot.
+    """
+
+    def __init__(self, capacity, columns):
+        self.data = np.zeros((capacity, len(columns)))
+        self.columns = list(columns)
+        self.origin = 0
+        self.total = 0
+
+    def __len__(self):
+        return min(self.total - self.origin, len(self.data))
+
+    @property
+    def first(self):
+        return self.total - len(self)
+
+    def extend(self, rows):
+        rows = np.asarray(rows, dtype=float).reshape(-1, len(self.columns))
+        capacity = len(self.data)
+
+        # Only the last `capacity` rows of a large batch can survive
+        skip = max(len(rows) - capacity, 0)
+        start = (self.total + skip) % capacity
+        kept = rows[skip:]
+
+        head = min(len(kept), capacity - start)
+        self.data[start:start + head] = kept[:head]
+        self.data[:len(kept) - head] = kept[head:]
+        self.total += len(rows)
+
+    def skip(self, n):
+        """
+        Advance by n idle (all-zero) rows without building them
+        """
+        capacity = len(self.data)
+        start = self.total % capacity
+        head = min(n, capacity, capacity - start)
+        self.data[start:start + head] = 0.0
+        self.data[:min(n, capacity) - head] = 0.0
+        self.total += n
+
+    def start_at(self, index):
+        """
+        Make the next appended row absolute index `index` (empty ring only),
+        e.g. after skipping the start of a file
+        """
+        if self.total != self.origin:
+            raise ValueError("ring already holds rows")
+        self.origin = self.total = index
+
+    def clear(self):
+        """
+        Drop every row and number the next one 0 again, e.g. after the
+        source file was rotated
+        """
+        self.origin = self.total = 0
+
+    def slice(self, start, stop):
+        """
+        Rows [start, stop) by absolute index, clipped to what is still held
+        """
+        start = max(start, self.first)
+        stop = min(stop, self.total)
+        if stop <= start:
+            return np.empty((0, len(self.columns)))
+
+        idx = np.arange(start, stop) % len(self.data)
+        return self.data[idx]
+
+    def latest(self, n=None):
+        n = len(self) if n is None else min(n, len(self))
+        return self.slice(self.total - n, self.total)
+
+    def column(self, name, start=None, stop=None):
+        start = self.first if start is None else start
+        stop = self.total if stop is None else stop
+        return self.slice(start, stop)[:, self.columns.index(name)]
+
+
+# FILE TAILING
+class FileTail:
+    """
+    Incremental reader for one growing text file: each read() returns only
+    the complete lines appended since the last call. A truncated or
+    replaced file is read again from the start.
+    """
+
+    def __init__(self, path, from_end=False):
+        self.path = path
+        self.offset = 0
+        self.partial = b""
+        self.inode = None
+        self.lines = 0
+        self.resets = 0
+        self.from_end = from_end
+
+    def _skip_to_end(self, f):
+        # Count the lines skipped so symbol → slot grouping keeps its phase,
+        # and resume at the start of the last (possibly unfinished) line
+        while True:
+            block = f.read(READ_BYTES)
+            if not block:
+                break
+            self.lines += block.count(b"\n")
+            if b"\n" in block:
+                line_start = self.offset + block.rfind(b"\n") + 1
+            self.offset += len(block)
+        self.offset = line_start if self.lines else 0
+
+    def read(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return b""
+
+        if stat.st_ino != self.inode or stat.st_size < self.offset:
+            # New, rotated or truncated file
+            self.inode = stat.st_ino
+            self.offset = 0
+            self.partial = b""
+            self.lines = 0
+            self.resets += 1
+            if self.from_end:
+                with open(self.path, "rb") as f:
+                    self._skip_to_end(f)
+                self.from_end = False
+                return b""
+
+        if stat.st_size == self.offset:
+            return b""
+
+        with open(self.path, "rb") as f:
+            f.seek(self.offset)
+            block = f.read(READ_BYTES)
+        self.offset += len(block)
+        instr.count("bytes_read", len(block))
+
+        # Hold back a trailing line that the writer has not finished yet
+        block = self.partial + block
+        end = block.rfind(b"\n") + 1
+        self.partial = block[end:]
+        complete = block[:end]
+        self.lines += complete.count(b"\n")
+        return complete
+
+
+def parse_rows(block, names):
+    if not block.strip():
+        return pd.DataFrame(columns=names, dtype=float)
+    df = pd.read_csv(io.BytesIO(block), sep=r"\s+", header=None, names=names)
+    instr.count("rows_parsed", len(df))
+    return df
+
+
+# PER-CELL STREAMS
+class CellStream:
+    """
+    Tails throughput-cell-N.dat / pkt-stats-cell-N.dat and appends finished
+    slots to two ring buffers: throughput (timestamp_slot, data_rate_gbps)
+    and loss (timestamp_slot, loss_ratio).
+    """
+
+    def __init__(self, cell_id, data_dir=DATA_DIR, ring_slots=RING_SLOTS,
+                 from_end=False):
+        self.cell_id = cell_id
+        self.thr_tail = FileTail(
+            os.path.join(data_dir, "throughput", f"throughput-cell-{cell_id}.dat"),
+            from_end
+        )
+        self.pkt_tail = FileTail(
+            os.path.join(data_dir, "pkt-stats", f"pkt-stats-cell-{cell_id}.dat"),
+            from_end
+        )
+
+        self.throughput = RingBuffer(ring_slots, ["timestamp_slot", "data_rate_gbps"])
+        self.loss = RingBuffer(ring_slots, ["timestamp_slot", "loss_ratio"])
+        self.recent_kbits = RingBuffer(GLITCH_SYMBOLS, ["kbits"])
+
+        # Symbols of a slot whose 14 symbols have not all arrived yet
+        self.pending = pd.DataFrame(columns=["timestamp", "kbits"], dtype=float)
+        self.thr_resets = 0
+        self.pkt_resets = 0
+
+    def poll_throughput(self):
+        block = self.thr_tail.read()
+        if self.thr_tail.resets != self.thr_resets:
+            # File was replaced: forget the old one, half-collected slot and
+            # glitch window included, and number slots from the new file's start
+            self.thr_resets = self.thr_tail.resets
+            self.pending = self.pending.iloc[:0]
+            self.throughput.clear()
+            self.recent_kbits.clear()
+
+        if not block:
+            return 0
+
+        df = parse_rows(block, ["timestamp", "kbits"])
+        if self.pending.empty:
+            # Skipped lines (--from-end) may have left us mid-slot
+            skipped = self.thr_tail.lines - len(df)
+            phase = skipped % member1.SYMBOLS_PER_SLOT
+            if phase:
+                df = df.iloc[member1.SYMBOLS_PER_SLOT - phase:]
+
+            # Number the first slot as a batch run over the whole file would
+            if not len(self.throughput):
+                self.throughput.start_at(-(-skipped // member1.SYMBOLS_PER_SLOT))
+        else:
+            df = pd.concat([self.pending, df])
+        df = df.reset_index(drop=True)
+
+        self.recent_kbits.extend(df["kbits"].values[len(self.pending):])
+
+        whole = len(df) // member1.SYMBOLS_PER_SLOT * member1.SYMBOLS_PER_SLOT
+        self.pending = df.iloc[whole:].reset_index(drop=True)
+        if whole == 0:
+            return 0
+
+        # Glitch threshold over the recent window instead of the whole file
+        upper = np.quantile(self.recent_kbits.column("kbits"), member1.GLITCH_QUANTILE)
+        slot_df = member1.symbols_to_slots(df.iloc[:whole].copy(), upper)
+
+        self.throughput.extend(slot_df.values)
+        instr.count("slots", len(slot_df))
+        return len(slot_df)
+
+    def poll_pktstats(self):
+        block = self.pkt_tail.read()
+        if self.pkt_tail.resets != self.pkt_resets:
+            self.pkt_resets = self.pkt_tail.resets
+            self.loss.clear()
+
+        if not block:
+            return 0
+
+        pkt_clean = member1.pktstats_to_loss(
+            parse_rows(block, ["timestamp", "tx", "rx", "too_late"])
+        )
+        if not len(self.loss):
+            # One line per slot: skipped lines are skipped slots
+            self.loss.start_at(self.pkt_tail.lines - len(pkt_clean))
+        self.loss.extend(pkt_clean.values)
+        return len(pkt_clean)
+
+
+class LiveStore:
+    """
+    The ring buffers of every tailed cell, plus the latest estimates
+    """
+
+    def __init__(self, cells, data_dir=DATA_DIR, ring_slots=RING_SLOTS,
+                 from_end=False):
+        self.streams = {
+            cell_id: CellStream(cell_id, data_dir, ring_slots, from_end)
+            for cell_id in cells
+        }
+        self.estimates = None
+
+    def link_span(self, cells):
+        """
+        Absolute [start, stop) of the slots every cell in `cells` still holds;
+        empty until every cell has been seen
+        """
+        if not cells or any(c not in self.streams for c in cells):
+            return 0, 0
+        rings = [self.streams[c].throughput for c in cells]
+        return max(r.first for r in rings), min(r.total for r in rings)
+
+    def link_traffic(self, cells, start=None, stop=None):
+        """
+        Slot-wise sum over `cells` of the aligned slots in [start, stop)
+        (default: all of link_span), like sum_cell_traces
+        """
+        first, last = self.link_span(cells)
+        start = first if start is None else max(start, first)
+        stop = last if stop is None else min(stop, last)
+        if stop <= start:
+            return np.empty(0)
+
+        return link_traffic.sum_cell_traces([
+            self.streams[c].throughput.column("data_rate_gbps", start, stop)
+            for c in cells if c in self.streams
+        ])
+
+    def loss_signals(self):
+        """
+        {cell_id: newest loss ratios} for member2.prepare_signals()
+        """
+        return {
+            cell_id: s.loss.column("loss_ratio")
+            for cell_id, s in self.streams.items() if len(s.loss)
+        }
+
+
+# ASYNC LOOPS
+async def tail_cell(stream, poll_sec=POLL_SEC):
+    while True:
+        new = stream.poll_throughput() + stream.poll_pktstats()
+        # Back-to-back reads while catching up, then poll
+        await asyncio.sleep(0 if new else poll_sec)
+
+
+def estimate(link_traces, params):
+    """
+    Both estimates for {link_id: aligned link traffic} snapshots
+    """
+    rows = []
+
+    for link_id, traffic in sorted(link_traces.items()):
+        if len(traffic) == 0:
+            continue
+
+        with instr.span("live_estimate", link=int(link_id), slots=len(traffic)):
+            avg, required_no_buf = cap_no_buf.required_capacity_no_buffer(
+                traffic, params["window"], params["loss_percentile"]
+            )
+            required_buf = cap_buf.required_capacity_with_buffer(
+                traffic, params["loss_limit"], params["buffer_time_sec"],
+                params["window"]
+            )
+
+        rows.append({
+            "Link": f"Link {link_id}",
+            "Slots": len(traffic),
+            "Avg_Traffic_Gbps": round(avg, 3),
+            "Required_Capacity_No_Buffer_Gbps": round(required_no_buf, 3),
+            "Required_Capacity_With_Buffer_Gbps": round(required_buf, 3),
+        })
+
+    return pd.DataFrame(rows)
+
+
+async def report(store, link_groups, params, report_sec=REPORT_SEC):
+    while True:
+        await asyncio.sleep(report_sec)
+
+        # Copy the link traces here, between tail reads; the tails keep
+        # extending the rings while the estimate runs
+        link_traces = {
+            link_id: store.link_traffic(cells)
+            for link_id, cells in link_groups.items()
+        }
+
+        # The buffered search is a Python loop; keep it off the event loop
+        # so the tails carry on while it runs
+        store.estimates = await asyncio.to_thread(estimate, link_traces, params)
+
+        if store.estimates.empty:
+            print("[WAIT] no aligned slots yet")
+        else:
+            print(store.estimates.to_string(index=False))
+
+
+async def follow(data_dir=DATA_DIR, cells=None, link_groups=None,
+                 ring_slots=RING_SLOTS, poll_sec=POLL_SEC,
+                 report_sec=REPORT_SEC, from_end=False, duration_sec=None,
+                 **params):
+    """
+    Tail every cell's files until cancelled (or for duration_sec) and
+    refresh the per-link estimates every report_sec; returns the LiveStore
+    """
+    if cells is None:
+        cells = range(1, member1.NUM_CELLS + 1)
+    p = {**pipeline.PARAMS, **params}
+
+    store = LiveStore(cells, data_dir, ring_slots, from_end)
+    tasks = [asyncio.create_task(tail_cell(s, poll_sec)) for s in store.streams.values()]
+    if link_groups:
+        tasks.append(asyncio.create_task(report(store, link_groups, p, report_sec)))
+
+    try:
+        if duration_sec is None:
+            await asyncio.gather(*tasks)
+        else:
+            await asyncio.sleep(duration_sec)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    return store
+
+
+# MAIN
+def main():
+    parser = argparse.ArgumentParser(
+        description="Follow growing .dat traces and keep live capacity estimates"
+    )
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--mapping", default=MAPPING_FILE,
+                        help="cell → link mapping CSV (from a batch run)")
+    parser.add_argument("--cells", type=int, default=member1.NUM_CELLS)
+    parser.add_argument("--ring-slots", type=int, default=RING_SLOTS,
+                        help="slots kept per cell")
+    parser.add_argument("--poll", type=float, default=POLL_SEC)
+    parser.add_argument("--report", type=float, default=REPORT_SEC,
+                        help="seconds between estimate refreshes")
+    parser.add_argument("--from-end", action="store_true",
+                        help="skip what the files already contain")
+    parser.add_argument("--duration", type=float, default=None,
+                        help="stop after this many seconds")
+    instr.add_arguments(parser)
+    args = parser.parse_args()
+
+    instr.configure_from_args(args)
+
+    link_groups = None
+    if os.path.exists(args.mapping):
+        link_groups = link_traffic.link_groups_from_mapping(pd.read_csv(args.mapping))
+    else:
+        print(f"[WARN] {args.mapping} not found; tailing without estimates")
+
+    try:
+        asyncio.run(follow(
+            args.data_dir, range(1, args.cells + 1), link_groups,
+            args.ring_slots, args.poll, args.report, args.from_end, args.duration
+        ))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -2,104 +2,119 @@ import os
 import numpy as np
 import pandas as pd
 
+import instrumentation as instr
+
 # PATHS
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 CLEAN_DIR = os.path.join(BASE_DIR, "output", "cleaned")
 OUT_DIR = os.path.join(BASE_DIR, "output", "member2")
 
-os.makedirs(OUT_DIR, exist_ok=True)
-
 # PARAMETERS
 NUM_CELLS = 24
 WINDOW_SIZE = 50   # number of slots per window
 
-# STEP 1: LOAD PACKET LOSS SIGNALS
-signals = {}
-
-print("Loading packet loss signals...")
-
-for cell_id in range(1, NUM_CELLS + 1):
-    file_path = os.path.join(
-        CLEAN_DIR, f"pktloss_slot_cell_{cell_id}.csv"
+# STEPS 2-5: TRIM, WINDOW, NORMALIZE, STACK
+def prepare_signals(signals, window_size=WINDOW_SIZE):
+    """
+    Turn {cell_id: per-slot loss_ratio array} into (cell_ids, signal_matrix)
+    with rows = cells and columns = z-scored window means
+    """
+    # STEP 2: TRIM ALL SIGNALS TO SAME LENGTH
+    print("\nEqualizing signal lengths...")
+
+    min_length = min(len(sig) for sig in signals.values())
+    print(f"Minimum length across cells: {min_length}")
+
+    # STEP 3: WINDOWING (MEAN LOSS PER WINDOW)
+    print("\nApplying windowing...")
+
+    num_windows = min_length // window_size
+    print(f"Total windows per cell: {num_windows}")
+
+    cell_ids = sorted(signals.keys())
+
+    with instr.span("windowing", cells=len(cell_ids), windows=num_windows):
+        windowed = np.vstack([
+            np.asarray(signals[cell_id][:num_windows * window_size], dtype=float)
+            .reshape(num_windows, window_size)
+            .mean(axis=1)
+            for cell_id in cell_ids
+        ])
+        instr.count("slots", len(cell_ids) * num_windows * window_size)
+
+    # STEP 4: NORMALIZATION (Z-SCORE)
+    print("\nNormalizing signals...")
+
+    signal_matrix = normalize_rows(windowed)
+
+    # STEP 5: BUILD FINAL SIGNAL MATRIX
+    print(f"\nFinal matrix shape: {signal_matrix.shape}")
+    print("Rows = cells, Columns = time windows")
+
+    return cell_ids, signal_matrix
+
+def normalize_rows(windowed):
+    """
+    Z-score each row; constant rows become all zeros
+    """
+    mean = windowed.mean(axis=1, keepdims=True)
+    std = windowed.std(axis=1, keepdims=True)
+
+    return np.divide(
+        windowed - mean,
+        std,
+        out=np.zeros_like(windowed),
+        where=std != 0
     )
 
-    if not os.path.exists(file_path):
-        raise FileNotFoundError(f"Missing file: {file_path}")
-
-    df = pd.read_csv(file_path)
-
-    # IMPORTANT: ignore timestamp, use only loss_ratio
-    loss_signal = df["loss_ratio"].values
-
-    signals[cell_id] = loss_signal
-
-    print(f"Cell {cell_id}: {len(loss_signal)} samples")
-
-# STEP 2: TRIM ALL SIGNALS TO SAME LENGTH
-print("\nEqualizing signal lengths...")
-
-min_length = min(len(sig) for sig in signals.values())
-print(f"Minimum length across cells: {min_length}")
-
-for cell_id in signals:
-    signals[cell_id] = signals[cell_id][:min_length]
-
-# STEP 3: WINDOWING (MEAN LOSS PER WINDOW)
-print("\nApplying windowing...")
-
-windowed_signals = {}
+# MAIN
+def main(clean_dir=CLEAN_DIR, out_dir=OUT_DIR, num_cells=NUM_CELLS,
+         window_size=WINDOW_SIZE):
+    os.makedirs(out_dir, exist_ok=True)
 
-num_windows = min_length // WINDOW_SIZE
-print(f"Total windows per cell: {num_windows}")
+    # STEP 1: LOAD PACKET LOSS SIGNALS
+    signals = {}
 
-for cell_id, sig in signals.items():
-    windowed = []
+    print("Loading packet loss signals...")
 
-    for i in range(num_windows):
-        start = i * WINDOW_SIZE
-        end = start + WINDOW_SIZE
-        window_mean = np.mean(sig[start:end])
-        windowed.append(window_mean)
+    for cell_id in range(1, num_cells + 1):
+        file_path = os.path.join(
+            clean_dir, f"pktloss_slot_cell_{cell_id}.csv"
+        )
 
-    windowed_signals[cell_id] = np.array(windowed)
+        if not os.path.exists(file_path):
+            raise FileNotFoundError(f"Missing file: {file_path}")
 
-# STEP 4: NORMALIZATION (Z-SCORE)
-print("\nNormalizing signals...")
+        df = pd.read_csv(file_path)
+        instr.count_file(file_path, "bytes_read")
 
-normalized_signals = {}
+        # IMPORTANT: ignore timestamp, use only loss_ratio
+        loss_signal = df["loss_ratio"].values
 
-for cell_id, sig in windowed_signals.items():
-    mean = np.mean(sig)
-    std = np.std(sig)
+        signals[cell_id] = loss_signal
 
-    if std == 0:
-        norm_sig = np.zeros_like(sig)
-    else:
-        norm_sig = (sig - mean) / std
+        print(f"Cell {cell_id}: {len(loss_signal)} samples")
 
-    normalized_signals[cell_id] = norm_sig
+    cell_ids, signal_matrix = prepare_signals(signals, window_size)
 
-# STEP 5: BUILD FINAL SIGNAL MATRIX
-print("\nBuilding signal matrix...")
+    # STEP 6: SAVE OUTPUT FOR MEMBER-3
+    np.save(os.path.join(out_dir, "signal_matrix.npy"), signal_matrix)
 
-cell_ids = sorted(normalized_signals.keys())
+    pd.DataFrame(
+        signal_matrix,
+        index=[f"cell_{cid}" for cid in cell_ids]
+    ).to_csv(os.path.join(out_dir, "signal_matrix.csv"))
 
-signal_matrix = np.vstack(
-    [normalized_signals[cell_id] for cell_id in cell_ids]
-)
+    instr.count_file(os.path.join(out_dir, "signal_matrix.npy"))
+    instr.count_file(os.path.join(out_dir, "signal_matrix.csv"))
 
-print(f"Final matrix shape: {signal_matrix.shape}")
-print("Rows = cells, Columns = time windows")
+    print("\n Member-2 preprocessing complete.")
+    print("Saved:")
+    print(f" - {os.path.join(out_dir, 'signal_matrix.npy')}")
+    print(f" - {os.path.join(out_dir, 'signal_matrix.csv')}")
 
-# STEP 6: SAVE OUTPUT FOR MEMBER-3
-np.save(os.path.join(OUT_DIR, "signal_matrix.npy"), signal_matrix)
+    return signal_matrix
 
-pd.DataFrame(
-    signal_matrix,
-    index=[f"cell_{cid}" for cid in cell_ids]
-).to_csv(os.path.join(OUT_DIR, "signal_matrix.csv"))
 
-print("\n Member-2 preprocessing complete.")
-print("Saved:")
-print(" - output/member2/signal_matrix.npy")
-print(" - output/member2/signal_matrix.csv")
+if __name__ == "__main__":
+    main()
@@ -6,115 +6,162 @@ import matplotlib.pyplot as plt
 from scipy.cluster.hierarchy import linkage, fcluster
 from scipy.spatial.distance import squareform
 
+import instrumentation as instr
+
 # PATHS
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 IN_DIR = os.path.join(BASE_DIR, "output", "member2")
 OUT_DIR = os.path.join(BASE_DIR, "output", "member3")
 
-os.makedirs(OUT_DIR, exist_ok=True)
-
-# STEP 1: LOAD SIGNAL MATRIX
-print("Loading signal matrix...")
-
-signal_matrix = np.load(os.path.join(IN_DIR, "signal_matrix.npy"))
-num_cells = signal_matrix.shape[0]
-
-cell_labels = [f"Cell {i+1}" for i in range(num_cells)]
-
-print(f"Loaded matrix shape: {signal_matrix.shape}")
-
-# STEP 2: COMPUTE CORRELATION MATRIX
-print("Computing correlation matrix...")
-
-correlation_matrix = np.corrcoef(signal_matrix)
-
-corr_df = pd.DataFrame(
-    correlation_matrix,
-    index=cell_labels,
-    columns=cell_labels
-)
-
-# Save correlation matrix
-corr_df.to_csv(os.path.join(OUT_DIR, "correlation_matrix.csv"))
-
-# STEP 3: VISUALIZE CORRELATION HEATMAP
-print("Creating correlation heatmap...")
-
-plt.figure(figsize=(12, 10))
-sns.heatmap(
-    corr_df,
-    cmap="coolwarm",
-    center=0,
-    square=True,
-    cbar_kws={"label": "Correlation"}
-)
-plt.title("Cell-to-Cell Correlation Heatmap")
-plt.tight_layout()
-plt.savefig(os.path.join(OUT_DIR, "correlation_heatmap.png"))
-plt.close()
-
-# STEP 4: HIERARCHICAL CLUSTERING
-print("Clustering cells into fronthaul links...")
-
-# Convert correlation → distance
-distance_matrix = 1 - correlation_matrix
-
-# Condensed distance for linkage
-condensed_dist = squareform(distance_matrix, checks=False)
-
-# Hierarchical clustering
-Z = linkage(condensed_dist, method="average")
-
-# Number of links
+# PARAMETERS
 NUM_LINKS = 3
 
-cluster_labels = fcluster(Z, NUM_LINKS, criterion="maxclust")
-
-# STEP 5: SAVE CLUSTER ASSIGNMENTS
-cluster_df = pd.DataFrame({
-    "Cell": cell_labels,
-    "Link_ID": cluster_labels
-})
-
-cluster_df.to_csv(
-    os.path.join(OUT_DIR, "cell_to_link_mapping.csv"),
-    index=False
-)
-
-# STEP 6: CREATE GROUP-WISE LINK TABLE
-print("\nGroup-wise Fronthaul Topology:")
-
-grouped_links = {}
-
-for _, row in cluster_df.iterrows():
-    link_id = row["Link_ID"]
-    cell = row["Cell"]
-
-    if link_id not in grouped_links:
-        grouped_links[link_id] = []
-
-    grouped_links[link_id].append(cell)
-
-# Print nicely
-for link_id in sorted(grouped_links.keys()):
-    cells = ", ".join(grouped_links[link_id])
-    print(f"Link {link_id}: {cells}")
-
-# Save group-wise table
-groupwise_df = pd.DataFrame([
-    {"Link_ID": f"Link {link_id}", "Cells": ", ".join(cells)}
-    for link_id, cells in grouped_links.items()
-])
+# CORRELATION + HIERARCHICAL CLUSTERING
+def correlation_matrix(signal_matrix):
+    with instr.span("correlation", cells=len(signal_matrix)):
+        return np.corrcoef(signal_matrix)
+
+def cluster_links(correlation_matrix, num_links=NUM_LINKS):
+    """
+    1-based link label per cell from a cell-to-cell correlation matrix
+    """
+    with instr.span("clustering", cells=len(correlation_matrix)):
+        # Convert correlation → distance
+        distance_matrix = 1 - correlation_matrix
+
+        # Condensed distance for linkage
+        condensed_dist = squareform(distance_matrix, checks=False)
+
+        # Hierarchical clustering
+        Z = linkage(condensed_dist, method="average")
+
+        return fcluster(Z, num_links, criterion="maxclust")
+
+def infer_topology(signal_matrix, num_links=NUM_LINKS):
+    """
+    Return (correlation matrix, 1-based link label per cell)
+    """
+    corr = correlation_matrix(signal_matrix)
+    return corr, cluster_links(corr, num_links)
+
+# CORRELATION HEATMAP
+def plot_correlation_heatmap(corr_df, out_file):
+    with instr.span("plot_heatmap"):
+        plt.figure(figsize=(12, 10))
+        sns.heatmap(
+            corr_df,
+            cmap="coolwarm",
+            center=0,
+            square=True,
+            cbar_kws={"label": "Correlation"}
+        )
+        plt.title("Cell-to-Cell Correlation Heatmap")
+        plt.tight_layout()
+        plt.savefig(out_file)
+        plt.close()
+        instr.count_file(out_file)
+
+def heatmap_main(out_dir=OUT_DIR):
+    """
+    Re-render the heatmap from a saved correlation_matrix.csv
+    """
+    corr_df = pd.read_csv(
+        os.path.join(out_dir, "correlation_matrix.csv"), index_col=0
+    )
+    plot_correlation_heatmap(
+        corr_df, os.path.join(out_dir, "correlation_heatmap.png")
+    )
+    print(f"Saved: {os.path.join(out_dir, 'correlation_heatmap.png')}")
+
+# GROUP-WISE LINK TABLE
+def groupwise_table(cluster_df):
+    """
+    One row per link (in first-seen order) listing its cells
+    """
+    grouped_links = {}
+
+    for cell, link_id in zip(cluster_df["Cell"], cluster_df["Link_ID"]):
+        grouped_links.setdefault(link_id, []).append(cell)
+
+    return pd.DataFrame([
+        {"Link_ID": f"Link {link_id}", "Cells": ", ".join(cells)}
+        for link_id, cells in grouped_links.items()
+    ])
+
+# MAIN
+def main(in_dir=IN_DIR, out_dir=OUT_DIR, num_links=NUM_LINKS,
+         render_heatmap=True):
+    os.makedirs(out_dir, exist_ok=True)
+
+    # STEP 1: LOAD SIGNAL MATRIX
+    print("Loading signal matrix...")
+
+    signal_matrix = np.load(os.path.join(in_dir, "signal_matrix.npy"))
+    num_cells = signal_matrix.shape[0]
+
+    cell_labels = [f"Cell {i+1}" for i in range(num_cells)]
+
+    print(f"Loaded matrix shape: {signal_matrix.shape}")
+
+    # STEP 2: COMPUTE CORRELATION MATRIX + CLUSTERS
+    print("Computing correlation matrix...")
+    print("Clustering cells into fronthaul links...")
+
+    correlation_matrix, cluster_labels = infer_topology(signal_matrix, num_links)
+
+    corr_df = pd.DataFrame(
+        correlation_matrix,
+        index=cell_labels,
+        columns=cell_labels
+    )
+
+    # Save correlation matrix
+    corr_df.to_csv(os.path.join(out_dir, "correlation_matrix.csv"))
+
+    # STEP 3: VISUALIZE CORRELATION HEATMAP
+    if render_heatmap:
+        print("Creating correlation heatmap...")
+
+        plot_correlation_heatmap(
+            corr_df, os.path.join(out_dir, "correlation_heatmap.png")
+        )
+
+    # STEP 4: SAVE CLUSTER ASSIGNMENTS
+    cluster_df = pd.DataFrame({
+        "Cell": cell_labels,
+        "Link_ID": cluster_labels
+    })
+
+    cluster_df.to_csv(
+        os.path.join(out_dir, "cell_to_link_mapping.csv"),
+        index=False
+    )
+
+    # STEP 5: CREATE GROUP-WISE LINK TABLE
+    print("\nGroup-wise Fronthaul Topology:")
+
+    groupwise_df = groupwise_table(cluster_df)
+
+    # Print nicely
+    for _, row in groupwise_df.sort_values("Link_ID").iterrows():
+        print(f"{row['Link_ID']}: {row['Cells']}")
+
+    # Save group-wise table
+    groupwise_df.to_csv(
+        os.path.join(out_dir, "link_groupwise_table.csv"),
+        index=False
+    )
+
+
+    print("\nInferred Fronthaul Topology:")
+    print(cluster_df.sort_values("Link_ID"))
 
-groupwise_df.to_csv(
-    os.path.join(OUT_DIR, "link_groupwise_table.csv"),
-    index=False
-)
+    # DONE
+    print("\n Member-3 topology inference complete.")
+    print(f"Outputs saved to: {out_dir}")
 
+    return cluster_df
 
-print("\nInferred Fronthaul Topology:")
-print(cluster_df.sort_values("Link_ID"))
 
-# DONE
-print("\n Member-3 topology inference complete.")
-print("Outputs saved to: output/member3/")
+if __name__ == "__main__":
+    main()
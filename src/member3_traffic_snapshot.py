@@ -4,13 +4,13 @@ import pandas as pd
 import matplotlib.pyplot as plt
 from matplotlib.colors import ListedColormap
 
+import instrumentation as instr
+
 # PATHS
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 CLEAN_DIR = os.path.join(BASE_DIR, "output", "cleaned")
 OUT_DIR = os.path.join(BASE_DIR, "output", "member3")
 
-os.makedirs(OUT_DIR, exist_ok=True)
-
 # CONFIGURATION (ADJUST IF NEEDED)
 CELLS_TO_PLOT = [2, 3, 10]   # cells inferred to share same link
 START_SLOT = 1000            # starting slot index
@@ -23,78 +23,104 @@ NO_TRAFFIC = 0
 TRAFFIC_NO_LOSS = 1
 TRAFFIC_WITH_LOSS = 2
 
-# BUILD TRAFFIC STATE MATRIX
-state_matrix = []
+# TRAFFIC STATE PER SLOT
+def traffic_states(loss_ratio, data_rate_gbps, loss_threshold=LOSS_THRESHOLD):
+    loss_ratio = np.asarray(loss_ratio)
+    data_rate_gbps = np.asarray(data_rate_gbps)
+
+    return np.select(
+        [data_rate_gbps <= 0, loss_ratio <= loss_threshold],
+        [NO_TRAFFIC, TRAFFIC_NO_LOSS],
+        default=TRAFFIC_WITH_LOSS
+    )
+
+def build_state_matrix(pktloss, throughput, cells=CELLS_TO_PLOT,
+                       start_slot=START_SLOT, num_slots=NUM_SLOTS):
+    """
+    Rows = cells, columns = slots in [start_slot, start_slot + num_slots)
+    """
+    rows = []
+
+    for cell_id in cells:
+        # Slice time window
+        pkt_window = pktloss[cell_id].iloc[start_slot:start_slot + num_slots]
+        thr_window = throughput[cell_id].iloc[start_slot:start_slot + num_slots]
+        n = min(len(pkt_window), len(thr_window))
 
-print("Generating traffic snapshot...")
+        rows.append(traffic_states(
+            pkt_window["loss_ratio"].values[:n],
+            thr_window["data_rate_gbps"].values[:n]
+        ))
 
-for cell_id in CELLS_TO_PLOT:
-    pkt_file = os.path.join(
-        CLEAN_DIR, f"pktloss_slot_cell_{cell_id}.csv"
+    return np.array(rows)
+
+# PLOT FIGURE-1 STYLE SNAPSHOT
+def plot_traffic_snapshot(state_matrix, cells, out_file):
+    cmap = ListedColormap([
+        "white",       # no traffic
+        "lightgreen",  # traffic without loss
+        "red"          # traffic with loss
+    ])
+
+    plt.figure(figsize=(14, 3 + len(cells)))
+    plt.imshow(state_matrix, aspect="auto", cmap=cmap, vmin=0, vmax=2)
+
+    plt.yticks(
+        ticks=range(len(cells)),
+        labels=[f"Cell {c}" for c in cells]
     )
-    thr_file = os.path.join(
-        CLEAN_DIR, f"throughput_slot_cell_{cell_id}.csv"
+
+    plt.xlabel("Time (slots)")
+    plt.ylabel("Cells")
+    plt.title("Traffic Pattern Snapshot for Cells Sharing Same Fronthaul Link")
+
+    cbar = plt.colorbar(
+        ticks=[0, 1, 2]
     )
+    cbar.ax.set_yticklabels([
+        "No traffic",
+        "Traffic without loss",
+        "Traffic with loss"
+    ])
+    cbar.set_label("Traffic State")
 
-    if not os.path.exists(pkt_file) or not os.path.exists(thr_file):
-        raise FileNotFoundError(f"Missing data for Cell {cell_id}")
+    plt.tight_layout()
+    plt.savefig(out_file)
+    plt.close()
+    instr.count_file(out_file)
 
-    pkt_df = pd.read_csv(pkt_file)
-    thr_df = pd.read_csv(thr_file)
+# MAIN
+def main(clean_dir=CLEAN_DIR, out_dir=OUT_DIR, cells=CELLS_TO_PLOT):
+    os.makedirs(out_dir, exist_ok=True)
 
-    # Slice time window
-    pkt_window = pkt_df.iloc[START_SLOT:START_SLOT + NUM_SLOTS]
-    thr_window = thr_df.iloc[START_SLOT:START_SLOT + NUM_SLOTS]
+    print("Generating traffic snapshot...")
 
-    cell_states = []
+    pktloss = {}
+    throughput = {}
 
-    for loss, rate in zip(
-        pkt_window["loss_ratio"],
-        thr_window["data_rate_gbps"]
-    ):
-        if rate <= 0:
-            cell_states.append(NO_TRAFFIC)
-        elif loss <= LOSS_THRESHOLD:
-            cell_states.append(TRAFFIC_NO_LOSS)
-        else:
-            cell_states.append(TRAFFIC_WITH_LOSS)
+    for cell_id in cells:
+        pkt_file = os.path.join(
+            clean_dir, f"pktloss_slot_cell_{cell_id}.csv"
+        )
+        thr_file = os.path.join(
+            clean_dir, f"throughput_slot_cell_{cell_id}.csv"
+        )
 
-    state_matrix.append(cell_states)
+        if not os.path.exists(pkt_file) or not os.path.exists(thr_file):
+            raise FileNotFoundError(f"Missing data for Cell {cell_id}")
 
-state_matrix = np.array(state_matrix)
+        pktloss[cell_id] = pd.read_csv(pkt_file)
+        throughput[cell_id] = pd.read_csv(thr_file)
 
-# PLOT FIGURE-1 STYLE SNAPSHOT
-cmap = ListedColormap([
-    "white",       # no traffic
-    "lightgreen",  # traffic without loss
-    "red"          # traffic with loss
-])
-
-plt.figure(figsize=(14, 3 + len(CELLS_TO_PLOT)))
-plt.imshow(state_matrix, aspect="auto", cmap=cmap)
-
-plt.yticks(
-    ticks=range(len(CELLS_TO_PLOT)),
-    labels=[f"Cell {c}" for c in CELLS_TO_PLOT]
-)
-
-plt.xlabel("Time (slots)")
-plt.ylabel("Cells")
-plt.title("Traffic Pattern Snapshot for Cells Sharing Same Fronthaul Link")
-
-cbar = plt.colorbar(
-    ticks=[0, 1, 2]
-)
-cbar.ax.set_yticklabels([
-    "No traffic",
-    "Traffic without loss",
-    "Traffic with loss"
-])
-cbar.set_label("Traffic State")
-
-plt.tight_layout()
-plt.savefig(os.path.join(OUT_DIR, "traffic_snapshot.png"))
-plt.close()
-
-print(" Corrected traffic snapshot generated:")
-print("output/member3/traffic_snapshot.png")
+    state_matrix = build_state_matrix(pktloss, throughput, cells)
+
+    out_file = os.path.join(out_dir, "traffic_snapshot.png")
+    with instr.span("plot_snapshot", cells=len(cells)):
+        plot_traffic_snapshot(state_matrix, cells, out_file)
+
+    print(" Corrected traffic snapshot generated:")
+    print(out_file)
+
+
+if __name__ == "__main__":
+    main()
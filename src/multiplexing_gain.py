@@ -0,0 +1,103 @@
+import os
+import argparse
+import pandas as pd
+
+import instrumentation as instr
+import build_link_slot_traffic as link_traffic
+import estimate_capacity_no_buffer as cap_no_buf
+import estimate_capacity_with_buffer as cap_buf
+import topology_whatif as whatif
+
+# PATHS
+CLEAN_DIR = link_traffic.CLEAN_DIR
+TOPO_DIR = link_traffic.TOPO_DIR
+OUT_DIR = cap_no_buf.OUT_DIR
+
+ESTIMATES = {
+    "No_Buffer": "Required_Capacity_No_Buffer_Gbps",
+    "With_Buffer": "Required_Capacity_With_Buffer_Gbps",
+}
+
+
+def multiplexing_gain(cell_traces, link_groups, window=cap_no_buf.WINDOW,
+                      loss_percentile=cap_no_buf.LOSS_PERCENTILE,
+                      loss_limit=cap_buf.LOSS_LIMIT,
+                      buffer_time_sec=cap_buf.BUFFER_TIME_SEC):
+    """
+    Both estimates for every cell on its own and for every link, in one
+    batched pass over the cell × slot matrix (each cell is a one-cell
+    "link" of an extra topology). Returns (cell table, link table); the
+    link table sets the sum of its cells' capacities against the link's.
+    """
+    singles = {c: [c] for cells in link_groups.values() for c in cells}
+    capacity = whatif.evaluate(
+        cell_traces, {"cells": singles, "links": link_groups},
+        window, loss_percentile, loss_limit, buffer_time_sec
+    )
+
+    cells = capacity[capacity["Topology"] == "cells"].drop(columns=["Topology", "Cells"])
+    cells = cells.rename(columns={"Link": "Cell"})
+    cells["Cell"] = cells["Cell"].str.replace("Link", "Cell")
+    cell_id = cells["Cell"].str.extract(r"(\d+)")[0].astype(int)
+    link_of = {c: link_id for link_id, cs in link_groups.items() for c in cs}
+    cells.insert(1, "Link", [f"Link {link_of[c]}" for c in cell_id])
+
+    links = capacity[capacity["Topology"] == "links"].drop(columns="Topology")
+    cell_sums = cells.groupby("Link")[list(ESTIMATES.values())].sum()
+    for label, column in ESTIMATES.items():
+        summed = links["Link"].map(cell_sums[column]).values
+        links[f"Sum_Of_Cells_{label}_Gbps"] = summed.round(3)
+        links[f"Saving_{label}_Gbps"] = (summed - links[column]).round(3)
+        links[f"Gain_{label}"] = (summed / links[column].where(links[column] > 0)).round(3)
+
+    return cells.reset_index(drop=True), links.reset_index(drop=True)
+
+
+# MAIN
+def main(clean_dir=CLEAN_DIR, topo_dir=TOPO_DIR, out_dir=OUT_DIR,
+         window=cap_no_buf.WINDOW, loss_percentile=cap_no_buf.LOSS_PERCENTILE,
+         loss_limit=cap_buf.LOSS_LIMIT, buffer_time_sec=cap_buf.BUFFER_TIME_SEC):
+    os.makedirs(out_dir, exist_ok=True)
+
+    mapping_file = os.path.join(topo_dir, "cell_to_link_mapping.csv")
+    if not os.path.exists(mapping_file):
+        raise FileNotFoundError(mapping_file)
+    link_groups = link_traffic.link_groups_from_mapping(pd.read_csv(mapping_file))
+    cell_traces = link_traffic.load_cell_traces(
+        clean_dir, sorted(c for cs in link_groups.values() for c in cs)
+    )
+
+    with instr.span("multiplexing_gain", cells=len(cell_traces), links=len(link_groups)):
+        cells, links = multiplexing_gain(
+            cell_traces, link_groups, window, loss_percentile, loss_limit, buffer_time_sec
+        )
+
+    cells_out = os.path.join(out_dir, "cell_capacity.csv")
+    links_out = os.path.join(out_dir, "multiplexing_gain.csv")
+    cells.to_csv(cells_out, index=False)
+    links.to_csv(links_out, index=False)
+
+    print(links[["Link", "Cells"] + [
+        f"{prefix}_{label}{suffix}"
+        for label in ESTIMATES
+        for prefix, suffix in [("Sum_Of_Cells", "_Gbps"), ("Gain", "")]
+    ]].to_string(index=False))
+    for path in [cells_out, links_out]:
+        instr.count_file(path)
+        print(f"Saved: {path}")
+
+    return cells, links
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Per-cell vs per-link required capacity (statistical multiplexing gain)"
+    )
+    parser.add_argument("--clean-dir", default=CLEAN_DIR)
+    parser.add_argument("--topo-dir", default=TOPO_DIR)
+    parser.add_argument("--out-dir", default=OUT_DIR)
+    instr.add_arguments(parser)
+    args = parser.parse_args()
+
+    instr.configure_from_args(args)
+    main(args.clean_dir, args.topo_dir, args.out_dir)
@@ -0,0 +1,339 @@
+import os
+import json
+import argparse
+import numpy as np
+import pandas as pd
+
+import instrumentation as instr
+import preprocess_member1 as member1
+import member2_prepare_signals as member2
+import member3_topology_inference as member3
+import member3_traffic_snapshot as snapshot
+import build_link_slot_traffic as link_traffic
+import link_traffic_store
+import estimate_capacity_no_buffer as cap_no_buf
+import estimate_capacity_with_buffer as cap_buf
+import plot_link_traffic_figure3 as figure3
+
+# PATHS
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(BASE_DIR, "data")
+OUTPUT_DIR = os.path.join(BASE_DIR, "output")
+
+# DEFAULT PARAMETERS (same as the stage scripts)
+PARAMS = {
+    "num_cells": member1.NUM_CELLS,
+    "window_size": member2.WINDOW_SIZE,
+    "num_links": member3.NUM_LINKS,
+    "window": cap_no_buf.WINDOW,
+    "loss_percentile": cap_no_buf.LOSS_PERCENTILE,
+    "loss_limit": cap_buf.LOSS_LIMIT,
+    "buffer_time_sec": cap_buf.BUFFER_TIME_SEC,
+}
+
+
+# STAGE 1: INGEST
+def ingest(data_dir=DATA_DIR, cells=None):
+    """
+    Parse raw .dat traces into ({cell_id: throughput slots},
+    {cell_id: packet-loss slots}); cells with a missing file are skipped
+    """
+    if cells is None:
+        cells = range(1, member1.NUM_CELLS + 1)
+
+    throughput_dir = os.path.join(data_dir, "throughput")
+    pktstats_dir = os.path.join(data_dir, "pkt-stats")
+
+    throughput = {}
+    pktloss = {}
+
+    for cell_id in cells:
+        thr = member1.process_throughput(cell_id, throughput_dir, None)
+        pkt = member1.process_pktstats(cell_id, pktstats_dir, None)
+
+        if thr is not None:
+            throughput[cell_id] = thr
+        if pkt is not None:
+            pktloss[cell_id] = pkt
+
+    return throughput, pktloss
+
+
+# STAGE 2: SIGNAL MATRIX
+def build_signal_matrix(pktloss, window_size=member2.WINDOW_SIZE):
+    """
+    Return (cell_ids, signal_matrix) from per-cell packet-loss slots
+    """
+    return member2.prepare_signals(
+        {cell_id: df["loss_ratio"].values for cell_id, df in pktloss.items()},
+        window_size
+    )
+
+
+# STAGE 3: TOPOLOGY
+def infer_topology(signal_matrix, cell_ids, num_links=member3.NUM_LINKS):
+    """
+    Return (correlation DataFrame, Cell / Link_ID mapping DataFrame)
+    """
+    correlation_matrix, labels = member3.infer_topology(signal_matrix, num_links)
+    cell_labels = [f"Cell {cid}" for cid in cell_ids]
+
+    corr_df = pd.DataFrame(
+        correlation_matrix, index=cell_labels, columns=cell_labels
+    )
+    mapping_df = pd.DataFrame({"Cell": cell_labels, "Link_ID": labels})
+
+    return corr_df, mapping_df
+
+
+# STAGE 4: LINK AGGREGATION
+def aggregate_links(throughput, mapping_df):
+    """
+    Return {link_id: per-slot Gbps array}, ordered by link id
+    """
+    link_groups = link_traffic.link_groups_from_mapping(mapping_df)
+    cell_rates = {
+        cell_id: df["data_rate_gbps"].values
+        for cell_id, df in throughput.items()
+    }
+    traffic = link_traffic.aggregate_links(cell_rates, link_groups)
+    return {link_id: traffic[link_id] for link_id in sorted(traffic)}
+
+
+# STAGE 5: CAPACITY
+def estimate_capacity(link_traces, window=cap_no_buf.WINDOW,
+                      loss_percentile=cap_no_buf.LOSS_PERCENTILE,
+                      loss_limit=cap_buf.LOSS_LIMIT,
+                      buffer_time_sec=cap_buf.BUFFER_TIME_SEC, curves=None):
+    """
+    One row per link with average traffic and both capacity estimates.
+    If a dict is passed as curves, the (capacity, loss ratio) points the
+    buffered search probed are stored in it per link.
+    """
+    rows = []
+
+    for link_id, traffic in link_traces.items():
+        with instr.span("capacity_no_buffer", link=int(link_id)):
+            avg, no_buf = cap_no_buf.required_capacity_no_buffer(
+                traffic, window, loss_percentile
+            )
+        with instr.span("capacity_with_buffer", link=int(link_id)):
+            with_buf, probes = cap_buf.search_capacity(
+                traffic, loss_limit, buffer_time_sec, window
+            )
+        if curves is not None:
+            curves[link_id] = sorted(probes)
+        rows.append({
+            "Link": f"Link {link_id}",
+            "Avg_Traffic_Gbps": round(avg, 3),
+            "Required_Capacity_No_Buffer_Gbps": round(no_buf, 3),
+            "Required_Capacity_With_Buffer_Gbps": round(with_buf, 3)
+        })
+
+    return pd.DataFrame(rows)
+
+
+# STAGE 6: PLOT
+def plot(result, out_dir=OUTPUT_DIR):
+    """
+    Render the heatmap, traffic snapshot and Figure-3 plots of a run
+    """
+    member3_dir = os.path.join(out_dir, "member3")
+    figures_dir = os.path.join(out_dir, "figures")
+    os.makedirs(member3_dir, exist_ok=True)
+    os.makedirs(figures_dir, exist_ok=True)
+    figure3.clear_figures(figures_dir)
+
+    member3.plot_correlation_heatmap(
+        result["correlation"],
+        os.path.join(member3_dir, "correlation_heatmap.png")
+    )
+
+    cells = [
+        c for c in snapshot.CELLS_TO_PLOT
+        if c in result["throughput"] and c in result["pktloss"]
+    ]
+    if cells:
+        state_matrix = snapshot.build_state_matrix(
+            result["pktloss"], result["throughput"], cells
+        )
+        with instr.span("plot_snapshot", cells=len(cells)):
+            snapshot.plot_traffic_snapshot(
+                state_matrix, cells,
+                os.path.join(member3_dir, "traffic_snapshot.png")
+            )
+
+    capacity = result["capacity"].set_index("Link")
+
+    for link_id, traffic in result["link_traffic"].items():
+        link_name = f"Link {link_id}"
+        out_file = os.path.join(figures_dir, f"figure3_Link_{link_id}.png")
+        with instr.span("plot_figure3", link=int(link_id)):
+            figure3.plot_link_traffic(
+                link_name,
+                traffic,
+                capacity.loc[link_name, "Required_Capacity_With_Buffer_Gbps"],
+                out_file
+            )
+            instr.count_file(out_file)
+
+
+# PERSISTENCE (OPTIONAL)
+def save(result, out_dir=OUTPUT_DIR):
+    """
+    Write a run to the same files and layout the stage scripts produce
+    """
+    dirs = {
+        name: os.path.join(out_dir, name)
+        for name in ["cleaned", "member2", "member3", "link_traffic", "capacity"]
+    }
+    for path in dirs.values():
+        os.makedirs(path, exist_ok=True)
+
+    for cell_id, df in result["throughput"].items():
+        df.to_csv(os.path.join(
+            dirs["cleaned"], f"throughput_slot_cell_{cell_id}.csv"
+        ), index=False)
+    for cell_id, df in result["pktloss"].items():
+        df.to_csv(os.path.join(
+            dirs["cleaned"], f"pktloss_slot_cell_{cell_id}.csv"
+        ), index=False)
+
+    signal_matrix = result["signal_matrix"]
+    np.save(os.path.join(dirs["member2"], "signal_matrix.npy"), signal_matrix)
+    pd.DataFrame(
+        signal_matrix,
+        index=[f"cell_{cid}" for cid in result["cell_ids"]]
+    ).to_csv(os.path.join(dirs["member2"], "signal_matrix.csv"))
+
+    mapping_df = result["mapping"]
+    result["correlation"].to_csv(
+        os.path.join(dirs["member3"], "correlation_matrix.csv")
+    )
+    mapping_df.to_csv(
+        os.path.join(dirs["member3"], "cell_to_link_mapping.csv"), index=False
+    )
+    member3.groupwise_table(mapping_df).to_csv(
+        os.path.join(dirs["member3"], "link_groupwise_table.csv"), index=False
+    )
+
+    # A run with fewer links must not leave the old traces and figures behind
+    link_traffic_store.clear_links(dirs["link_traffic"])
+    figure3.clear_figures(os.path.join(out_dir, "figures"))
+    for link_id, traffic in result["link_traffic"].items():
+        link_traffic_store.write(
+            link_traffic_store.link_path(dirs["link_traffic"], link_id), traffic
+        )
+
+    capacity = result["capacity"]
+    capacity[["Link", "Avg_Traffic_Gbps", "Required_Capacity_No_Buffer_Gbps"]].to_csv(
+        os.path.join(dirs["capacity"], "required_capacity_no_buffer.csv"),
+        index=False
+    )
+    capacity[["Link", "Required_Capacity_With_Buffer_Gbps"]].to_csv(
+        os.path.join(dirs["capacity"], "required_capacity_with_buffer.csv"),
+        index=False
+    )
+
+    if instr.enabled():
+        for path in dirs.values():
+            for fname in os.listdir(path):
+                instr.count_file(os.path.join(path, fname))
+
+
+def parse_param(text):
+    """
+    argparse type for --set KEY=VALUE: (key, JSON-decoded value)
+    """
+    key, _, value = text.partition("=")
+    if key not in PARAMS:
+        raise argparse.ArgumentTypeError(f"unknown parameter: {key}")
+    return key, json.loads(value)
+
+
+# END-TO-END RUN
+def run(data_dir=DATA_DIR, out_dir=None, make_plots=True, **params):
+    """
+    Run every stage in memory. Nothing touches disk unless out_dir is given,
+    in which case the usual output/ tree (and figures) is written there.
+    Returns a dict holding every intermediate result.
+    """
+    unknown = set(params) - set(PARAMS)
+    if unknown:
+        raise TypeError(f"Unknown pipeline parameters: {sorted(unknown)}")
+    p = {**PARAMS, **params}
+
+    with instr.span("ingest"):
+        throughput, pktloss = ingest(data_dir, range(1, p["num_cells"] + 1))
+    with instr.span("signals"):
+        cell_ids, signal_matrix = build_signal_matrix(pktloss, p["window_size"])
+    with instr.span("topology"):
+        corr_df, mapping_df = infer_topology(
+            signal_matrix, cell_ids, p["num_links"]
+        )
+    with instr.span("link_traffic"):
+        link_traces = aggregate_links(throughput, mapping_df)
+    curves = {}
+    with instr.span("capacity"):
+        capacity_df = estimate_capacity(
+            link_traces, p["window"], p["loss_percentile"],
+            p["loss_limit"], p["buffer_time_sec"], curves
+        )
+
+    result = {
+        "params": p,
+        "throughput": throughput,
+        "pktloss": pktloss,
+        "cell_ids": cell_ids,
+        "signal_matrix": signal_matrix,
+        "correlation": corr_df,
+        "mapping": mapping_df,
+        "link_traffic": link_traces,
+        "capacity": capacity_df,
+        "curves": curves,
+    }
+
+    if out_dir is not None:
+        with instr.span("save"):
+            save(result, out_dir)
+        if make_plots:
+            with instr.span("plot"):
+                plot(result, out_dir)
+
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Run the whole pipeline in memory and write output/"
+    )
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--out-dir", default=OUTPUT_DIR)
+    parser.add_argument("--no-store", action="store_true",
+                        help="don't record the run in <out>/results.sqlite")
+    parser.add_argument("--arrow", action="store_true",
+                        help="also export <out>/arrow/*.arrow (needs pyarrow)")
+    instr.add_arguments(parser)
+    args = parser.parse_args()
+
+    trace_file = instr.configure_from_args(
+        args, os.path.join(args.out_dir, "trace.json")
+    )
+
+    result = run(args.data_dir, out_dir=args.out_dir)
+    print(result["capacity"].to_string(index=False))
+
+    if not args.no_store:
+        import results_store
+        run_id = results_store.record_run(
+            result, args.data_dir, os.path.join(args.out_dir, "results.sqlite")
+        )
+        print(f"Recorded as run {run_id}")
+
+    if args.arrow:
+        import arrow_export
+        with instr.span("arrow_export"):
+            arrow_export.export_result(result, os.path.join(args.out_dir, "arrow"))
+
+    if trace_file:
+        print(f"Trace will be written to {trace_file} on exit")
@@ -0,0 +1,568 @@
+import os
+import shutil
+import argparse
+import tempfile
+import numpy as np
+import pandas as pd
+
+import instrumentation as instr
+import pipeline
+import results_store
+import arrow_export
+import preprocess_member1 as member1
+import member2_prepare_signals as member2
+import member3_topology_inference as member3
+import build_link_slot_traffic as link_traffic
+import link_traffic_store
+import estimate_capacity_with_buffer as cap_buf
+
+# PATHS
+DATA_DIR = pipeline.DATA_DIR
+OUTPUT_DIR = pipeline.OUTPUT_DIR
+
+# PARAMETERS
+CHUNK_SLOTS = 1 << 18        # slots held in memory at once (~2 min of trace)
+HIST_BINS = 1024             # bins per refinement pass of the quantile search
+
+
+# SPILL FILES
+# Intermediate traces live on disk as raw float64 and are read back through
+# np.memmap, one chunk at a time.
+class Spill:
+    def __init__(self, work_dir, name):
+        fd, self.path = tempfile.mkstemp(prefix=name + "_", suffix=".bin", dir=work_dir)
+        self.file = os.fdopen(fd, "wb")
+
+    def append(self, values):
+        self.file.write(np.ascontiguousarray(values, dtype=np.float64).tobytes())
+
+    def close(self):
+        self.file.close()
+        return load_spill(self.path)
+
+
+def load_spill(path):
+    if os.path.getsize(path) == 0:
+        return np.empty(0)
+    return np.memmap(path, dtype=np.float64, mode="r")
+
+
+def iter_chunks(values, size):
+    for start in range(0, len(values), size):
+        yield start, np.asarray(values[start:start + size])
+
+
+# EXACT CHUNKED REDUCTIONS
+# Each reproduces the in-memory numpy/pandas result bit for bit.
+def pairwise_sum(values, chunk_size, start=0, n=None):
+    """
+    np.sum(values) without loading values: numpy sums float arrays pairwise,
+    splitting n at (n // 2) rounded down to a multiple of 8, so following the
+    same splits down to chunk-sized blocks gives the identical result
+    """
+    if n is None:
+        n = len(values)
+    if n <= chunk_size:
+        return np.add.reduce(np.asarray(values[start:start + n]))
+
+    half = n // 2
+    half -= half % 8
+    return (pairwise_sum(values, chunk_size, start, half)
+            + pairwise_sum(values, chunk_size, start + half, n - half))
+
+
+def positive_mean(values, chunk_size, work_dir):
+    """
+    values[values > 0].mean(), or 0.0 when nothing is positive
+    """
+    spill = Spill(work_dir, "positive")
+    try:
+        for _, chunk in iter_chunks(values, chunk_size):
+            spill.append(chunk[chunk > 0])
+        positive = spill.close()
+
+        if len(positive) == 0:
+            return 0.0
+        mean = pairwise_sum(positive, chunk_size) / len(positive)
+        del positive
+        return mean
+    finally:
+        spill.file.close()
+        os.remove(spill.path)
+
+
+def select_rank(values, rank, chunk_size, lo, hi):
+    """
+    The rank-th smallest non-NaN value (0-based), all of which lie in
+    [lo, hi]. Histogram passes narrow the range around the rank until it
+    holds at most chunk_size values, which are then sorted in memory.
+    """
+    below = 0                                   # values < lo
+    count = sum(                                # values in [lo, hi]
+        np.count_nonzero((c >= lo) & (c <= hi))
+        for _, c in iter_chunks(values, chunk_size)
+    )
+
+    while lo < hi:
+        if count <= chunk_size:
+            kept = np.concatenate([
+                c[(c >= lo) & (c <= hi)] for _, c in iter_chunks(values, chunk_size)
+            ])
+            kept.sort()
+            return kept[rank - below]
+
+        # Bin i is [edges[i], edges[i+1]); the last bin also holds hi
+        edges = np.linspace(lo, hi, HIST_BINS + 1)
+        counts = np.zeros(HIST_BINS, dtype=np.int64)
+        for _, chunk in iter_chunks(values, chunk_size):
+            chunk = chunk[(chunk >= lo) & (chunk <= hi)]
+            counts += np.bincount(
+                np.searchsorted(edges[1:-1], chunk, side="right"),
+                minlength=HIST_BINS
+            )
+
+        b = int(np.searchsorted(below + np.cumsum(counts), rank, side="right"))
+        below += int(counts[:b].sum())
+        count = int(counts[b])
+
+        if b < HIST_BINS - 1:
+            hi = np.nextafter(edges[b + 1], -np.inf)
+        lo = edges[b]
+
+    return lo
+
+
+def linear_quantile(values, q, chunk_size):
+    """
+    np.quantile(values, q) (linear interpolation, NaNs dropped as pandas does)
+    """
+    n = 0
+    lo, hi = np.inf, -np.inf
+    for _, chunk in iter_chunks(values, chunk_size):
+        chunk = chunk[~np.isnan(chunk)]
+        if len(chunk):
+            n += len(chunk)
+            lo, hi = min(lo, chunk.min()), max(hi, chunk.max())
+    if n == 0:
+        return np.nan
+
+    # numpy: virtual index (n - 1) * q, then lerp between its neighbours
+    index = (n - 1) * np.float64(q)
+    below = int(np.floor(index))
+    if index >= n - 1:
+        return hi
+
+    a = select_rank(values, below, chunk_size, lo, hi)
+
+    # The next order statistic is a again, or else the smallest value above a
+    at_most_a = 0
+    b = np.inf
+    for _, chunk in iter_chunks(values, chunk_size):
+        at_most_a += np.count_nonzero(chunk <= a)
+        above = chunk[chunk > a]
+        if len(above):
+            b = min(b, above.min())
+    if at_most_a > below + 1:
+        return a
+    gamma = index - below
+    diff = b - a
+    if gamma >= 0.5:
+        return b - diff * (1 - gamma)
+    return a + diff * gamma
+
+
+def moving_average(values, window, chunk_size, spill):
+    """
+    np.convolve(values, ones(window) / window, "valid") written to spill;
+    each chunk carries the last window - 1 samples of the previous one
+    """
+    kernel = np.ones(window) / window
+    num_out = len(values) - window + 1
+
+    for start in range(0, num_out, chunk_size):
+        stop = min(start + chunk_size, num_out)
+        spill.append(np.convolve(
+            np.asarray(values[start:stop + window - 1]), kernel, mode="valid"
+        ))
+
+    return spill.close()
+
+
+# STAGE 1: SYMBOL → SLOT AGGREGATION
+def _check_ordered(timestamps, previous):
+    if len(timestamps) and (
+            timestamps[0] < previous or np.any(np.diff(timestamps) < 0)):
+        raise ValueError(
+            "chunked mode needs time-ordered traces; "
+            "use pipeline.run() for unsorted files"
+        )
+    return timestamps[-1] if len(timestamps) else previous
+
+
+def throughput_cell(file_path, out_file, work_dir, chunk_slots=CHUNK_SLOTS):
+    """
+    member1.throughput_to_slots() over a file of any length. Pass 1 parses
+    the text once into binary spills; the glitch threshold (a global
+    quantile) is then found on disk; pass 2 aggregates whole slots.
+    Returns the per-slot Gbps trace as a memmap.
+    """
+    chunk_rows = chunk_slots * member1.SYMBOLS_PER_SLOT
+    ts_spill = Spill(work_dir, "timestamp")
+    kbits_spill = Spill(work_dir, "kbits")
+
+    last = -np.inf
+    reader = pd.read_csv(
+        file_path, sep=r"\s+", header=None, names=["timestamp", "kbits"],
+        engine="python", chunksize=chunk_rows
+    )
+    for chunk in reader:
+        last = _check_ordered(chunk["timestamp"].values, last)
+        ts_spill.append(chunk["timestamp"].values)
+        kbits_spill.append(chunk["kbits"].values)
+        instr.count("rows_parsed", len(chunk))
+    instr.count_file(file_path, "bytes_read")
+
+    timestamps = ts_spill.close()
+    kbits = kbits_spill.close()
+    upper = linear_quantile(kbits, member1.GLITCH_QUANTILE, chunk_rows)
+
+    rate_spill = Spill(work_dir, "throughput")
+    header = True
+
+    for start, kb in iter_chunks(kbits, chunk_rows):
+        df = pd.DataFrame(
+            {"timestamp": np.asarray(timestamps[start:start + len(kb)]), "kbits": kb},
+            index=pd.RangeIndex(start, start + len(kb))
+        )
+        slot_df = member1.symbols_to_slots(df, upper)
+
+        slot_df.to_csv(out_file, mode="w" if header else "a",
+                       header=header, index=False)
+        header = False
+        rate_spill.append(slot_df["data_rate_gbps"].values)
+        instr.count("slots", len(slot_df))
+
+    del timestamps, kbits
+    os.remove(ts_spill.path)
+    os.remove(kbits_spill.path)
+    instr.count_file(out_file)
+    return rate_spill.close()
+
+
+def pktstats_cell(file_path, out_file, work_dir, chunk_slots=CHUNK_SLOTS):
+    """
+    member1.pktstats_to_loss() chunk by chunk; returns loss_ratio as a memmap
+    """
+    loss_spill = Spill(work_dir, "pktloss")
+    header = True
+
+    reader = pd.read_csv(
+        file_path, sep=r"\s+", header=None,
+        names=["timestamp", "tx", "rx", "too_late"],
+        engine="python", chunksize=chunk_slots
+    )
+    for chunk in reader:
+        pkt_clean = member1.pktstats_to_loss(chunk)
+        pkt_clean.to_csv(out_file, mode="w" if header else "a",
+                         header=header, index=False)
+        header = False
+        loss_spill.append(pkt_clean["loss_ratio"].values)
+        instr.count("rows_parsed", len(chunk))
+        instr.count("slots", len(chunk))
+
+    instr.count_file(file_path, "bytes_read")
+    instr.count_file(out_file)
+    return loss_spill.close()
+
+
+def ingest(data_dir, clean_dir, work_dir, cells, chunk_slots=CHUNK_SLOTS):
+    """
+    ({cell_id: Gbps memmap}, {cell_id: loss-ratio memmap}); cells with a
+    missing file are skipped as in pipeline.ingest()
+    """
+    throughput, pktloss = {}, {}
+
+    for cell_id in cells:
+        thr_file = os.path.join(data_dir, "throughput", f"throughput-cell-{cell_id}.dat")
+        pkt_file = os.path.join(data_dir, "pkt-stats", f"pkt-stats-cell-{cell_id}.dat")
+
+        if os.path.exists(thr_file):
+            with instr.span("preprocess_throughput", cell=cell_id):
+                throughput[cell_id] = throughput_cell(
+                    thr_file,
+                    os.path.join(clean_dir, f"throughput_slot_cell_{cell_id}.csv"),
+                    work_dir, chunk_slots
+                )
+        if os.path.exists(pkt_file):
+            with instr.span("preprocess_pktstats", cell=cell_id):
+                pktloss[cell_id] = pktstats_cell(
+                    pkt_file,
+                    os.path.join(clean_dir, f"pktloss_slot_cell_{cell_id}.csv"),
+                    work_dir, chunk_slots
+                )
+
+        print(f"[OK] Cell {cell_id} processed")
+
+    return throughput, pktloss
+
+
+# STAGE 2: WINDOWING
+def build_signal_matrix(pktloss, window_size=member2.WINDOW_SIZE,
+                        chunk_slots=CHUNK_SLOTS):
+    """
+    member2.prepare_signals() reading each cell's loss trace in chunks of
+    whole windows. The result (one value per window) is kept in memory.
+    """
+    cell_ids = sorted(pktloss)
+    min_length = min(len(pktloss[c]) for c in cell_ids)
+    num_windows = min_length // window_size
+    step = max(chunk_slots // window_size, 1) * window_size
+
+    windowed = np.empty((len(cell_ids), num_windows))
+
+    with instr.span("windowing", cells=len(cell_ids), windows=num_windows):
+        for row, cell_id in enumerate(cell_ids):
+            trace = pktloss[cell_id]
+            for start in range(0, num_windows * window_size, step):
+                stop = min(start + step, num_windows * window_size)
+                windowed[row, start // window_size:stop // window_size] = (
+                    np.asarray(trace[start:stop], dtype=float)
+                    .reshape(-1, window_size)
+                    .mean(axis=1)
+                )
+        instr.count("slots", len(cell_ids) * num_windows * window_size)
+
+    return cell_ids, member2.normalize_rows(windowed)
+
+
+# STAGE 4: LINK AGGREGATION
+def aggregate_links(throughput, mapping_df, link_dir, work_dir,
+                    chunk_slots=CHUNK_SLOTS):
+    """
+    {link_id: per-slot Gbps memmap}; also writes link_N_slot_traffic.fhlt
+    """
+    link_groups = link_traffic.link_groups_from_mapping(mapping_df)
+    link_traffic_store.clear_links(link_dir)
+    traces = {}
+
+    for link_id in sorted(link_groups):
+        cells = link_groups[link_id]
+        writer = link_traffic_store.Writer(
+            link_traffic_store.link_path(link_dir, link_id)
+        )
+        spill = Spill(work_dir, f"link_{link_id}")
+        min_len = min(len(throughput[c]) for c in cells)
+
+        with instr.span("link_aggregation", link=int(link_id), cells=len(cells)):
+            for start in range(0, min_len, chunk_slots):
+                stop = min(start + chunk_slots, min_len)
+                traffic = link_traffic.sum_cell_traces(
+                    [np.asarray(throughput[c][start:stop]) for c in cells]
+                )
+                spill.append(traffic)
+                writer.append(traffic)
+            writer.close()
+
+        traces[link_id] = spill.close()
+
+    return traces
+
+
+# STAGE 5: CAPACITY
+def required_capacity_no_buffer(traffic, window, loss_percentile,
+                                work_dir, chunk_slots=CHUNK_SLOTS):
+    """
+    estimate_capacity_no_buffer.required_capacity_no_buffer() for a trace
+    on disk
+    """
+    instr.count("slots", len(traffic))
+    avg = positive_mean(traffic, chunk_slots, work_dir)
+
+    nonzero = sum(np.count_nonzero(c) for _, c in iter_chunks(traffic, chunk_slots))
+    if nonzero == 0:
+        return avg, 0.0
+    if len(traffic) < window:
+        return avg, np.asarray(traffic).max()
+
+    smoothed = moving_average(
+        traffic, window, chunk_slots, Spill(work_dir, "smoothed")
+    )
+    required = linear_quantile(
+        smoothed, np.true_divide(loss_percentile, 100), chunk_slots
+    )
+    del smoothed
+    return avg, required
+
+
+def required_capacity_with_buffer(traffic_raw, loss_limit, buffer_time_sec,
+                                  window, work_dir, chunk_slots=CHUNK_SLOTS):
+    """
+    cap_buf.search_capacity() for a trace on disk: every bisection probe
+    runs the buffer over the trace chunk by chunk, carrying its state
+    """
+    if len(traffic_raw) >= window:
+        traffic = moving_average(
+            traffic_raw, window, chunk_slots, Spill(work_dir, "smoothed")
+        )
+    else:
+        traffic = np.asarray(traffic_raw)
+
+    avg = positive_mean(traffic, chunk_slots, work_dir)
+    # An empty trace gives avg = peak = 0, as the batched estimator does
+    peak = max((c.max() for _, c in iter_chunks(traffic, chunk_slots)), default=0.0)
+
+    def loss_at(capacity):
+        state = (0.0, 0, 0)
+        for _, chunk in iter_chunks(traffic, chunk_slots):
+            state = cap_buf.simulate_buffer(chunk, capacity, buffer_time_sec, state)
+        instr.count("slots_simulated", len(traffic))
+        _, loss_slots, traffic_slots = state
+        return 0.0 if traffic_slots == 0 else loss_slots / traffic_slots
+
+    capacity, _ = cap_buf.bisect_capacity(
+        avg, peak, loss_at, loss_limit, cap_buf.MAX_ITER
+    )
+    return capacity
+
+
+def estimate_capacity(link_traces, window, loss_percentile, loss_limit,
+                      buffer_time_sec, work_dir, chunk_slots=CHUNK_SLOTS):
+    rows = []
+
+    for link_id, traffic in link_traces.items():
+        with instr.span("capacity_no_buffer", link=int(link_id)):
+            avg, no_buf = required_capacity_no_buffer(
+                traffic, window, loss_percentile, work_dir, chunk_slots
+            )
+        with instr.span("capacity_with_buffer", link=int(link_id)):
+            with_buf = required_capacity_with_buffer(
+                traffic, loss_limit, buffer_time_sec, window, work_dir,
+                chunk_slots
+            )
+        rows.append({
+            "Link": f"Link {link_id}",
+            "Avg_Traffic_Gbps": round(avg, 3),
+            "Required_Capacity_No_Buffer_Gbps": round(no_buf, 3),
+            "Required_Capacity_With_Buffer_Gbps": round(with_buf, 3)
+        })
+
+    return pd.DataFrame(rows)
+
+
+# END-TO-END RUN
+def run(data_dir=DATA_DIR, out_dir=OUTPUT_DIR, chunk_slots=CHUNK_SLOTS,
+        **params):
+    """
+    Same stages and output files as pipeline.run(out_dir=...), but every
+    per-slot trace is streamed through memory chunk_slots at a time; only
+    the windowed signal matrix and its correlation are held whole. Figures
+    are not rendered. Returns params, cell_ids, signal_matrix, correlation,
+    mapping and capacity.
+    """
+    unknown = set(params) - set(pipeline.PARAMS)
+    if unknown:
+        raise TypeError(f"Unknown pipeline parameters: {sorted(unknown)}")
+    p = {**pipeline.PARAMS, **params}
+
+    dirs = {
+        name: os.path.join(out_dir, name)
+        for name in ["cleaned", "member2", "member3", "link_traffic", "capacity"]
+    }
+    for path in dirs.values():
+        os.makedirs(path, exist_ok=True)
+    work_dir = tempfile.mkdtemp(prefix=".chunked_", dir=out_dir)
+
+    try:
+        with instr.span("ingest"):
+            throughput, pktloss = ingest(
+                data_dir, dirs["cleaned"], work_dir,
+                range(1, p["num_cells"] + 1), chunk_slots
+            )
+        with instr.span("signals"):
+            cell_ids, signal_matrix = build_signal_matrix(
+                pktloss, p["window_size"], chunk_slots
+            )
+        with instr.span("topology"):
+            corr_df, mapping_df = pipeline.infer_topology(
+                signal_matrix, cell_ids, p["num_links"]
+            )
+        with instr.span("link_traffic"):
+            link_traces = aggregate_links(
+                throughput, mapping_df, dirs["link_traffic"], work_dir,
+                chunk_slots
+            )
+        with instr.span("capacity"):
+            capacity_df = estimate_capacity(
+                link_traces, p["window"], p["loss_percentile"],
+                p["loss_limit"], p["buffer_time_sec"], work_dir, chunk_slots
+            )
+        del throughput, pktloss, link_traces
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    # Small outputs: same files as pipeline.save()
+    np.save(os.path.join(dirs["member2"], "signal_matrix.npy"), signal_matrix)
+    pd.DataFrame(
+        signal_matrix, index=[f"cell_{cid}" for cid in cell_ids]
+    ).to_csv(os.path.join(dirs["member2"], "signal_matrix.csv"))
+
+    corr_df.to_csv(os.path.join(dirs["member3"], "correlation_matrix.csv"))
+    mapping_df.to_csv(
+        os.path.join(dirs["member3"], "cell_to_link_mapping.csv"), index=False
+    )
+    member3.groupwise_table(mapping_df).to_csv(
+        os.path.join(dirs["member3"], "link_groupwise_table.csv"), index=False
+    )
+
+    capacity_df[["Link", "Avg_Traffic_Gbps", "Required_Capacity_No_Buffer_Gbps"]].to_csv(
+        os.path.join(dirs["capacity"], "required_capacity_no_buffer.csv"),
+        index=False
+    )
+    capacity_df[["Link", "Required_Capacity_With_Buffer_Gbps"]].to_csv(
+        os.path.join(dirs["capacity"], "required_capacity_with_buffer.csv"),
+        index=False
+    )
+
+    return {
+        "params": p,
+        "cell_ids": cell_ids,
+        "signal_matrix": signal_matrix,
+        "correlation": corr_df,
+        "mapping": mapping_df,
+        "capacity": capacity_df,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Run the pipeline on traces larger than memory"
+    )
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--out-dir", default=OUTPUT_DIR)
+    parser.add_argument("--chunk-slots", type=int, default=CHUNK_SLOTS,
+                        help="slots per chunk; memory use scales with this")
+    parser.add_argument("--set", dest="params", action="append", default=[],
+                        type=pipeline.parse_param, metavar="KEY=VALUE",
+                        help=f"override a parameter ({', '.join(pipeline.PARAMS)})")
+    parser.add_argument("--no-store", action="store_true",
+                        help="don't record the run in <out>/results.sqlite")
+    parser.add_argument("--arrow", action="store_true",
+                        help="also export <out>/arrow/*.arrow (needs pyarrow)")
+    instr.add_arguments(parser)
+    args = parser.parse_args()
+
+    instr.configure_from_args(args, os.path.join(args.out_dir, "trace.json"))
+
+    result = run(args.data_dir, args.out_dir, args.chunk_slots, **dict(args.params))
+    print(result["capacity"].to_string(index=False))
+
+    if not args.no_store:
+        run_id = results_store.record_run(
+            result, args.data_dir, os.path.join(args.out_dir, "results.sqlite"),
+            source="chunked"
+        )
+        print(f"Recorded as run {run_id}")
+
+    if args.arrow:
+        with instr.span("arrow_export"):
+            arrow_export.export_outputs(args.out_dir)
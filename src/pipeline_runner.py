@@ -0,0 +1,414 @@
+import os
+import sys
+import ast
+import json
+import glob
+import time
+import hashlib
+import argparse
+import importlib
+import contextlib
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+# Stages render figures from worker processes; never open a GUI backend
+os.environ.setdefault("MPLBACKEND", "Agg")
+
+import pipeline  # noqa: E402
+import pipeline_state  # noqa: E402
+import instrumentation as instr  # noqa: E402
+
+# PATHS
+BASE_DIR = pipeline_state.BASE_DIR
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = pipeline_state.DATA_DIR
+OUTPUT_DIR = pipeline_state.OUTPUT_DIR
+
+STATE_FILE = pipeline_state.STATE_FILE
+LOG_DIR = ".pipeline_logs"
+MAX_WORKERS = 4
+
+# STAGE GRAPH
+# Each stage: script module + entry point, upstream stages, the parameters it
+# depends on, and the files it reads / writes ({data} and {out} are expanded).
+STAGES = {
+    "preprocess": {
+        "module": "preprocess_member1", "func": "main", "deps": [],
+        "params": ["num_cells"],
+        "inputs": pipeline_state.RAW_INPUTS,
+        "outputs": ["{out}/cleaned/*.csv"],
+        "kwargs": lambda d, o, p: {
+            "throughput_dir": os.path.join(d, "throughput"),
+            "pktstats_dir": os.path.join(d, "pkt-stats"),
+            "output_dir": os.path.join(o, "cleaned"),
+            "num_cells": p["num_cells"],
+        },
+    },
+    "signals": {
+        "module": "member2_prepare_signals", "func": "main",
+        "deps": ["preprocess"],
+        "params": ["num_cells", "window_size"],
+        "inputs": ["{out}/cleaned/pktloss_slot_cell_*.csv"],
+        "outputs": ["{out}/member2/signal_matrix.npy",
+                    "{out}/member2/signal_matrix.csv"],
+        "kwargs": lambda d, o, p: {
+            "clean_dir": os.path.join(o, "cleaned"),
+            "out_dir": os.path.join(o, "member2"),
+            "num_cells": p["num_cells"],
+            "window_size": p["window_size"],
+        },
+    },
+    "topology": {
+        "module": "member3_topology_inference", "func": "main",
+        "deps": ["signals"],
+        "params": ["num_links"],
+        "inputs": ["{out}/member2/signal_matrix.npy"],
+        "outputs": ["{out}/member3/correlation_matrix.csv",
+                    "{out}/member3/cell_to_link_mapping.csv",
+                    "{out}/member3/link_groupwise_table.csv"],
+        "kwargs": lambda d, o, p: {
+            "in_dir": os.path.join(o, "member2"),
+            "out_dir": os.path.join(o, "member3"),
+            "num_links": p["num_links"],
+            "render_heatmap": False,
+        },
+    },
+    "heatmap": {
+        "module": "member3_topology_inference", "func": "heatmap_main",
+        "deps": ["topology"],
+        "params": [],
+        "inputs": ["{out}/member3/correlation_matrix.csv"],
+        "outputs": ["{out}/member3/correlation_heatmap.png"],
+        "kwargs": lambda d, o, p: {"out_dir": os.path.join(o, "member3")},
+    },
+    "snapshot": {
+        "module": "member3_traffic_snapshot", "func": "main",
+        "deps": ["preprocess"],
+        "params": [],
+        "inputs": ["{out}/cleaned/*.csv"],
+        "outputs": ["{out}/member3/traffic_snapshot.png"],
+        "kwargs": lambda d, o, p: {
+            "clean_dir": os.path.join(o, "cleaned"),
+            "out_dir": os.path.join(o, "member3"),
+        },
+    },
+    "link_traffic": {
+        "module": "build_link_slot_traffic", "func": "main",
+        "deps": ["preprocess", "topology"],
+        "params": [],
+        "inputs": ["{out}/cleaned/throughput_slot_cell_*.csv",
+                   "{out}/member3/cell_to_link_mapping.csv"],
+        "outputs": ["{out}/link_traffic/*_slot_traffic.fhlt"],
+        "kwargs": lambda d, o, p: {
+            "clean_dir": os.path.join(o, "cleaned"),
+            "topo_dir": os.path.join(o, "member3"),
+            "out_dir": os.path.join(o, "link_traffic"),
+        },
+    },
+    "capacity_no_buffer": {
+        "module": "estimate_capacity_no_buffer", "func": "main",
+        "deps": ["link_traffic"],
+        "params": ["window", "loss_percentile"],
+        "inputs": ["{out}/link_traffic/*_slot_traffic.fhlt"],
+        "outputs": ["{out}/capacity/required_capacity_no_buffer.csv"],
+        "kwargs": lambda d, o, p: {
+            "link_traffic_dir": os.path.join(o, "link_traffic"),
+            "out_dir": os.path.join(o, "capacity"),
+            "window": p["window"],
+            "loss_percentile": p["loss_percentile"],
+        },
+    },
+    "capacity_with_buffer": {
+        "module": "estimate_capacity_with_buffer", "func": "main",
+        "deps": ["link_traffic"],
+        "params": ["window", "loss_limit", "buffer_time_sec"],
+        "inputs": ["{out}/link_traffic/*_slot_traffic.fhlt"],
+        "outputs": ["{out}/capacity/required_capacity_with_buffer.csv"],
+        "kwargs": lambda d, o, p: {
+            "link_traffic_dir": os.path.join(o, "link_traffic"),
+            "out_dir": os.path.join(o, "capacity"),
+            "loss_limit": p["loss_limit"],
+            "buffer_time_sec": p["buffer_time_sec"],
+            "window": p["window"],
+        },
+    },
+    "multiplexing": {
+        "module": "multiplexing_gain", "func": "main",
+        "deps": ["preprocess", "topology"],
+        "params": ["window", "loss_percentile", "loss_limit", "buffer_time_sec"],
+        "inputs": ["{out}/cleaned/throughput_slot_cell_*.csv",
+                   "{out}/member3/cell_to_link_mapping.csv"],
+        "outputs": ["{out}/capacity/cell_capacity.csv",
+                    "{out}/capacity/multiplexing_gain.csv"],
+        "kwargs": lambda d, o, p: {
+            "clean_dir": os.path.join(o, "cleaned"),
+            "topo_dir": os.path.join(o, "member3"),
+            "out_dir": os.path.join(o, "capacity"),
+            "window": p["window"],
+            "loss_percentile": p["loss_percentile"],
+            "loss_limit": p["loss_limit"],
+            "buffer_time_sec": p["buffer_time_sec"],
+        },
+    },
+    "figures": {
+        "module": "plot_link_traffic_figure3", "func": "main",
+        "deps": ["link_traffic", "capacity_with_buffer"],
+        "params": [],
+        "inputs": ["{out}/link_traffic/*_slot_traffic.fhlt",
+                   "{out}/capacity/required_capacity_with_buffer.csv"],
+        "outputs": ["{out}/figures/figure3_*.png"],
+        "kwargs": lambda d, o, p: {
+            "link_traffic_dir": os.path.join(o, "link_traffic"),
+            "capacity_dir": os.path.join(o, "capacity"),
+            "out_dir": os.path.join(o, "figures"),
+        },
+    },
+}
+
+
+# FINGERPRINTING
+FileHasher = pipeline_state.FileHasher
+_expand = pipeline_state.expand
+
+
+def module_sources(module, seen=None):
+    """
+    Source files of a src/ module and of every src/ module it imports,
+    directly or through another one (standard and third-party imports are
+    left out)
+    """
+    seen = set() if seen is None else seen
+    path = os.path.join(SRC_DIR, module + ".py")
+    if module in seen or not os.path.exists(path):
+        return []
+    seen.add(module)
+
+    with open(path) as f:
+        tree = ast.parse(f.read(), path)
+    paths = [path]
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            names = [node.module]
+        else:
+            continue
+        for name in names:
+            paths += module_sources(name.split(".")[0], seen)
+    return paths
+
+
+def stage_fingerprint(name, data_dir, out_dir, params, hasher):
+    stage = STAGES[name]
+    h = hashlib.sha256()
+
+    # Stage code, including the helper modules it imports
+    for path in sorted(module_sources(stage["module"])):
+        h.update(os.path.basename(path).encode())
+        h.update(hasher.digest(path).encode())
+
+    # Parameters this stage actually uses
+    h.update(json.dumps(
+        {k: params[k] for k in stage["params"]}, sort_keys=True
+    ).encode())
+
+    # Input file contents
+    for path in _expand(stage["inputs"], data_dir, out_dir):
+        h.update(os.path.relpath(path, out_dir).encode())
+        h.update(hasher.digest(path).encode())
+
+    return h.hexdigest()
+
+
+def outputs_present(name, data_dir, out_dir):
+    return all(
+        glob.glob(pattern.format(data=data_dir, out=out_dir))
+        for pattern in STAGES[name]["outputs"]
+    )
+
+
+# STAGE EXECUTION (inside worker processes)
+def _run_stage(name, module, func, kwargs, log_file):
+    """
+    Returns (seconds, trace of this stage or None when tracing is off)
+    """
+    if SRC_DIR not in sys.path:
+        sys.path.insert(0, SRC_DIR)
+
+    # Workers are reused across stages; start each stage with an empty trace
+    instr.configure_from_env()
+    instr.reset()
+
+    t0 = time.perf_counter()
+    with open(log_file, "w") as log, contextlib.redirect_stdout(log):
+        with instr.span(name, module=module):
+            getattr(importlib.import_module(module), func)(**kwargs)
+    elapsed = time.perf_counter() - t0
+
+    return elapsed, instr.snapshot() if instr.enabled() else None
+
+
+def _topological_order():
+    order, seen = [], set()
+
+    def visit(name):
+        if name in seen:
+            return
+        seen.add(name)
+        for dep in STAGES[name]["deps"]:
+            visit(dep)
+        order.append(name)
+
+    for name in STAGES:
+        visit(name)
+    return order
+
+
+# RUNNER
+def run(data_dir=DATA_DIR, out_dir=OUTPUT_DIR, params=None, targets=None,
+        force=False, max_workers=MAX_WORKERS):
+    """
+    Run the stage graph, skipping stages whose code, parameters and input
+    contents are unchanged since their last successful run. Independent
+    stages run concurrently. Returns {stage: "ran" | "skipped"}.
+    """
+    params = {**pipeline.PARAMS, **(params or {})}
+    os.makedirs(os.path.join(out_dir, LOG_DIR), exist_ok=True)
+
+    state_path = os.path.join(out_dir, STATE_FILE)
+    state = {"stages": {}, "files": {}}
+    if os.path.exists(state_path):
+        with open(state_path) as f:
+            state = json.load(f)
+    hasher = FileHasher(state["files"])
+
+    # Restrict to the requested targets and everything upstream of them
+    wanted = set()
+    for name in targets or STAGES:
+        stack = [name]
+        while stack:
+            stage = stack.pop()
+            if stage not in wanted:
+                wanted.add(stage)
+                stack.extend(STAGES[stage]["deps"])
+    order = [s for s in _topological_order() if s in wanted]
+
+    status = {}
+    running = {}
+    pending = list(order)
+
+    def save_state():
+        with open(state_path, "w") as f:
+            json.dump(state, f, indent=1)
+
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        while pending or running:
+            # Schedule every pending stage whose upstream stages are finished
+            for name in list(pending):
+                if any(dep not in status for dep in STAGES[name]["deps"]):
+                    continue
+                pending.remove(name)
+
+                fingerprint = stage_fingerprint(
+                    name, data_dir, out_dir, params, hasher
+                )
+                previous = state["stages"].get(name, {}).get("fingerprint")
+
+                if (not force and previous == fingerprint
+                        and outputs_present(name, data_dir, out_dir)):
+                    status[name] = "skipped"
+                    print(f"[SKIP] {name} (up to date)")
+                    continue
+
+                stage = STAGES[name]
+                print(f"[RUN ] {name}")
+                future = pool.submit(
+                    _run_stage, name, stage["module"], stage["func"],
+                    stage["kwargs"](data_dir, out_dir, params),
+                    os.path.join(out_dir, LOG_DIR, f"{name}.log")
+                )
+                running[future] = (name, fingerprint)
+
+            if not running:
+                continue
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name, fingerprint = running.pop(future)
+                try:
+                    elapsed, trace = future.result()
+                except Exception:
+                    # Keep progress of the stages that did finish
+                    state["stages"].pop(name, None)
+                    save_state()
+                    print(f"[FAIL] {name} — see {os.path.join(out_dir, LOG_DIR, name + '.log')}")
+                    raise
+
+                if trace is not None:
+                    instr.merge(trace)
+
+                status[name] = "ran"
+                state["stages"][name] = {
+                    "fingerprint": fingerprint,
+                    "params": {k: params[k] for k in STAGES[name]["params"]},
+                    "seconds": round(elapsed, 3),
+                }
+                save_state()
+                print(f"[DONE] {name} in {elapsed:.2f}s")
+
+    save_state()
+    return status
+
+
+# MAIN
+def main():
+    parser = argparse.ArgumentParser(
+        description="Incremental, parallel runner for the fronthaul pipeline"
+    )
+    parser.add_argument("targets", nargs="*",
+                        help=f"stages to bring up to date (default: all of {', '.join(STAGES)})")
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--out-dir", default=OUTPUT_DIR)
+    parser.add_argument("--set", dest="params", action="append", default=[],
+                        type=pipeline.parse_param, metavar="KEY=VALUE",
+                        help=f"override a parameter ({', '.join(pipeline.PARAMS)})")
+    parser.add_argument("--force", action="store_true",
+                        help="rerun stages even if they are up to date")
+    parser.add_argument("--jobs", type=int, default=MAX_WORKERS)
+    parser.add_argument("--no-store", action="store_true",
+                        help="don't record the run in <out>/results.sqlite")
+    instr.add_arguments(parser)
+    args = parser.parse_args()
+
+    unknown = [t for t in args.targets if t not in STAGES]
+    if unknown:
+        parser.error(f"unknown stage(s): {', '.join(unknown)}")
+
+    trace_file = instr.configure_from_args(
+        args, os.path.join(args.out_dir, "trace.json")
+    )
+
+    t0 = time.perf_counter()
+    status = run(args.data_dir, args.out_dir, dict(args.params),
+                 args.targets or None, args.force, args.jobs)
+
+    ran = [s for s, v in status.items() if v == "ran"]
+    print(f"\nPipeline up to date in {time.perf_counter() - t0:.2f}s "
+          f"({len(ran)} ran, {len(status) - len(ran)} skipped)")
+
+    # A new result exists only if the topology or a capacity stage reran
+    recorded = {"topology", "capacity_no_buffer", "capacity_with_buffer"}
+    if (not args.no_store and recorded & set(ran)
+            and all(status.get(s) for s in recorded)):
+        import results_store  # imports this module
+        run_id = results_store.import_outputs(
+            args.out_dir, args.data_dir, {**pipeline.PARAMS, **dict(args.params)},
+            os.path.join(args.out_dir, "results.sqlite")
+        )
+        print(f"Recorded as run {run_id}")
+
+    if trace_file:
+        print(f"Trace will be written to {trace_file} on exit")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+import os
+import glob
+import hashlib
+
+# PATHS
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(BASE_DIR, "data")
+OUTPUT_DIR = os.path.join(BASE_DIR, "output")
+
+# RUNNER STATE
+# Shared by the incremental runner and the results store without importing
+# any stage module
+STATE_FILE = ".pipeline_state.json"
+RAW_INPUTS = ["{data}/throughput/*.dat", "{data}/pkt-stats/*.dat"]
+
+
+# FINGERPRINTING
+class FileHasher:
+    """
+    Content hashes of files, re-read only when size or mtime changed
+    """
+
+    def __init__(self, memo=None):
+        self.memo = memo or {}
+
+    def digest(self, path):
+        st = os.stat(path)
+        cached = self.memo.get(path)
+        if cached and cached[0] == st.st_size and cached[1] == st.st_mtime_ns:
+            return cached[2]
+
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+
+        self.memo[path] = [st.st_size, st.st_mtime_ns, h.hexdigest()]
+        return h.hexdigest()
+
+
+def expand(patterns, data_dir, out_dir):
+    """
+    Sorted paths matching the {data} / {out} glob patterns
+    """
+    paths = []
+    for pattern in patterns:
+        paths.extend(sorted(glob.glob(
+            pattern.format(data=data_dir, out=out_dir)
+        )))
+    return paths
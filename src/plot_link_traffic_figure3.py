@@ -1,7 +1,11 @@
 import os
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 
+import instrumentation as instr
+import link_traffic_store
+
 # PATHS
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
@@ -9,8 +13,6 @@ LINK_TRAFFIC_DIR = os.path.join(BASE_DIR, "output", "link_traffic")
 CAPACITY_DIR = os.path.join(BASE_DIR, "output", "capacity")
 OUT_DIR = os.path.join(BASE_DIR, "output", "figures")
 
-os.makedirs(OUT_DIR, exist_ok=True)
-
 # CONSTANTS
 SLOT_TIME_SEC = 500e-6        # 500 microseconds
 PLOT_DURATION_SEC = 60        # seconds
@@ -18,15 +20,6 @@ MAX_SLOTS = int(PLOT_DURATION_SEC / SLOT_TIME_SEC)
 
 PLOT_STRIDE = 20              # plot every 20th slot (~10 ms)
 
-# LOAD CAPACITY TABLES
-cap_no_buf = pd.read_csv(
-    os.path.join(CAPACITY_DIR, "required_capacity_no_buffer.csv")
-).set_index("Link")
-
-cap_buf = pd.read_csv(
-    os.path.join(CAPACITY_DIR, "required_capacity_with_buffer.csv")
-).set_index("Link")
-
 # COLOR CONFIGURATION (SPIKE-FRIENDLY)
 FILL_COLOR = "#c77dff"   # light lavender
 EDGE_COLOR = "#5a189a"   # dark purple
@@ -34,29 +27,20 @@ AVG_COLOR  = "#2e7d32"   # green
 CAP_COLOR  = "#d32f2f"   # red
 GRID_COLOR = "#bdbdbd"   # light gray
 
-# PLOT EACH LINK (FIGURE-3 STYLE)
-for fname in sorted(os.listdir(LINK_TRAFFIC_DIR)):
-    if not fname.endswith("_slot_traffic.csv"):
-        continue
-
-    link_id = fname.split("_")[1]
-    link_name = f"Link {link_id}"
-
-    df = pd.read_csv(os.path.join(LINK_TRAFFIC_DIR, fname))
-
+# PLOT ONE LINK (FIGURE-3 STYLE)
+def plot_link_traffic(link_name, traffic_gbps, cap_b, out_file):
     # Limit to first 60 seconds
-    df = df.iloc[:MAX_SLOTS]
+    traffic_gbps = np.asarray(traffic_gbps)[:MAX_SLOTS]
 
     # Downsample for readability
-    df_plot = df.iloc[::PLOT_STRIDE].copy()
+    slot_index = np.arange(len(traffic_gbps))[::PLOT_STRIDE]
+    traffic = traffic_gbps[::PLOT_STRIDE]
 
     # Correct time axis
-    time_sec = df_plot["slot_index"].values * SLOT_TIME_SEC
-    traffic = df_plot["data_rate_gbps"].values
+    time_sec = slot_index * SLOT_TIME_SEC
 
     # Statistics
     avg = traffic[traffic > 0].mean() if (traffic > 0).any() else 0.0
-    cap_b = cap_buf.loc[link_name, "Required_Capacity_With_Buffer_Gbps"]
 
     # PLOTTING
     plt.figure(figsize=(14, 5))
@@ -108,16 +92,51 @@ for fname in sorted(os.listdir(LINK_TRAFFIC_DIR)):
     plt.grid(True, color=GRID_COLOR, alpha=0.4)
     plt.legend(loc="upper right")
 
-    # Save figure
-    out_file = os.path.join(
-        OUT_DIR,
-        f"figure3_{link_name.replace(' ', '_')}.png"
-    )
-
     plt.tight_layout()
     plt.savefig(out_file, dpi=150)
     plt.close()
 
-    print(f"Saved: {out_file}")
+def clear_figures(out_dir):
+    """
+    Remove the Figure-3 plots of an earlier run (which may have had more links)
+    """
+    if not os.path.isdir(out_dir):
+        return
+    for fname in os.listdir(out_dir):
+        if fname.startswith("figure3_Link_") and fname.endswith(".png"):
+            os.remove(os.path.join(out_dir, fname))
+
+# MAIN
+def main(link_traffic_dir=LINK_TRAFFIC_DIR, capacity_dir=CAPACITY_DIR,
+         out_dir=OUT_DIR):
+    os.makedirs(out_dir, exist_ok=True)
+    clear_figures(out_dir)
+
+    # LOAD CAPACITY TABLES
+    cap_buf = pd.read_csv(
+        os.path.join(capacity_dir, "required_capacity_with_buffer.csv")
+    ).set_index("Link")
+
+    # PLOT EACH LINK
+    for link_id, file_path in link_traffic_store.link_files(link_traffic_dir).items():
+        link_name = f"Link {link_id}"
+        traffic = link_traffic_store.load_link(file_path)
+
+        cap_b = cap_buf.loc[link_name, "Required_Capacity_With_Buffer_Gbps"]
+
+        out_file = os.path.join(
+            out_dir,
+            f"figure3_{link_name.replace(' ', '_')}.png"
+        )
+
+        with instr.span("plot_figure3", link=int(link_id)):
+            plot_link_traffic(link_name, traffic, cap_b, out_file)
+            instr.count_file(out_file)
+
+        print(f"Saved: {out_file}")
+
+    print("\nFigure-3 style plots generated successfully.")
+
 
-print("\nFigure-3 style plots generated successfully.")
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,8 @@ import os
 import pandas as pd
 import numpy as np
 
+import instrumentation as instr
+
 # PATHS
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
@@ -9,35 +11,56 @@ THROUGHPUT_DIR = os.path.join(BASE_DIR, "data", "throughput")
 PKTSTATS_DIR = os.path.join(BASE_DIR, "data", "pkt-stats")
 OUTPUT_DIR = os.path.join(BASE_DIR, "output", "cleaned")
 
-os.makedirs(OUTPUT_DIR, exist_ok=True)
-
 # CONSTANTS
+NUM_CELLS = 24
 SYMBOLS_PER_SLOT = 14
 SLOT_DURATION_SEC = 500e-6  # 500 microseconds
+GLITCH_QUANTILE = 0.999
 
-# THROUGHPUT PREPROCESSING (FINAL)
-def process_throughput(cell_id):
-    file_path = os.path.join(
-        THROUGHPUT_DIR, f"throughput-cell-{cell_id}.dat"
+# PARSING
+def read_throughput(file_path):
+    df = pd.read_csv(
+        file_path,
+        sep=r"\s+",
+        header=None,
+        names=["timestamp", "kbits"],
+        engine="python"
     )
+    instr.count("rows_parsed", len(df))
+    instr.count_file(file_path, "bytes_read")
+    return df
 
-    if not os.path.exists(file_path):
-        print(f"[SKIP] Throughput file missing for cell {cell_id}")
-        return
-
+def read_pktstats(file_path):
     df = pd.read_csv(
         file_path,
         sep=r"\s+",
         header=None,
-        names=["timestamp", "kbits"],
+        names=["timestamp", "tx", "rx", "too_late"],
         engine="python"
     )
+    instr.count("rows_parsed", len(df))
+    instr.count_file(file_path, "bytes_read")
+    return df
 
-    # Sort by time
-    df = df.sort_values("timestamp").reset_index(drop=True)
+# THROUGHPUT PREPROCESSING (FINAL)
+def throughput_to_slots(df):
+    """
+    Per-symbol kbits → per-slot [timestamp_slot, data_rate_gbps]
+    """
+    # Sort by time (stable, so equal timestamps keep file order)
+    df = df.sort_values("timestamp", kind="stable").reset_index(drop=True)
 
     # Remove extreme glitches (instrumentation artifacts)
-    upper = df["kbits"].quantile(0.999)
+    upper = df["kbits"].quantile(GLITCH_QUANTILE)
+
+    return symbols_to_slots(df, upper)
+
+def symbols_to_slots(df, upper):
+    """
+    Time-ordered symbols → slots, zeroing kbits above the glitch threshold
+    (in place). Slots are df.index // 14, so a chunk must start on a slot
+    boundary.
+    """
     df.loc[df["kbits"] > upper, "kbits"] = 0.0
 
     # Convert kbits → bits per symbol
@@ -56,34 +79,38 @@ def process_throughput(cell_id):
         slot_df["bits_per_slot"] / SLOT_DURATION_SEC / 1e9
     )
 
-    slot_df[["timestamp_slot", "data_rate_gbps"]].to_csv(
-        os.path.join(
-            OUTPUT_DIR,
-            f"throughput_slot_cell_{cell_id}.csv"
-        ),
-        index=False
-    )
-
-    print(f"[OK] Throughput processed for cell {cell_id}")
+    return slot_df[["timestamp_slot", "data_rate_gbps"]]
 
-# PACKET STATS PREPROCESSING (UNCHANGED)
-def process_pktstats(cell_id):
+def process_throughput(cell_id, throughput_dir=THROUGHPUT_DIR,
+                       output_dir=OUTPUT_DIR):
     file_path = os.path.join(
-        PKTSTATS_DIR, f"pkt-stats-cell-{cell_id}.dat"
+        throughput_dir, f"throughput-cell-{cell_id}.dat"
     )
 
     if not os.path.exists(file_path):
-        print(f"[SKIP] Packet-stats file missing for cell {cell_id}")
-        return
+        print(f"[SKIP] Throughput file missing for cell {cell_id}")
+        return None
 
-    pkt = pd.read_csv(
-        file_path,
-        sep=r"\s+",
-        header=None,
-        names=["timestamp", "tx", "rx", "too_late"],
-        engine="python"
-    )
+    with instr.span("preprocess_throughput", cell=cell_id):
+        slot_df = throughput_to_slots(read_throughput(file_path))
+        instr.count("slots", len(slot_df))
+
+        if output_dir is not None:
+            out_file = os.path.join(
+                output_dir,
+                f"throughput_slot_cell_{cell_id}.csv"
+            )
+            slot_df.to_csv(out_file, index=False)
+            instr.count_file(out_file)
 
+    print(f"[OK] Throughput processed for cell {cell_id}")
+    return slot_df
+
+# PACKET STATS PREPROCESSING (UNCHANGED)
+def pktstats_to_loss(pkt):
+    """
+    Per-slot tx/rx/too_late counters → [timestamp_slot, loss_ratio]
+    """
     for col in ["tx", "rx", "too_late"]:
         pkt[col] = pd.to_numeric(pkt[col], errors="coerce")
 
@@ -101,23 +128,46 @@ def process_pktstats(cell_id):
     pkt_clean = pkt[["timestamp", "loss_ratio"]]
     pkt_clean.columns = ["timestamp_slot", "loss_ratio"]
 
-    pkt_clean.to_csv(
-        os.path.join(
-            OUTPUT_DIR,
-            f"pktloss_slot_cell_{cell_id}.csv"
-        ),
-        index=False
+    return pkt_clean
+
+def process_pktstats(cell_id, pktstats_dir=PKTSTATS_DIR,
+                     output_dir=OUTPUT_DIR):
+    file_path = os.path.join(
+        pktstats_dir, f"pkt-stats-cell-{cell_id}.dat"
     )
 
+    if not os.path.exists(file_path):
+        print(f"[SKIP] Packet-stats file missing for cell {cell_id}")
+        return None
+
+    with instr.span("preprocess_pktstats", cell=cell_id):
+        pkt_clean = pktstats_to_loss(read_pktstats(file_path))
+        instr.count("slots", len(pkt_clean))
+
+        if output_dir is not None:
+            out_file = os.path.join(
+                output_dir,
+                f"pktloss_slot_cell_{cell_id}.csv"
+            )
+            pkt_clean.to_csv(out_file, index=False)
+            instr.count_file(out_file)
+
     print(f"[OK] Packet-stats processed for cell {cell_id}")
+    return pkt_clean
 
 # MAIN
-if __name__ == "__main__":
+def main(throughput_dir=THROUGHPUT_DIR, pktstats_dir=PKTSTATS_DIR,
+         output_dir=OUTPUT_DIR, num_cells=NUM_CELLS):
+    os.makedirs(output_dir, exist_ok=True)
 
     print("\nStarting preprocessing for all cells...\n")
 
-    for cell_id in range(1, 25):
-        process_throughput(cell_id)
-        process_pktstats(cell_id)
+    for cell_id in range(1, num_cells + 1):
+        process_throughput(cell_id, throughput_dir, output_dir)
+        process_pktstats(cell_id, pktstats_dir, output_dir)
 
     print("\nPreprocessing complete.")
+
+
+if __name__ == "__main__":
+    main()
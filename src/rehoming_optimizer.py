@@ -0,0 +1,321 @@
+import os
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+import instrumentation as instr
+import pipeline
+import build_link_slot_traffic as link_traffic
+import estimate_capacity_no_buffer as cap_no_buf
+import estimate_capacity_with_buffer as cap_buf
+import estimate_capacity_batched as batched
+
+# PATHS
+CLEAN_DIR = link_traffic.CLEAN_DIR
+MAPPING_FILE = os.path.join(link_traffic.TOPO_DIR, "cell_to_link_mapping.csv")
+OUT_DIR = os.path.join(pipeline.OUTPUT_DIR, "rehoming")
+
+# PARAMETERS
+OBJECTIVES = ["quantile", "buffer"]
+SCREEN_STRIDE = 8            # screen candidates on every 8th windowed slot
+CONFIRM_TOP = 3              # ... then score the best few exactly
+MAX_PASSES = 20
+MIN_GAIN_GBPS = 1e-4
+
+
+# RUNNING LINK SUMS
+class Assignment:
+    """
+    Cell → link assignment with the WINDOW-averaged traffic of every link
+    kept as a running sum of its cells' windowed traces (the moving average
+    is linear), so a move only subtracts one row and adds it to another.
+
+    The objective is the sum of per-link required capacities:
+      quantile  loss_percentile of the windowed link trace (no-buffer capacity)
+      buffer    the buffered search of the batched estimator
+    Candidates are first screened with the quantile on every
+    SCREEN_STRIDE-th slot, and only the best CONFIRM_TOP are scored exactly.
+    """
+
+    def __init__(self, cell_traces, link_groups, objective="quantile",
+                 window=cap_no_buf.WINDOW,
+                 loss_percentile=cap_no_buf.LOSS_PERCENTILE,
+                 loss_limit=cap_buf.LOSS_LIMIT,
+                 buffer_time_sec=cap_buf.BUFFER_TIME_SEC,
+                 min_cells=1, max_cells=None):
+        if objective not in OBJECTIVES:
+            raise ValueError(f"objective must be one of {OBJECTIVES}")
+        self.objective = objective
+        self.loss_percentile = loss_percentile
+        self.loss_limit = loss_limit
+        self.buffer_time_sec = buffer_time_sec
+
+        self.cells = sorted(cell_traces)
+        self.row = {cell_id: i for i, cell_id in enumerate(self.cells)}
+        self.links = sorted(link_groups)
+        self.min_cells = min_cells
+        self.max_cells = max_cells or max(len(c) for c in link_groups.values())
+
+        # Windowed cell traces, trimmed to the shortest cell
+        num_slots = min(len(cell_traces[c]) for c in self.cells)
+        raw = np.stack([cell_traces[c][:num_slots] for c in self.cells])
+        self.windowed, _ = batched.window_links(
+            raw, np.full(len(self.cells), num_slots), window
+        )
+
+        self.link_of = np.empty(len(self.cells), dtype=np.int64)
+        for link_id, cells in link_groups.items():
+            for cell_id in cells:
+                self.link_of[self.row[cell_id]] = self.links.index(link_id)
+
+        self.sums = np.zeros((len(self.links), self.windowed.shape[1]))
+        np.add.at(self.sums, self.link_of, self.windowed)
+        self.capacity = self.exact(self.sums)
+
+        # Strided copies for screening, updated alongside the full sums
+        self.windowed_s = np.ascontiguousarray(self.windowed[:, ::SCREEN_STRIDE])
+        self.sums_s = np.ascontiguousarray(self.sums[:, ::SCREEN_STRIDE])
+        self.screened = self.screen(self.sums_s)
+        self.evaluated = 0
+
+    # Objective
+    def exact(self, rows):
+        if self.objective == "quantile":
+            return np.percentile(rows, self.loss_percentile, axis=1)
+        capacity, _ = batched.search_capacities(
+            rows, np.full(len(rows), rows.shape[1]), self.loss_limit,
+            self.buffer_time_sec
+        )
+        return capacity
+
+    def screen(self, rows):
+        return np.percentile(rows, self.loss_percentile, axis=1)
+
+    def counts(self):
+        return np.bincount(self.link_of, minlength=len(self.links))
+
+    def total(self):
+        return float(self.capacity.sum())
+
+    def groups(self):
+        return {
+            link_id: [c for c in self.cells if self.link_of[self.row[c]] == i]
+            for i, link_id in enumerate(self.links)
+        }
+
+    # Candidates
+    def _after(self, kind, c, other, sums, windowed):
+        """
+        (links a, b) and their two traces after moving c to link `other`,
+        or swapping c with cell `other`
+        """
+        a = self.link_of[c]
+        if kind == "move":
+            b = other
+            return a, b, sums[a] - windowed[c], sums[b] + windowed[c]
+        b = self.link_of[other]
+        delta = windowed[other] - windowed[c]
+        return a, b, sums[a] + delta, sums[b] - delta
+
+    def _confirm(self, kind, c, gains, others):
+        """
+        Score the best CONFIRM_TOP screened candidates (those that look like
+        an improvement) exactly; returns (gain, kind, other, capacities) of
+        the best, or None
+        """
+        best = None
+        for i in np.argsort(-gains)[:CONFIRM_TOP]:
+            if gains[i] <= 0:
+                break
+            a, b, row_a, row_b = self._after(kind, c, others[i], self.sums, self.windowed)
+            cap_a, cap_b = self.exact(np.stack([row_a, row_b]))
+            gain = self.capacity[a] + self.capacity[b] - cap_a - cap_b
+            if best is None or gain > best[0]:
+                best = (gain, kind, others[i], (cap_a, cap_b))
+        return best
+
+    def best_move(self, c):
+        a = self.link_of[c]
+        counts = self.counts()
+        if counts[a] <= self.min_cells:
+            return None
+        targets = np.array([b for b in range(len(self.links))
+                            if b != a and counts[b] < self.max_cells], dtype=np.int64)
+        if len(targets) == 0:
+            return None
+
+        without = self.screen((self.sums_s[a] - self.windowed_s[c])[None, :])[0]
+        with_c = self.screen(self.sums_s[targets] + self.windowed_s[c])
+        self.evaluated += len(targets)
+
+        gains = self.screened[a] + self.screened[targets] - without - with_c
+        return self._confirm("move", c, gains, targets)
+
+    def best_swap(self, c):
+        a = self.link_of[c]
+        others = np.flatnonzero(self.link_of != a)
+        if len(others) == 0:
+            return None
+
+        delta = self.windowed_s[others] - self.windowed_s[c]
+        screened_a = self.screen(self.sums_s[a] + delta)
+        screened_b = self.screen(self.sums_s[self.link_of[others]] - delta)
+        self.evaluated += len(others)
+
+        gains = (self.screened[a] + self.screened[self.link_of[others]]
+                 - screened_a - screened_b)
+        return self._confirm("swap", c, gains, others)
+
+    def apply(self, kind, c, other, capacities):
+        a, b, self.sums[a], self.sums[b] = self._after(
+            kind, c, other, self.sums, self.windowed
+        )
+        _, _, self.sums_s[a], self.sums_s[b] = self._after(
+            kind, c, other, self.sums_s, self.windowed_s
+        )
+        if kind == "move":
+            self.link_of[c] = b
+        else:
+            self.link_of[c], self.link_of[other] = b, a
+
+        self.capacity[a], self.capacity[b] = capacities
+        self.screened[[a, b]] = self.screen(self.sums_s[[a, b]])
+        return a, b
+
+
+def optimize(assignment, max_passes=MAX_PASSES, swaps=True, verbose=True):
+    """
+    Local search: every pass visits each cell, applies its best improving
+    move (or, failing that, its best swap). Stops when a pass changes
+    nothing. Returns the list of applied steps.
+    """
+    steps = []
+    t0 = time.perf_counter()
+
+    for pass_no in range(1, max_passes + 1):
+        changed = False
+        for c in range(len(assignment.cells)):
+            best = assignment.best_move(c)
+            if swaps and (best is None or best[0] <= MIN_GAIN_GBPS):
+                swap = assignment.best_swap(c)
+                if swap is not None and (best is None or swap[0] > best[0]):
+                    best = swap
+            if best is None or best[0] <= MIN_GAIN_GBPS:
+                continue
+
+            gain, kind, other, capacities = best
+            cell_id = assignment.cells[c]
+            a, b = assignment.apply(kind, c, other, capacities)
+            steps.append({
+                "Step": len(steps) + 1,
+                "Pass": pass_no,
+                "Kind": kind,
+                "Cell": f"Cell {cell_id}",
+                "Swapped_With": f"Cell {assignment.cells[other]}" if kind == "swap" else "",
+                "From_Link": assignment.links[a],
+                "To_Link": assignment.links[b],
+                "Gain_Gbps": round(gain, 4),
+                "Total_Capacity_Gbps": round(assignment.total(), 4),
+            })
+            changed = True
+            if verbose:
+                print(f"[{kind.upper()}] Cell {cell_id}: Link {assignment.links[a]} → "
+                      f"Link {assignment.links[b]}, -{gain:.3f} Gbps "
+                      f"(total {assignment.total():.3f})")
+
+        if not changed:
+            break
+
+    elapsed = time.perf_counter() - t0
+    instr.count("candidates", assignment.evaluated)
+    if verbose:
+        print(f"{assignment.evaluated} candidates in {elapsed:.2f}s "
+              f"({assignment.evaluated / max(elapsed, 1e-9):,.0f}/s)")
+    return steps
+
+
+def compare(cell_traces, before, after, **params):
+    """
+    Both capacity estimates per link for the two groupings, computed from
+    scratch with the batched estimator
+    """
+    rows = []
+    for label, groups in [("Before", before), ("After", after)]:
+        traces = link_traffic.aggregate_links(
+            cell_traces, {k: v for k, v in groups.items() if v}
+        )
+        capacity = batched.estimate_capacity(traces, **params)
+        capacity.insert(1, "Cells", [len(groups[k]) for k in traces])
+        capacity.insert(0, "Assignment", label)
+        rows.append(capacity)
+    return pd.concat(rows, ignore_index=True)
+
+
+# MAIN
+def main(clean_dir=CLEAN_DIR, mapping_file=MAPPING_FILE, out_dir=OUT_DIR,
+         objective="quantile", min_cells=1, max_cells=None,
+         max_passes=MAX_PASSES, swaps=True):
+    os.makedirs(out_dir, exist_ok=True)
+
+    before = link_traffic.link_groups_from_mapping(pd.read_csv(mapping_file))
+    cell_traces = link_traffic.load_cell_traces(clean_dir, sorted(c for cs in before.values() for c in cs))
+
+    with instr.span("rehoming_setup", cells=len(cell_traces)):
+        assignment = Assignment(
+            cell_traces, before, objective, min_cells=min_cells, max_cells=max_cells
+        )
+    start_total = assignment.total()
+    print(f"Start: {start_total:.3f} Gbps over {len(assignment.links)} links "
+          f"({objective} objective, {assignment.min_cells}-{assignment.max_cells} cells per link)")
+
+    with instr.span("rehoming_search"):
+        steps = optimize(assignment, max_passes, swaps)
+    after = assignment.groups()
+    print(f"End:   {assignment.total():.3f} Gbps after {len(steps)} changes")
+
+    mapping_out = os.path.join(out_dir, "proposed_cell_to_link_mapping.csv")
+    pd.DataFrame([
+        {"Cell": f"Cell {c}", "Link_ID": link_id}
+        for link_id, cells in after.items() for c in cells
+    ]).sort_values("Cell", key=lambda s: s.str.extract(r"(\d+)")[0].astype(int)) \
+        .to_csv(mapping_out, index=False)
+
+    steps_out = os.path.join(out_dir, "rehoming_steps.csv")
+    pd.DataFrame(steps, columns=[
+        "Step", "Pass", "Kind", "Cell", "Swapped_With", "From_Link", "To_Link",
+        "Gain_Gbps", "Total_Capacity_Gbps"
+    ]).to_csv(steps_out, index=False)
+
+    with instr.span("rehoming_compare"):
+        comparison = compare(cell_traces, before, after)
+    comparison_out = os.path.join(out_dir, "capacity_before_after.csv")
+    comparison.to_csv(comparison_out, index=False)
+
+    print(comparison.to_string(index=False))
+    for path in [mapping_out, steps_out, comparison_out]:
+        instr.count_file(path)
+        print(f"Saved: {path}")
+
+    return comparison
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Re-home cells between links to minimise total required capacity"
+    )
+    parser.add_argument("--clean-dir", default=CLEAN_DIR)
+    parser.add_argument("--mapping", default=MAPPING_FILE)
+    parser.add_argument("--out-dir", default=OUT_DIR)
+    parser.add_argument("--objective", choices=OBJECTIVES, default="quantile")
+    parser.add_argument("--min-cells", type=int, default=1)
+    parser.add_argument("--max-cells", type=int, default=None,
+                        help="cells per link (default: largest current link)")
+    parser.add_argument("--max-passes", type=int, default=MAX_PASSES)
+    parser.add_argument("--no-swaps", action="store_true")
+    instr.add_arguments(parser)
+    args = parser.parse_args()
+
+    instr.configure_from_args(args)
+    main(args.clean_dir, args.mapping, args.out_dir, args.objective,
+         args.min_cells, args.max_cells, args.max_passes, not args.no_swaps)
@@ -0,0 +1,320 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import argparse
+import pandas as pd
+
+import pipeline_state
+import member3_topology_inference as member3
+
+# PATHS
+DB_FILE = os.path.join(pipeline_state.OUTPUT_DIR, "results.sqlite")
+
+# Parameters a run is keyed by (dedicated, indexed columns); every parameter
+# is also kept as JSON
+KEY_PARAMS = ["window", "loss_percentile", "buffer_time_sec", "num_links"]
+
+# Columns of the capacity table compare_runs() can pivot
+CAPACITY_COLUMNS = ["avg_traffic_gbps", "no_buffer_gbps", "with_buffer_gbps"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    created         REAL NOT NULL,
+    source          TEXT NOT NULL,
+    dataset         TEXT NOT NULL,
+    data_dir        TEXT,
+    window          INTEGER,
+    loss_percentile REAL,
+    buffer_time_sec REAL,
+    num_links       INTEGER,
+    params          TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_by_key
+    ON runs (dataset, window, loss_percentile, buffer_time_sec, num_links, created);
+CREATE INDEX IF NOT EXISTS runs_by_time ON runs (created);
+
+CREATE TABLE IF NOT EXISTS topology (
+    run_id  INTEGER NOT NULL REFERENCES runs(run_id) ON DELETE CASCADE,
+    cell    INTEGER NOT NULL,
+    link_id INTEGER NOT NULL,
+    PRIMARY KEY (run_id, cell)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS capacity (
+    run_id               INTEGER NOT NULL REFERENCES runs(run_id) ON DELETE CASCADE,
+    link_id              INTEGER NOT NULL,
+    avg_traffic_gbps     REAL,
+    no_buffer_gbps       REAL,
+    with_buffer_gbps     REAL,
+    PRIMARY KEY (run_id, link_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS capacity_by_link ON capacity (link_id, run_id);
+
+CREATE TABLE IF NOT EXISTS capacity_curve (
+    run_id        INTEGER NOT NULL REFERENCES runs(run_id) ON DELETE CASCADE,
+    link_id       INTEGER NOT NULL,
+    capacity_gbps REAL NOT NULL,
+    loss_ratio    REAL NOT NULL,
+    PRIMARY KEY (run_id, link_id, capacity_gbps)
+) WITHOUT ROWID;
+"""
+
+
+# CONNECTION
+def connect(path=DB_FILE):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    con = sqlite3.connect(path)
+    con.execute("PRAGMA foreign_keys = ON")
+    con.executescript(SCHEMA)
+    return con
+
+
+def dataset_fingerprint(data_dir, hasher=None):
+    """
+    Content hash of every raw .dat trace under data_dir
+    """
+    hasher = hasher or pipeline_state.FileHasher()
+    paths = pipeline_state.expand(pipeline_state.RAW_INPUTS, data_dir, data_dir)
+    digest = hashlib.sha256()
+    for path in paths:
+        digest.update(os.path.relpath(path, data_dir).encode())
+        digest.update(hasher.digest(path).encode())
+    return digest.hexdigest()
+
+
+def _link_number(labels):
+    # "Link 3" → 3, "Cell 12" → 12
+    return pd.Series(labels).astype(str).str.extract(r"(\d+)")[0].astype(int).values
+
+
+# WRITING
+def _default_params():
+    # pipeline imports every stage module; only writers need its defaults
+    import pipeline
+    return pipeline.PARAMS
+
+
+def record(mapping_df, capacity_df, params, data_dir, curves=None,
+           path=DB_FILE, source="pipeline", hasher=None):
+    """
+    Store one run; returns its run_id. capacity_df has the pipeline's
+    combined capacity columns, curves is {link_id: [(capacity, loss), ...]}.
+    """
+    params = {**_default_params(), **params}
+    dataset = dataset_fingerprint(data_dir, hasher)
+
+    with connect(path) as con:
+        cur = con.execute(
+            "INSERT INTO runs (created, source, dataset, data_dir, window, "
+            "loss_percentile, buffer_time_sec, num_links, params) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (time.time(), source, dataset, os.path.abspath(data_dir),
+             *[params[k] for k in KEY_PARAMS], json.dumps(params, sort_keys=True))
+        )
+        run_id = cur.lastrowid
+
+        con.executemany(
+            "INSERT INTO topology VALUES (?, ?, ?)",
+            zip([run_id] * len(mapping_df), _link_number(mapping_df["Cell"]).tolist(),
+                mapping_df["Link_ID"].astype(int).tolist())
+        )
+        con.executemany(
+            "INSERT INTO capacity VALUES (?, ?, ?, ?, ?)",
+            zip([run_id] * len(capacity_df), _link_number(capacity_df["Link"]).tolist(),
+                capacity_df["Avg_Traffic_Gbps"].tolist(),
+                capacity_df["Required_Capacity_No_Buffer_Gbps"].tolist(),
+                capacity_df["Required_Capacity_With_Buffer_Gbps"].tolist())
+        )
+        for link_id, probes in (curves or {}).items():
+            con.executemany(
+                "INSERT OR REPLACE INTO capacity_curve VALUES (?, ?, ?, ?)",
+                [(run_id, int(link_id), float(c), float(loss)) for c, loss in probes]
+            )
+
+    con.close()
+    return run_id
+
+
+def record_run(result, data_dir, path=DB_FILE, source="pipeline", hasher=None):
+    """
+    Store the return value of pipeline.run()
+    """
+    return record(
+        result["mapping"], result["capacity"], result["params"], data_dir,
+        result.get("curves"), path, source, hasher
+    )
+
+
+def import_outputs(out_dir, data_dir, params=None, path=DB_FILE,
+                   source="runner", hasher=None):
+    """
+    Store the run currently in an output/ tree (no capacity curves there).
+    Parameters default to those the incremental runner last used, and the
+    runner's file hashes are reused for the dataset fingerprint.
+    """
+    state = {"stages": {}, "files": {}}
+    state_file = os.path.join(out_dir, pipeline_state.STATE_FILE)
+    if os.path.exists(state_file):
+        with open(state_file) as f:
+            state = json.load(f)
+
+    if params is None:
+        params = {}
+        for stage in state["stages"].values():
+            params.update(stage.get("params", {}))
+    hasher = hasher or pipeline_state.FileHasher(state["files"])
+
+    mapping_df = pd.read_csv(os.path.join(out_dir, "member3", "cell_to_link_mapping.csv"))
+    no_buf = pd.read_csv(os.path.join(out_dir, "capacity", "required_capacity_no_buffer.csv"))
+    with_buf = pd.read_csv(os.path.join(out_dir, "capacity", "required_capacity_with_buffer.csv"))
+
+    return record(
+        mapping_df, no_buf.merge(with_buf, on="Link"), params, data_dir,
+        None, path, source, hasher
+    )
+
+
+# QUERIES
+def _query(sql, args=(), path=DB_FILE):
+    con = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        return pd.read_sql_query(sql, con, params=args)
+    finally:
+        con.close()
+
+
+def list_runs(path=DB_FILE, dataset=None, limit=50):
+    sql = ("SELECT run_id, created, source, substr(dataset, 1, 12) AS dataset, "
+           + ", ".join(KEY_PARAMS) + " FROM runs")
+    args = ()
+    if dataset is not None:
+        sql += " WHERE dataset = ?"
+        args = (dataset,)
+    sql += " ORDER BY created DESC LIMIT ?"
+    runs = _query(sql, args + (limit,), path)
+    runs["created"] = pd.to_datetime(runs["created"], unit="s")
+    return runs
+
+
+def latest_run_id(path=DB_FILE):
+    runs = _query("SELECT max(run_id) AS run_id FROM runs", path=path)
+    value = runs["run_id"].iloc[0]
+    return None if pd.isna(value) else int(value)
+
+
+def find_runs(dataset, params, path=DB_FILE):
+    """
+    run_ids of earlier runs on the same data with the same key parameters
+    """
+    params = {**_default_params(), **params}
+    runs = _query(
+        "SELECT run_id FROM runs WHERE dataset = ? AND "
+        + " AND ".join(f"{k} = ?" for k in KEY_PARAMS)
+        + " ORDER BY created DESC",
+        (dataset, *[params[k] for k in KEY_PARAMS]), path
+    )
+    return runs["run_id"].tolist()
+
+
+def load_run(run_id, path=DB_FILE):
+    """
+    One run as the DataFrames the stage scripts write: mapping, groupwise,
+    capacity_no_buffer, capacity_with_buffer, plus params and curves
+    ({"Link N": DataFrame[Capacity_Gbps, Loss_Ratio]})
+    """
+    run = _query("SELECT * FROM runs WHERE run_id = ?", (run_id,), path)
+    if run.empty:
+        raise KeyError(f"no run {run_id} in {path}")
+
+    mapping_df = _query(
+        "SELECT 'Cell ' || cell AS Cell, link_id AS Link_ID FROM topology "
+        "WHERE run_id = ? ORDER BY topology.cell", (run_id,), path
+    )
+    capacity = _query(
+        "SELECT 'Link ' || link_id AS Link, avg_traffic_gbps AS Avg_Traffic_Gbps, "
+        "no_buffer_gbps AS Required_Capacity_No_Buffer_Gbps, "
+        "with_buffer_gbps AS Required_Capacity_With_Buffer_Gbps "
+        "FROM capacity WHERE run_id = ? ORDER BY link_id", (run_id,), path
+    )
+    curve = _query(
+        "SELECT 'Link ' || link_id AS Link, capacity_gbps AS Capacity_Gbps, "
+        "loss_ratio AS Loss_Ratio FROM capacity_curve WHERE run_id = ? "
+        "ORDER BY link_id, capacity_gbps", (run_id,), path
+    )
+
+    return {
+        "run_id": run_id,
+        "created": float(run["created"].iloc[0]),
+        "source": run["source"].iloc[0],
+        "params": json.loads(run["params"].iloc[0]),
+        "dataset": run["dataset"].iloc[0],
+        "mapping": mapping_df,
+        "groupwise": member3.groupwise_table(mapping_df),
+        "capacity_no_buffer": capacity[
+            ["Link", "Avg_Traffic_Gbps", "Required_Capacity_No_Buffer_Gbps"]
+        ],
+        "capacity_with_buffer": capacity[["Link", "Required_Capacity_With_Buffer_Gbps"]],
+        "curves": {
+            link: df[["Capacity_Gbps", "Loss_Ratio"]].reset_index(drop=True)
+            for link, df in curve.groupby("Link", sort=False)
+        },
+    }
+
+
+def compare_runs(run_ids, column="with_buffer_gbps", path=DB_FILE):
+    """
+    Link × run table of one capacity column (one of CAPACITY_COLUMNS)
+    """
+    if column not in CAPACITY_COLUMNS:
+        raise ValueError(f"column must be one of {CAPACITY_COLUMNS}, not {column!r}")
+    marks = ", ".join("?" * len(run_ids))
+    df = _query(
+        f"SELECT run_id, 'Link ' || link_id AS Link, {column} AS value "
+        f"FROM capacity WHERE run_id IN ({marks})", tuple(run_ids), path
+    )
+    table = df.pivot(index="Link", columns="run_id", values="value")
+    table.columns = [f"Run {r}" for r in table.columns]
+    return table.reset_index()
+
+
+# MAIN
+def main():
+    parser = argparse.ArgumentParser(description="Query or fill the results store")
+    parser.add_argument("--db", default=DB_FILE)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    sub.add_parser("list", help="most recent runs")
+
+    show = sub.add_parser("show", help="topology and capacity of one run")
+    show.add_argument("run_id", type=int)
+
+    compare = sub.add_parser("compare", help="per-link capacity across runs")
+    compare.add_argument("run_ids", type=int, nargs="+")
+    compare.add_argument("--column", default="with_buffer_gbps",
+                         choices=CAPACITY_COLUMNS)
+
+    imp = sub.add_parser("import", help="record the run in an output/ tree")
+    imp.add_argument("--data-dir", default=pipeline_state.DATA_DIR)
+    imp.add_argument("--out-dir", default=pipeline_state.OUTPUT_DIR)
+
+    args = parser.parse_args()
+
+    if args.command == "list":
+        print(list_runs(args.db).to_string(index=False))
+    elif args.command == "show":
+        run = load_run(args.run_id, args.db)
+        print(json.dumps(run["params"], indent=1))
+        print(run["groupwise"].to_string(index=False))
+        print(run["capacity_no_buffer"].merge(run["capacity_with_buffer"]).to_string(index=False))
+    elif args.command == "compare":
+        print(compare_runs(args.run_ids, args.column, args.db).to_string(index=False))
+    elif args.command == "import":
+        run_id = import_outputs(args.out_dir, args.data_dir, path=args.db, source="import")
+        print(f"Recorded run {run_id} in {args.db}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+import os
+import time
+import socket
+import argparse
+import numpy as np
+
+import pipeline
+import preprocess_member1 as member1
+import telemetry_server as server
+
+# PARAMETERS
+TICK_SLOTS = 20               # slots of every cell sent per burst (10 ms)
+
+
+def load_cell(cell_id, data_dir=pipeline.DATA_DIR):
+    """
+    Per-slot RECORD_DTYPE array for one cell from its .dat files, or None
+    """
+    thr_file = os.path.join(data_dir, "throughput", f"throughput-cell-{cell_id}.dat")
+    pkt_file = os.path.join(data_dir, "pkt-stats", f"pkt-stats-cell-{cell_id}.dat")
+    if not (os.path.exists(thr_file) and os.path.exists(pkt_file)):
+        return None
+
+    thr = member1.throughput_to_slots(member1.read_throughput(thr_file))
+    pkt = member1.read_pktstats(pkt_file)
+    n = min(len(thr), len(pkt))
+
+    records = np.zeros(n, dtype=server.RECORD_DTYPE)
+    records["timestamp"] = thr["timestamp_slot"].values[:n]
+    records["kbits"] = (
+        thr["data_rate_gbps"].values[:n] * 1e9 * member1.SLOT_DURATION_SEC / 1000.0
+    )
+    for col in ["tx", "rx", "too_late"]:
+        records[col] = np.nan_to_num(pkt[col].values[:n].astype(float))
+    records["cell"] = cell_id
+    return records
+
+
+def interleave(cell_records):
+    """
+    One array ordered slot by slot across cells, as the DUs would push it
+    """
+    n = min(len(r) for r in cell_records)
+    return np.stack([r[:n] for r in cell_records], axis=1).ravel()
+
+
+def replay(records, num_cells, host=server.HOST, port=server.UDP_PORT,
+           protocol="udp", speed=1.0, tick_slots=TICK_SLOTS,
+           max_bytes=server.MAX_DATAGRAM):
+    """
+    Send interleaved records tick_slots at a time, paced at `speed` × real
+    time (0 = as fast as possible). Returns (records sent, seconds).
+    """
+    if protocol == "udp":
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 1 << 22)
+        send = lambda frame: sock.sendto(frame, (host, port))
+    else:
+        sock = socket.create_connection((host, port))
+        send = sock.sendall
+
+    per_tick = tick_slots * num_cells
+    tick_sec = tick_slots * member1.SLOT_DURATION_SEC / speed if speed else 0.0
+    t0 = time.perf_counter()
+
+    try:
+        for i, start in enumerate(range(0, len(records), per_tick)):
+            for frame in server.frames(records[start:start + per_tick], max_bytes):
+                send(frame)
+
+            # Pace against the start time so small sleep overshoots don't add up
+            if tick_sec:
+                delay = t0 + (i + 1) * tick_sec - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+    finally:
+        sock.close()
+
+    return len(records), time.perf_counter() - t0
+
+
+# MAIN
+def main():
+    parser = argparse.ArgumentParser(
+        description="Stream existing .dat traces to a telemetry server"
+    )
+    parser.add_argument("--data-dir", default=pipeline.DATA_DIR)
+    parser.add_argument("--cells", type=int, default=member1.NUM_CELLS)
+    parser.add_argument("--host", default=server.HOST)
+    parser.add_argument("--protocol", choices=["udp", "tcp"], default="udp")
+    parser.add_argument("--port", type=int, default=None)
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="multiple of real time (0 = as fast as possible)")
+    parser.add_argument("--datagram-bytes", type=int, default=1472,
+                        help="largest UDP frame (one Ethernet MTU by default)")
+    args = parser.parse_args()
+
+    port = args.port or (server.UDP_PORT if args.protocol == "udp" else server.TCP_PORT)
+    max_bytes = args.datagram_bytes if args.protocol == "udp" else server.MAX_DATAGRAM
+
+    cells = [
+        r for r in (load_cell(c, args.data_dir) for c in range(1, args.cells + 1))
+        if r is not None
+    ]
+    records = interleave(cells)
+    print(f"Replaying {len(records)} records from {len(cells)} cells "
+          f"to {args.protocol}://{args.host}:{port}")
+
+    sent, elapsed = replay(
+        records, len(cells), args.host, port, args.protocol, args.speed,
+        max_bytes=max_bytes
+    )
+    print(f"Sent {sent} records in {elapsed:.2f}s ({sent / elapsed:,.0f}/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,369 @@
+import os
+import socket
+import struct
+import asyncio
+import argparse
+import numpy as np
+import pandas as pd
+
+import instrumentation as instr
+import pipeline
+import live_tail
+import capacity_monitor
+import preprocess_member1 as member1
+import build_link_slot_traffic as link_traffic
+
+# NETWORK
+HOST = "127.0.0.1"
+UDP_PORT = 9870
+TCP_PORT = 9871
+
+# WIRE FORMAT
+# A frame is an 8-byte header (magic "FH", version, reserved, record count)
+# followed by `count` packed little-endian records, one per cell and slot.
+# Over UDP every datagram is one frame; over TCP frames are sent back to back.
+MAGIC = b"FH"
+VERSION = 1
+HEADER = struct.Struct("<2sBBI")
+RECORD_DTYPE = np.dtype([
+    ("timestamp", "<f8"),     # slot start (s)
+    ("kbits", "<f4"),         # payload of the slot (all 14 symbols)
+    ("tx", "<u4"),
+    ("rx", "<u4"),
+    ("too_late", "<u4"),
+    ("cell", "<u2"),
+])                            # 26 bytes, no padding
+MAX_DATAGRAM = 65507
+UDP_RCVBUF = 1 << 23
+
+# BATCHING
+FLUSH_SEC = 0.05              # decode at most this long after arrival
+FLUSH_RECORDS = 1 << 16       # ... or as soon as this many are waiting
+
+
+def pack_frame(records):
+    """
+    Header + records (a RECORD_DTYPE array) as bytes
+    """
+    records = np.ascontiguousarray(records, dtype=RECORD_DTYPE)
+    return HEADER.pack(MAGIC, VERSION, 0, len(records)) + records.tobytes()
+
+
+def frames(records, max_bytes=MAX_DATAGRAM):
+    """
+    Split records into frames of at most max_bytes each
+    """
+    per_frame = max((max_bytes - HEADER.size) // RECORD_DTYPE.itemsize, 1)
+    for start in range(0, len(records), per_frame):
+        yield pack_frame(records[start:start + per_frame])
+
+
+def parse_header(data):
+    magic, version, _, count = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"not a telemetry frame (magic={magic!r}, version={version})")
+    return count
+
+
+# RECEIVING SIDE
+class PushedCell:
+    """
+    Same ring buffers as live_tail.CellStream, filled from the socket
+    """
+
+    def __init__(self, cell_id, ring_slots=live_tail.RING_SLOTS):
+        self.cell_id = cell_id
+        self.throughput = live_tail.RingBuffer(ring_slots, ["timestamp_slot", "data_rate_gbps"])
+        self.loss = live_tail.RingBuffer(ring_slots, ["timestamp_slot", "loss_ratio"])
+        self.gap_slots = 0
+        self.dropped = 0
+
+    def append(self, rows, t0):
+        """
+        rows = [timestamp_slot, data_rate_gbps, loss_ratio] in arrival order.
+        Each record goes to ring index round((timestamp - t0) / slot), with
+        one t0 for every cell, so a lost datagram leaves idle slots instead
+        of shifting this cell against the others and a cell that connects
+        late starts at the index of its first slot. Late or duplicate
+        records are dropped. A gap longer than the ring is skipped, not
+        filled, so a far-future timestamp cannot make the fill any larger
+        than the ring.
+        """
+        k = np.rint((rows[:, 0] - t0) / member1.SLOT_DURATION_SEC).astype(np.int64)
+        if not len(self.throughput):
+            first = max(int(k[0]), 0)
+            self.throughput.start_at(first)
+            self.loss.start_at(first)
+
+        newest = np.maximum.accumulate(np.concatenate([[self.throughput.total - 1], k]))
+        keep = k > newest[:-1]
+        self.dropped += int(len(k) - keep.sum())
+        if not keep.any():
+            return
+
+        rows, k = rows[keep], k[keep] - self.throughput.total
+
+        # Only the last ring-length slots up to the newest record survive
+        skip = max(int(k[-1]) + 1 - len(self.throughput.data), 0)
+        if skip:
+            rows, k = rows[k >= skip], k[k >= skip] - skip
+            self.throughput.skip(skip)
+            self.loss.skip(skip)
+            self.gap_slots += skip
+
+        filled = np.zeros((k[-1] + 1, 3))
+        filled[:, 0] = t0 + (self.throughput.total + np.arange(len(filled))) \
+            * member1.SLOT_DURATION_SEC
+        filled[k] = rows
+        self.gap_slots += len(filled) - len(rows)
+
+        self.throughput.extend(filled[:, [0, 1]])
+        self.loss.extend(filled[:, [0, 2]])
+
+
+class PushStore(live_tail.LiveStore):
+    """
+    LiveStore whose cells are fed by TelemetryServer instead of file tails,
+    so live_tail.report() and capacity_monitor.monitor() work unchanged.
+    Cells are added the first time a record for them arrives; slot 0 is
+    the earliest timestamp of the first batch received.
+    """
+
+    def __init__(self, ring_slots=live_tail.RING_SLOTS):
+        super().__init__([], ring_slots=ring_slots)
+        self.ring_slots = ring_slots
+        self.t0 = None
+
+    def origin(self, timestamps):
+        if self.t0 is None:
+            self.t0 = float(np.min(timestamps))
+        return self.t0
+
+    def cell(self, cell_id):
+        if cell_id not in self.streams:
+            self.streams[cell_id] = PushedCell(cell_id, self.ring_slots)
+        return self.streams[cell_id]
+
+
+def records_to_slots(records):
+    """
+    RECORD_DTYPE array → DataFrame [cell, timestamp_slot, data_rate_gbps,
+    loss_ratio], with the same conversions as preprocess_member1
+    """
+    pkt = member1.pktstats_to_loss(pd.DataFrame({
+        "timestamp": records["timestamp"],
+        "tx": records["tx"].astype(np.int64),
+        "rx": records["rx"].astype(np.int64),
+        "too_late": records["too_late"].astype(np.int64),
+    }))
+
+    bits = records["kbits"].astype(np.float64) * 1000.0
+    return pd.DataFrame({
+        "cell": records["cell"],
+        "timestamp_slot": pkt["timestamp_slot"].values,
+        "data_rate_gbps": bits / member1.SLOT_DURATION_SEC / 1e9,
+        "loss_ratio": pkt["loss_ratio"].values,
+    })
+
+
+class TelemetryServer:
+    """
+    Collects raw record bytes from any number of UDP / TCP senders and
+    decodes them in batches: one numpy view and one pandas conversion per
+    flush, then one ring-buffer append per cell
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.pending = []
+        self.pending_records = 0
+        self.stats = {"frames": 0, "records": 0, "bad_frames": 0}
+
+    def receive(self, payload, count):
+        self.pending.append(payload)
+        self.pending_records += count
+        self.stats["frames"] += 1
+        if self.pending_records >= FLUSH_RECORDS:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return 0
+
+        data = b"".join(self.pending)
+        self.pending = []
+        self.pending_records = 0
+
+        records = np.frombuffer(data, dtype=RECORD_DTYPE)
+        with instr.span("telemetry_flush", records=len(records)):
+            slots = records_to_slots(records)
+
+            # Stable sort keeps each cell's records in arrival order
+            order = np.argsort(slots["cell"].values, kind="stable")
+            cells = slots["cell"].values[order]
+            values = slots[["timestamp_slot", "data_rate_gbps", "loss_ratio"]].values[order]
+            bounds = np.flatnonzero(np.diff(cells)) + 1
+            t0 = self.store.origin(values[:, 0])
+
+            starts = np.concatenate([[0], bounds])
+            for start, rows in zip(starts, np.split(values, bounds)):
+                if len(rows):
+                    self.store.cell(int(cells[start])).append(rows, t0)
+
+        instr.count("slots", len(records))
+        self.stats["records"] += len(records)
+        return len(records)
+
+    def datagram(self, data):
+        try:
+            count = parse_header(data)
+        except (ValueError, struct.error):
+            self.stats["bad_frames"] += 1
+            return
+        payload = data[HEADER.size:]
+        if len(payload) != count * RECORD_DTYPE.itemsize:
+            self.stats["bad_frames"] += 1
+            return
+        self.receive(payload, count)
+
+    async def handle_stream(self, reader, writer):
+        try:
+            while True:
+                header = await reader.readexactly(HEADER.size)
+                count = parse_header(header)
+                payload = await reader.readexactly(count * RECORD_DTYPE.itemsize)
+                self.receive(payload, count)
+        except asyncio.IncompleteReadError:
+            pass
+        except ValueError as e:
+            # Lost framing on this connection; the sender has to reconnect
+            self.stats["bad_frames"] += 1
+            print(f"[WARN] {e}; closing connection")
+        finally:
+            writer.close()
+
+    async def flush_loop(self, flush_sec=FLUSH_SEC):
+        while True:
+            await asyncio.sleep(flush_sec)
+            self.flush()
+
+
+class _Datagrams(asyncio.DatagramProtocol):
+    def __init__(self, server):
+        self.server = server
+
+    def datagram_received(self, data, addr):
+        self.server.datagram(data)
+
+
+async def serve(store=None, host=HOST, udp_port=UDP_PORT, tcp_port=TCP_PORT,
+                link_groups=None, capacities=None, report_sec=live_tail.REPORT_SEC,
+                duration_sec=None, no_buffer_capacities=None, **params):
+    """
+    Listen on UDP and/or TCP (a port of None disables it) until cancelled
+    (or for duration_sec). With link_groups, re-run the estimators every
+    report_sec; with capacities too, also run the capacity monitor
+    (no_buffer_capacities: see capacity_monitor.LinkMonitor).
+    Returns the TelemetryServer.
+    """
+    store = PushStore() if store is None else store
+    server = TelemetryServer(store)
+    p = {**pipeline.PARAMS, **params}
+    loop = asyncio.get_running_loop()
+
+    transports = []
+    if udp_port is not None:
+        transport, _ = await loop.create_datagram_endpoint(
+            lambda: _Datagrams(server), local_addr=(host, udp_port)
+        )
+        # Room for bursts that arrive while a flush is decoding
+        transport.get_extra_info("socket").setsockopt(
+            socket.SOL_SOCKET, socket.SO_RCVBUF, UDP_RCVBUF
+        )
+        transports.append(transport)
+        print(f"Listening on udp://{host}:{udp_port}")
+    if tcp_port is not None:
+        tcp = await asyncio.start_server(server.handle_stream, host, tcp_port)
+        transports.append(tcp)
+        print(f"Listening on tcp://{host}:{tcp_port}")
+
+    tasks = [asyncio.create_task(server.flush_loop())]
+    if link_groups:
+        tasks.append(asyncio.create_task(
+            live_tail.report(store, link_groups, p, report_sec)
+        ))
+        if capacities:
+            no_buffer_capacities = no_buffer_capacities or {}
+            monitors = {
+                link_id: capacity_monitor.LinkMonitor(
+                    link_id, capacities[link_id], capacity_monitor.HORIZON_SEC,
+                    p["window"], p["loss_limit"], p["loss_percentile"],
+                    p["buffer_time_sec"], no_buffer_capacities.get(link_id)
+                )
+                for link_id in sorted(link_groups) if link_id in capacities
+            }
+            tasks.append(asyncio.create_task(capacity_monitor.monitor(
+                store, monitors, link_groups, verbose=False
+            )))
+
+    try:
+        if duration_sec is None:
+            await asyncio.gather(*tasks)
+        else:
+            await asyncio.sleep(duration_sec)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for transport in transports:
+            transport.close()
+        server.flush()
+
+    server.stats["gap_slots"] = sum(c.gap_slots for c in store.streams.values())
+    server.stats["late_records"] = sum(c.dropped for c in store.streams.values())
+    return server
+
+
+# MAIN
+def main():
+    parser = argparse.ArgumentParser(
+        description="Receive pushed per-slot telemetry and keep live estimates"
+    )
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--udp", type=int, default=UDP_PORT,
+                        help="UDP port (0 disables)")
+    parser.add_argument("--tcp", type=int, default=TCP_PORT,
+                        help="TCP port (0 disables)")
+    parser.add_argument("--mapping", default=live_tail.MAPPING_FILE)
+    parser.add_argument("--ring-slots", type=int, default=live_tail.RING_SLOTS)
+    parser.add_argument("--report", type=float, default=live_tail.REPORT_SEC)
+    parser.add_argument("--monitor", action="store_true",
+                        help="also alert against output/capacity/ capacities")
+    parser.add_argument("--duration", type=float, default=None)
+    instr.add_arguments(parser)
+    args = parser.parse_args()
+
+    instr.configure_from_args(args)
+
+    link_groups = capacities = no_buffer_capacities = None
+    if os.path.exists(args.mapping):
+        link_groups = link_traffic.link_groups_from_mapping(pd.read_csv(args.mapping))
+        if args.monitor:
+            capacities = capacity_monitor.load_capacities()
+            no_buffer_capacities = capacity_monitor.load_no_buffer_capacities()
+    else:
+        print(f"[WARN] {args.mapping} not found; receiving without estimates")
+
+    try:
+        server = asyncio.run(serve(
+            PushStore(args.ring_slots), args.host, args.udp or None,
+            args.tcp or None, link_groups, capacities, args.report,
+            args.duration, no_buffer_capacities
+        ))
+        print(f"Received {server.stats}")
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+import os
+import glob
+import argparse
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+import instrumentation as instr
+import pipeline
+import build_link_slot_traffic as link_traffic
+import member3_topology_inference as member3
+import estimate_capacity_no_buffer as cap_no_buf
+import estimate_capacity_with_buffer as cap_buf
+import estimate_capacity_batched as batched
+
+# PATHS
+CLEAN_DIR = link_traffic.CLEAN_DIR
+MAPPING_FILE = os.path.join(link_traffic.TOPO_DIR, "cell_to_link_mapping.csv")
+SIGNAL_DIR = os.path.join(pipeline.OUTPUT_DIR, "member2")
+OUT_DIR = os.path.join(pipeline.OUTPUT_DIR, "whatif")
+
+# PARAMETERS
+BATCH_ELEMENTS = batched.BATCH_ELEMENTS
+
+
+# TOPOLOGIES
+# A topology is {link_id: [cell_id, ...]}, the same groups
+# link_groups_from_mapping() returns; a what-if run takes {name: topology}.
+def load_topologies(paths):
+    """
+    {file stem: topology} from Cell / Link_ID mapping CSVs
+    """
+    topologies = {}
+    for path in paths:
+        name = os.path.splitext(os.path.basename(path))[0]
+        topologies[name] = link_traffic.link_groups_from_mapping(pd.read_csv(path))
+    return topologies
+
+
+def clustered_topologies(signal_dir, num_links_list):
+    """
+    {"clustered_<n>": topology} from member3's clustering of the signal
+    matrix with each NUM_LINKS in num_links_list
+    """
+    signal_matrix = np.load(os.path.join(signal_dir, "signal_matrix.npy"))
+    labels = pd.read_csv(os.path.join(signal_dir, "signal_matrix.csv"), usecols=[0]).iloc[:, 0]
+    cell_ids = labels.str.extract(r"(\d+)")[0].astype(int).values
+    corr = member3.correlation_matrix(signal_matrix)
+
+    topologies = {}
+    for num_links in num_links_list:
+        clusters = member3.cluster_links(corr, num_links)
+        topologies[f"clustered_{num_links}"] = (
+            pd.Series(cell_ids).groupby(clusters).apply(list).to_dict()
+        )
+    return topologies
+
+
+# ASSIGNMENT MATRIX
+def assignment_matrix(topologies, cell_ids):
+    """
+    One sparse 0/1 matrix for all topologies: a row per distinct cell set,
+    a column per cell in cell_ids. Links that group the same cells (common
+    across variants of one plan) share a row. Returns (matrix, rows) where
+    rows lists (topology, link_id, row index).
+    """
+    column = {cell_id: i for i, cell_id in enumerate(cell_ids)}
+    unique = {}
+    rows = []
+    for name, groups in topologies.items():
+        for link_id in sorted(groups):
+            cells = frozenset(groups[link_id])
+            missing = cells.difference(column)
+            if missing:
+                raise KeyError(f"{name}, link {link_id}: no traffic for cells {sorted(missing)}")
+            rows.append((name, link_id, unique.setdefault(cells, len(unique))))
+
+    indptr = np.zeros(len(unique) + 1, dtype=np.int64)
+    indices = []
+    for cells, row in sorted(unique.items(), key=lambda item: item[1]):
+        indices.extend(sorted(column[c] for c in cells))
+        indptr[row + 1] = indptr[row] + len(cells)
+
+    matrix = sparse.csr_matrix(
+        (np.ones(len(indices)), np.array(indices, dtype=np.int64), indptr),
+        shape=(len(unique), len(cell_ids))
+    )
+    return matrix, rows
+
+
+def cell_matrix(cell_traces):
+    """
+    (cell_ids, cells × slots array) trimmed to the shortest cell
+    """
+    cell_ids = sorted(cell_traces)
+    num_slots = min(len(cell_traces[c]) for c in cell_ids)
+    return cell_ids, np.stack([cell_traces[c][:num_slots] for c in cell_ids])
+
+
+# EVALUATION
+def evaluate(cell_traces, topologies, window=cap_no_buf.WINDOW,
+             loss_percentile=cap_no_buf.LOSS_PERCENTILE,
+             loss_limit=cap_buf.LOSS_LIMIT,
+             buffer_time_sec=cap_buf.BUFFER_TIME_SEC,
+             batch_elements=BATCH_ELEMENTS):
+    """
+    Both capacity estimates for every link of every topology. Link traces
+    come from the assignment matrix times the cells × slots matrix, taken a
+    block of rows at a time (at most batch_elements values), and each block
+    goes straight to the batched estimator.
+    """
+    cell_ids, traffic = cell_matrix(cell_traces)
+    matrix, rows = assignment_matrix(topologies, cell_ids)
+    num_rows, num_slots = matrix.shape[0], traffic.shape[1]
+    print(f"{len(topologies)} topologies, {len(rows)} links, "
+          f"{num_rows} distinct link traces of {num_slots} slots")
+
+    def block_rows(start, stop):
+        with instr.span("whatif_product"):
+            return matrix[start:stop] @ traffic, np.full(stop - start, num_slots)
+
+    results = batched.estimate_blocks(
+        block_rows, num_rows, num_slots, window, loss_percentile, loss_limit,
+        buffer_time_sec, batch_elements, span="whatif_batch"
+    )
+
+    return pd.DataFrame([
+        {
+            "Topology": name,
+            "Link": f"Link {link_id}",
+            "Cells": len(topologies[name][link_id]),
+            "Avg_Traffic_Gbps": round(float(results[row, 0]), 3),
+            "Required_Capacity_No_Buffer_Gbps": round(float(results[row, 1]), 3),
+            "Required_Capacity_With_Buffer_Gbps": round(float(results[row, 2]), 3)
+        }
+        for name, link_id, row in rows
+    ])
+
+
+def summarize(capacity):
+    """
+    One row per topology: link count and total capacity under each estimate
+    """
+    return capacity.groupby("Topology", sort=False).agg(
+        Links=("Link", "count"),
+        Total_No_Buffer_Gbps=("Required_Capacity_No_Buffer_Gbps", "sum"),
+        Total_With_Buffer_Gbps=("Required_Capacity_With_Buffer_Gbps", "sum"),
+    ).round(3).reset_index()
+
+
+# MAIN
+def main(clean_dir=CLEAN_DIR, mapping_file=MAPPING_FILE, topology_files=(),
+         num_links_list=(), signal_dir=SIGNAL_DIR, out_dir=OUT_DIR):
+    os.makedirs(out_dir, exist_ok=True)
+
+    topologies = {}
+    if mapping_file and os.path.exists(mapping_file):
+        topologies["current"] = link_traffic.link_groups_from_mapping(pd.read_csv(mapping_file))
+    topologies.update(load_topologies(topology_files))
+    if num_links_list:
+        with instr.span("whatif_clustering", variants=len(num_links_list)):
+            topologies.update(clustered_topologies(signal_dir, num_links_list))
+    if not topologies:
+        raise ValueError("No topologies to evaluate")
+
+    cells = sorted({c for groups in topologies.values() for cs in groups.values() for c in cs})
+    cell_traces = link_traffic.load_cell_traces(clean_dir, cells)
+
+    with instr.span("whatif", topologies=len(topologies)):
+        capacity = evaluate(cell_traces, topologies)
+    summary = summarize(capacity)
+
+    links_out = os.path.join(out_dir, "whatif_link_capacity.csv")
+    summary_out = os.path.join(out_dir, "whatif_summary.csv")
+    capacity.to_csv(links_out, index=False)
+    summary.to_csv(summary_out, index=False)
+
+    print(summary.to_string(index=False))
+    for path in [links_out, summary_out]:
+        instr.count_file(path)
+        print(f"Saved: {path}")
+
+    return capacity, summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Capacity of many candidate cell → link topologies in one batched pass"
+    )
+    parser.add_argument("--clean-dir", default=CLEAN_DIR)
+    parser.add_argument("--mapping", default=MAPPING_FILE,
+                        help="current mapping, evaluated as 'current' ('' to leave out)")
+    parser.add_argument("--topology", nargs="*", default=[],
+                        help="extra Cell / Link_ID mapping CSVs, named by file stem")
+    parser.add_argument("--topology-dir", default=None,
+                        help="evaluate every *.csv mapping in this directory")
+    parser.add_argument("--num-links", type=int, nargs="*", default=[],
+                        help="also cluster the signal matrix into each of these link counts")
+    parser.add_argument("--signal-dir", default=SIGNAL_DIR)
+    parser.add_argument("--out-dir", default=OUT_DIR)
+    instr.add_arguments(parser)
+    args = parser.parse_args()
+
+    instr.configure_from_args(args)
+    files = list(args.topology)
+    if args.topology_dir:
+        files += sorted(glob.glob(os.path.join(args.topology_dir, "*.csv")))
+    main(args.clean_dir, args.mapping, files, args.num_links, args.signal_dir, args.out_dir)
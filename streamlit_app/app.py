@@ -1,9 +1,23 @@
 import streamlit as st
 import pandas as pd
 import os
+import sys
+import time
+import json
 import base64
 from pathlib import Path
 
+# PATH SETUP — make the pipeline scripts in src/ importable
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+SRC_DIR = os.path.join(ROOT_DIR, "src")
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+from pipeline_jobs import JobManager      # noqa: E402
+from result_cache import ResultCache      # noqa: E402
+import results_store                      # noqa: E402
+import link_traffic_store                 # noqa: E402
+
 # PAGE CONFIG
 st.set_page_config(
     page_title="Fronthaul Network Optimization",
@@ -16,15 +30,105 @@ st.set_page_config(
     }
 )
 
-# PATH SETUP
-ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
-OUTPUT_DIR = os.path.join(ROOT_DIR, "output")
+# OUTPUT LOCATION
+OUTPUT_DIR = os.environ.get("FRONTHAUL_OUTPUT_DIR", os.path.join(ROOT_DIR, "output"))
+
+# RENDER TIMINGS — per-section script time for benchmarks/bench_dashboard.py,
+# recorded only when FRONTHAUL_RENDER_TIMINGS=1
+RENDER_TIMINGS = os.environ.get("FRONTHAUL_RENDER_TIMINGS", "") not in ("", "0")
+_render_t0 = time.perf_counter()
+if RENDER_TIMINGS:
+    st.session_state["render_timings"] = {}
+
+def mark_render(section: str) -> None:
+    global _render_t0
+    if not RENDER_TIMINGS:
+        return
+    now = time.perf_counter()
+    st.session_state["render_timings"][section] = now - _render_t0
+    _render_t0 = now
+
+# SHARED RESULT CACHE — one size-bounded LRU for every session in this process
+RESULT_CACHE_MB = int(os.environ.get("FRONTHAUL_CACHE_MB", "256"))
+
+@st.cache_resource
+def get_result_cache() -> ResultCache:
+    return ResultCache(RESULT_CACHE_MB * 1024 * 1024)
+
+# BACKGROUND JOBS — one process pool shared by every session
+BUFFER_SYMBOL_SEC = 143e-6 / 4   # 1 OFDM symbol ≈ 35.7 μs
+
+@st.cache_resource
+def get_job_manager() -> JobManager:
+    return JobManager(OUTPUT_DIR, cache=get_result_cache())
+
+# HELPER — block on a background job while streaming its progress
+def wait_for_job(job):
+    if not job.done():
+        bar = st.progress(0.0, text="Queued…")
+        while not job.done():
+            done, total, label = job.poll()
+            bar.progress(min(done / max(total, 1), 1.0), text=f"{label} ({done}/{total})")
+            time.sleep(0.2)
+        bar.empty()
+    return job.result()
+
+# HELPER — cache key that changes whenever the file is rewritten
+def _file_key(kind: str, path: str) -> tuple:
+    st_ = os.stat(path)
+    return (kind, os.path.abspath(path), st_.st_size, st_.st_mtime_ns)
+
+# HELPER — parse a CSV once per file version (shared, treat as read-only)
+def load_csv(path: str) -> pd.DataFrame:
+    return get_result_cache().get_or_compute(
+        _file_key("csv", path), lambda: pd.read_csv(path)
+    )
+
+# HELPER — parse a JSON file once per file version
+def load_json(path: str) -> dict:
+    def _read():
+        with open(path) as f:
+            return json.load(f)
+    return get_result_cache().get_or_compute(_file_key("json", path), _read)
+
+# HELPER — newest run in the results store, unless the CSVs are newer
+STORE_FILE = os.path.join(OUTPUT_DIR, "results.sqlite")
+
+def load_store_run(run_id: int | None = None) -> dict | None:
+    if not os.path.exists(STORE_FILE):
+        return None
+    latest = run_id is None
+    if latest:
+        run_id = results_store.latest_run_id(STORE_FILE)
+        if run_id is None:
+            return None
+    run = get_result_cache().get_or_compute(
+        ("store_run", STORE_FILE, run_id),
+        lambda: results_store.load_run(run_id, STORE_FILE)
+    )
+    if latest:
+        # Stage scripts run by hand write CSVs without recording a run
+        csvs = [os.path.join(OUTPUT_DIR, "member3", "cell_to_link_mapping.csv"),
+                os.path.join(OUTPUT_DIR, "capacity", "required_capacity_with_buffer.csv")]
+        if any(os.path.exists(f) and os.path.getmtime(f) > run["created"] for f in csvs):
+            return None
+    return run
+
+# HELPER — a table from the newest stored run, else from its CSV
+def load_output(key: str, csv_path: str) -> pd.DataFrame:
+    run = load_store_run()
+    if run is not None:
+        return run[key]
+    return load_csv(csv_path)
 
 # HELPER — encode local image to base64 for embedding
 def img_to_base64(path: str) -> str | None:
     p = Path(path)
     if p.exists():
-        return base64.b64encode(p.read_bytes()).decode()
+        return get_result_cache().get_or_compute(
+            _file_key("b64", path),
+            lambda: base64.b64encode(p.read_bytes()).decode()
+        )
     return None
 
 # GLOBAL CSS — dark industrial telecom theme
@@ -572,6 +676,8 @@ footer { visibility: hidden !important; }
 </style>
 """, unsafe_allow_html=True)
 
+mark_render("css")
+
 
 # HERO SECTION
 st.markdown("""
@@ -592,19 +698,21 @@ st.markdown("""
 </div>
 """, unsafe_allow_html=True)
 
+mark_render("hero")
+
 
 # KPI METRIC CARDS  (read from CSVs where possible)
 
 # -- try to pull real numbers from capacity CSVs --
 n_cells, n_links, max_cap, pkt_loss_pct = "—", "—", "—", "≤ 1%"
 try:
-    _map = pd.read_csv(os.path.join(OUTPUT_DIR, "member3", "cell_to_link_mapping.csv"))
+    _map = load_output("mapping", os.path.join(OUTPUT_DIR, "member3", "cell_to_link_mapping.csv"))
     n_cells = str(len(_map))
     n_links = str(_map.iloc[:, 1].nunique()) if _map.shape[1] > 1 else "—"
 except Exception:
     pass
 try:
-    _cap = pd.read_csv(os.path.join(OUTPUT_DIR, "capacity", "required_capacity_with_buffer.csv"))
+    _cap = load_output("capacity_with_buffer", os.path.join(OUTPUT_DIR, "capacity", "required_capacity_with_buffer.csv"))
     # pick the largest numeric value in any column that looks like capacity (Mbps)
     numeric_cols = _cap.select_dtypes(include="number").columns.tolist()
     if numeric_cols:
@@ -638,14 +746,17 @@ st.markdown(f"""
 </div>
 """, unsafe_allow_html=True)
 
+mark_render("kpi")
+
 
 # TABS
-tab1, tab2, tab3, tab4, tab5 = st.tabs([
+tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs([
     "⬡  Overview",
     "🔗  Topology",
     "📊  Capacity",
     "📈  Traffic",
-    "⚡  Snapshot"
+    "⚡  Snapshot",
+    "⏱  Profile"
 ])
 
 
@@ -748,6 +859,8 @@ with tab1:
     </div>
     """, unsafe_allow_html=True)
 
+mark_render("overview")
+
 
 # TAB 2 — TOPOLOGY IDENTIFICATION
 with tab2:
@@ -791,7 +904,7 @@ with tab2:
         </div>
         """, unsafe_allow_html=True)
         try:
-            df_map = pd.read_csv(os.path.join(OUTPUT_DIR, "member3", "cell_to_link_mapping.csv"))
+            df_map = load_output("mapping", os.path.join(OUTPUT_DIR, "member3", "cell_to_link_mapping.csv"))
             st.dataframe(df_map, use_container_width=True, hide_index=True)
         except FileNotFoundError:
             st.warning("cell_to_link_mapping.csv not found.")
@@ -804,11 +917,38 @@ with tab2:
         </div>
         """, unsafe_allow_html=True)
         try:
-            df_group = pd.read_csv(os.path.join(OUTPUT_DIR, "member3", "link_groupwise_table.csv"))
+            df_group = load_output("groupwise", os.path.join(OUTPUT_DIR, "member3", "link_groupwise_table.csv"))
             st.dataframe(df_group, use_container_width=True, hide_index=True)
         except FileNotFoundError:
             st.warning("link_groupwise_table.csv not found.")
 
+    # --- what-if re-clustering ---
+    st.markdown("""
+    <div class="panel" style="margin-top:18px; margin-bottom:0">
+      <div class="panel-title"><span class="icon">⟳</span> Re-cluster with a Different Link Count</div>
+      <div class="panel-desc">Runs topology inference in the background on the existing signal matrix. Results are memoized per link count.</div>
+    </div>
+    """, unsafe_allow_html=True)
+
+    col_t1, col_t2, _ = st.columns([1, 1, 2])
+    with col_t1:
+        whatif_links = st.number_input("Number of links", min_value=1, max_value=24,
+                                       value=3, step=1, key="whatif_links")
+    with col_t2:
+        if st.button("⟳  Recompute", use_container_width=True, key="btn_whatif_topo"):
+            st.session_state["whatif_topo"] = int(whatif_links)
+
+    if "whatif_topo" in st.session_state:
+        job = get_job_manager().submit("topology", num_links=st.session_state["whatif_topo"])
+        try:
+            df_map_w, df_group_w = wait_for_job(job)
+        except Exception as exc:
+            st.error(f"Topology recomputation failed: {exc}")
+        else:
+            st.dataframe(df_group_w, use_container_width=True, hide_index=True)
+
+mark_render("topology")
+
 
 # TAB 3 — CAPACITY ESTIMATION
 with tab3:
@@ -841,6 +981,7 @@ with tab3:
 
     if st.session_state["cap_mode"] == "with_buffer":
         cap_file = "required_capacity_with_buffer.csv"
+        cap_key = "capacity_with_buffer"
         st.markdown("""
         <div style="margin:12px 0 20px">
           <span class="tag green">✓ Buffer Enabled</span>
@@ -849,6 +990,7 @@ with tab3:
         </div>""", unsafe_allow_html=True)
     else:
         cap_file = "required_capacity_no_buffer.csv"
+        cap_key = "capacity_no_buffer"
         st.markdown("""
         <div style="margin:12px 0 20px">
           <span class="tag amber">⚠ No Buffer</span>
@@ -857,7 +999,7 @@ with tab3:
         </div>""", unsafe_allow_html=True)
 
     try:
-        df_cap = pd.read_csv(os.path.join(OUTPUT_DIR, "capacity", cap_file))
+        df_cap = load_output(cap_key, os.path.join(OUTPUT_DIR, "capacity", cap_file))
         st.dataframe(df_cap, use_container_width=True, hide_index=True)
 
         # quick download
@@ -870,6 +1012,76 @@ with tab3:
     except FileNotFoundError:
         st.warning(f"{cap_file} not found in output/capacity/.")
 
+    # --- what-if recomputation ---
+    st.markdown("""
+    <div class="panel" style="margin-top:22px; margin-bottom:0">
+      <div class="panel-title"><span class="icon">⟳</span> What-if Recomputation</div>
+      <div class="panel-desc">Re-estimate every link with a different loss target or buffer depth. Jobs run in a background worker and repeated queries are served from memory.</div>
+    </div>
+    """, unsafe_allow_html=True)
+
+    col_w1, col_w2, col_w3 = st.columns([1, 1, 1])
+    with col_w1:
+        whatif_loss = st.number_input("Loss target (%)", min_value=0.1, max_value=10.0,
+                                      value=1.0, step=0.1, key="whatif_loss")
+    with col_w2:
+        whatif_buf = st.number_input("Buffer depth (symbols)", min_value=0, max_value=28,
+                                     value=4, step=1, key="whatif_buf")
+    with col_w3:
+        if st.button("⟳  Recompute", use_container_width=True, key="btn_whatif_cap"):
+            st.session_state["whatif_cap"] = (
+                round(whatif_loss / 100.0, 6),
+                round(whatif_buf * BUFFER_SYMBOL_SEC, 9)
+            )
+
+    if "whatif_cap" in st.session_state:
+        loss_limit, buffer_time_sec = st.session_state["whatif_cap"]
+        job = get_job_manager().submit(
+            "capacity", loss_limit=loss_limit, buffer_time_sec=buffer_time_sec
+        )
+        try:
+            df_whatif, curves = wait_for_job(job)
+        except Exception as exc:
+            st.error(f"Capacity recomputation failed: {exc}")
+        else:
+            st.dataframe(df_whatif, use_container_width=True, hide_index=True)
+            if curves:
+                curve_link = st.selectbox("Loss curve", list(curves), key="whatif_curve_link")
+                st.line_chart(curves[curve_link], x="Capacity_Gbps", y="Loss_Ratio")
+
+    # --- run history (results store) ---
+    if os.path.exists(STORE_FILE):
+        st.markdown("""
+        <div class="panel" style="margin-top:22px; margin-bottom:0">
+          <div class="panel-title"><span class="icon">🗂</span> Run History</div>
+          <div class="panel-desc">Every recorded pipeline run with its dataset fingerprint and parameters. Pick runs to compare per-link capacity.</div>
+        </div>
+        """, unsafe_allow_html=True)
+
+        runs = get_result_cache().get_or_compute(
+            ("store_runs", STORE_FILE, results_store.latest_run_id(STORE_FILE)),
+            lambda: results_store.list_runs(STORE_FILE)
+        )
+        st.dataframe(runs, use_container_width=True, hide_index=True)
+
+        compare_ids = st.multiselect(
+            "Compare runs", runs["run_id"].tolist(),
+            default=runs["run_id"].tolist()[:2], key="compare_runs"
+        )
+        if compare_ids:
+            st.dataframe(
+                results_store.compare_runs(compare_ids, path=STORE_FILE),
+                use_container_width=True, hide_index=True
+            )
+
+        latest = load_store_run(int(runs["run_id"].iloc[0])) if len(runs) else None
+        if latest is not None and latest["curves"]:
+            curve_link = st.selectbox(
+                f"Loss curve of run {latest['run_id']}", list(latest["curves"]),
+                key="store_curve_link"
+            )
+            st.line_chart(latest["curves"][curve_link], x="Capacity_Gbps", y="Loss_Ratio")
+
     st.markdown("""
     <div class="insight-banner" style="margin-top:22px;">
       <span class="bulb">📖</span>
@@ -884,6 +1096,8 @@ with tab3:
     </div>
     """, unsafe_allow_html=True)
 
+mark_render("capacity")
+
 
 # TAB 4 — TRAFFIC VISUALIZATION
 with tab4:
@@ -896,16 +1110,19 @@ with tab4:
     """, unsafe_allow_html=True)
 
     # -- interactive link selector --
-    links = ["Link 1", "Link 2", "Link 3"]
-    if "sel_link" not in st.session_state:
-        st.session_state["sel_link"] = "Link 1"
+    try:
+        links = load_output("capacity_with_buffer", os.path.join(OUTPUT_DIR, "capacity", "required_capacity_with_buffer.csv"))["Link"].tolist()
+    except FileNotFoundError:
+        links = ["Link 1", "Link 2", "Link 3"]
+    if st.session_state.get("sel_link") not in links:
+        st.session_state["sel_link"] = links[0]
 
     cols_link = st.columns(len(links))
     for i, lnk in enumerate(links):
         active_cls = "active" if st.session_state["sel_link"] == lnk else ""
         # use a real Streamlit button styled via class hack
         clicked = cols_link[i].button(
-            f"Link {i+1}",
+            lnk,
             use_container_width=True,
             key=f"link_btn_{i}",
             help=f"View traffic for {lnk}"
@@ -934,6 +1151,21 @@ with tab4:
       <span style="font-size:11px; color:#3a4f6e; font-family:'Share Tech Mono',monospace">60s window · capacity overlay included</span>
     </div>""", unsafe_allow_html=True)
 
+    # -- zoom into a slot range (reads only the blocks it needs) --
+    link_id = int(selected_link.split()[-1])
+    link_file = link_traffic_store.link_files(os.path.join(OUTPUT_DIR, "link_traffic")).get(link_id) \
+        if os.path.isdir(os.path.join(OUTPUT_DIR, "link_traffic")) else None
+    if link_file and link_file.endswith(link_traffic_store.EXTENSION):
+        num_slots = len(link_traffic_store.Reader(link_file))
+        with st.expander("🔍 Zoom into a slot range"):
+            zoom = st.slider("Slots", 0, num_slots, (0, min(num_slots, 2000)),
+                             step=100, key=f"zoom_{link_id}")
+            values = link_traffic_store.read(link_file, zoom[0], zoom[1])
+            st.line_chart(pd.DataFrame({
+                "Time_s": (zoom[0] + pd.RangeIndex(len(values))) * 0.0005,
+                "Gbps": values,
+            }), x="Time_s", y="Gbps")
+
     st.markdown("""
     <div class="insight-banner" style="margin-top:20px;">
       <span class="bulb">📖</span>
@@ -948,6 +1180,8 @@ with tab4:
     </div>
     """, unsafe_allow_html=True)
 
+mark_render("traffic")
+
 
 # TAB 5 — TRAFFIC SNAPSHOT
 with tab5:
@@ -989,6 +1223,102 @@ with tab5:
     </div>
     """, unsafe_allow_html=True)
 
+mark_render("snapshot")
+
+
+# TAB 6 — RUN PROFILE (trace.json from src/instrumentation.py)
+with tab6:
+
+    st.markdown("""
+    <div class="panel">
+      <div class="panel-title"><span class="icon">◈</span> Pipeline Run Profile</div>
+      <div class="panel-desc">Where the last traced run spent its time: per-stage and per-cell / per-link spans, work counters, and optional memory and cProfile captures.</div>
+    </div>
+    """, unsafe_allow_html=True)
+
+    trace_path = os.path.join(OUTPUT_DIR, "trace.json")
+
+    if not os.path.exists(trace_path):
+        st.markdown("""
+        <div class="warn-card">
+          <span style="font-size:22px">⚠️</span>
+          <p><strong>No trace recorded</strong> — run <code>python src/pipeline_runner.py --trace</code> (add <code>--trace-memory</code> / <code>--profile</code> for more detail), or set <code>FRONTHAUL_TRACE=1</code> for any stage script.</p>
+        </div>""", unsafe_allow_html=True)
+    else:
+        trace = load_json(trace_path)
+        spans = pd.DataFrame(trace["spans"])
+        counters = trace.get("counters", {})
+
+        col_p1, col_p2, col_p3, col_p4 = st.columns(4)
+        col_p1.metric("Wall time", f"{trace['elapsed_sec']:.1f} s")
+        col_p2.metric("Rows parsed", f"{counters.get('rows_parsed', 0):,}")
+        col_p3.metric("Slots simulated", f"{counters.get('slots_simulated', 0):,}")
+        col_p4.metric("Bytes read / written",
+                      f"{counters.get('bytes_read', 0) / 1e6:.0f} / "
+                      f"{counters.get('bytes_written', 0) / 1e6:.0f} MB")
+
+        if not spans.empty:
+            top = spans[spans["depth"] == 0]
+            stage_time = (
+                top.groupby("name", sort=False)[["wall_sec", "cpu_sec"]].sum()
+                .sort_values("wall_sec", ascending=False)
+            )
+            st.bar_chart(stage_time["wall_sec"], horizontal=True)
+
+            # Same-named spans (one per cell / link) folded into one row
+            agg = {"wall_sec": ["count", "sum", "mean", "max"], "cpu_sec": "sum"}
+            if "mem_peak_bytes" in spans:
+                agg["mem_peak_bytes"] = "max"
+            by_name = spans.groupby("name", sort=False).agg(agg)
+            by_name.columns = [
+                "Calls", "Total_s", "Mean_s", "Max_s", "CPU_s", "Peak_MB"
+            ][:len(by_name.columns)]
+            if "Peak_MB" in by_name:
+                by_name["Peak_MB"] = by_name["Peak_MB"] / 1e6
+            st.dataframe(
+                by_name.sort_values("Total_s", ascending=False).round(4),
+                use_container_width=True
+            )
+
+            slowest = spans[spans["depth"] > 0].nlargest(10, "wall_sec")
+            if not slowest.empty:
+                st.caption("Slowest individual spans")
+                st.dataframe(
+                    pd.DataFrame({
+                        "Span": slowest["name"],
+                        "Attributes": slowest["attrs"].map(
+                            lambda a: ", ".join(f"{k}={v}" for k, v in a.items())
+                        ),
+                        "Wall_s": slowest["wall_sec"].round(4),
+                    }),
+                    use_container_width=True, hide_index=True
+                )
+
+        profiles = [{"root": "main process", "functions": trace.get("profile", [])}]
+        profiles += trace.get("worker_profiles", [])
+        profiles = [p for p in profiles if p.get("functions")]
+        if profiles:
+            with st.expander("cProfile hot spots"):
+                choice = st.selectbox(
+                    "Process", range(len(profiles)),
+                    format_func=lambda i: profiles[i]["root"] or "worker",
+                    key="profile_process"
+                )
+                st.dataframe(pd.DataFrame(profiles[choice]["functions"]),
+                             use_container_width=True, hide_index=True)
+
+        allocations = trace.get("allocations", []) + [
+            a for p in trace.get("worker_profiles", []) for a in p.get("allocations", [])
+        ]
+        if allocations:
+            with st.expander("Largest live allocations (tracemalloc)"):
+                st.dataframe(
+                    pd.DataFrame(allocations).sort_values("bytes", ascending=False),
+                    use_container_width=True, hide_index=True
+                )
+
+mark_render("profile")
+
 
 # FOOTER
 st.markdown("""
@@ -996,4 +1326,6 @@ st.markdown("""
   <div class="logo">◈ Fronthaul Optimizer</div>
   <div class="meta" style="font-family:'Share Tech Mono',monospace; color:#2a3a56;">&lt;npm install regrets /&gt; &nbsp;·&nbsp; Correlation · Clustering · Capacity Estimation — v1.0</div>
 </div>
-""", unsafe_allow_html=True)
\ No newline at end of file
+""", unsafe_allow_html=True)
+
+mark_render("footer")
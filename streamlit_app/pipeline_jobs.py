@@ -0,0 +1,201 @@
+import os
+import sys
+import threading
+import multiprocessing as mp
+from concurrent.futures import Future, ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+# PATH SETUP — make the pipeline scripts in src/ importable
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+SRC_DIR = os.path.join(ROOT_DIR, "src")
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+import estimate_capacity_no_buffer as cap_no_buf    # noqa: E402
+import estimate_capacity_with_buffer as cap_buf     # noqa: E402
+import link_traffic_store                           # noqa: E402
+import member3_topology_inference as topology       # noqa: E402
+
+MAX_WORKERS = 2
+
+
+# JOB FUNCTIONS (run inside the worker processes)
+def _capacity_job(output_dir, loss_limit, buffer_time_sec, progress):
+    files = link_traffic_store.link_files(os.path.join(output_dir, "link_traffic"))
+
+    rows = []
+    curves = {}
+    loss_percentile = 100.0 * (1.0 - loss_limit)
+
+    for i, (link_id, path) in enumerate(files.items()):
+        link_name = f"Link {link_id}"
+        progress.put((i, len(files), link_name))
+
+        traffic = link_traffic_store.load_link(path)
+
+        avg, cap_nb = cap_no_buf.required_capacity_no_buffer(
+            traffic, loss_percentile=loss_percentile
+        )
+        cap_b, probes = cap_buf.search_capacity(
+            traffic, loss_limit, buffer_time_sec
+        )
+
+        rows.append({
+            "Link": link_name,
+            "Avg_Traffic_Gbps": round(avg, 3),
+            "Required_Capacity_No_Buffer_Gbps": round(cap_nb, 3),
+            "Required_Capacity_With_Buffer_Gbps": round(cap_b, 3)
+        })
+        curves[link_name] = pd.DataFrame(
+            sorted(probes), columns=["Capacity_Gbps", "Loss_Ratio"]
+        )
+
+    progress.put((len(files), len(files), "done"))
+    return pd.DataFrame(rows), curves
+
+
+def _topology_job(output_dir, num_links, progress):
+    progress.put((0, 2, "loading signal matrix"))
+    signal_matrix = np.load(
+        os.path.join(output_dir, "member2", "signal_matrix.npy")
+    )
+
+    progress.put((1, 2, "clustering"))
+    _, labels = topology.infer_topology(signal_matrix, num_links)
+
+    mapping_df = pd.DataFrame({
+        "Cell": [f"Cell {i + 1}" for i in range(len(labels))],
+        "Link_ID": labels
+    })
+    groupwise_df = topology.groupwise_table(mapping_df)
+
+    progress.put((2, 2, "done"))
+    return mapping_df, groupwise_df
+
+
+JOB_KINDS = {
+    "capacity": (_capacity_job, ("link_traffic",)),
+    "topology": (_topology_job, ("member2",)),
+}
+
+
+def _inputs_fingerprint(output_dir, subdirs):
+    """
+    Cheap change detector for a job's inputs: (name, size, mtime) of every file
+    """
+    stamp = []
+    for sub in subdirs:
+        path = os.path.join(output_dir, sub)
+        if not os.path.isdir(path):
+            continue
+        for fname in sorted(os.listdir(path)):
+            st = os.stat(os.path.join(path, fname))
+            stamp.append((sub, fname, st.st_size, st.st_mtime_ns))
+    return tuple(stamp)
+
+
+# JOB HANDLE
+class Job:
+    def __init__(self, key, future, queue):
+        self.key = key
+        self.future = future
+        self._queue = queue
+        self.progress = (0, 1, "queued")
+
+    @classmethod
+    def finished(cls, key, result):
+        future = Future()
+        future.set_result(result)
+        job = cls(key, future, None)
+        job.progress = (1, 1, "done")
+        return job
+
+    def poll(self):
+        """
+        Drain progress messages sent by the worker; return the latest one
+        """
+        while self._queue is not None:
+            try:
+                self.progress = self._queue.get_nowait()
+            except Exception:
+                break
+        return self.progress
+
+    def done(self):
+        return self.future.done()
+
+    def result(self):
+        return self.future.result()
+
+
+# JOB MANAGER (one per server process)
+class JobManager:
+    """
+    Runs pipeline recomputations on a background process pool and memoizes
+    finished jobs by (kind, parameters, input files) so that repeated
+    what-if queries return immediately. When a shared ResultCache is given,
+    finished results live there (and are evicted with it); otherwise they
+    are kept for the lifetime of the manager.
+    """
+
+    def __init__(self, output_dir, max_workers=MAX_WORKERS, cache=None):
+        self.output_dir = output_dir
+        self.cache = cache
+        ctx = mp.get_context("spawn")
+        self._pool = ProcessPoolExecutor(max_workers, mp_context=ctx)
+        self._manager = ctx.Manager()
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, kind, **params):
+        func, inputs = JOB_KINDS[kind]
+        key = (
+            kind,
+            tuple(sorted(params.items())),
+            _inputs_fingerprint(self.output_dir, inputs)
+        )
+
+        if self.cache is not None:
+            missing = object()
+            result = self.cache.get(key, missing)
+            if result is not missing:
+                return Job.finished(key, result)
+
+        new = False
+        with self._lock:
+            job = self._jobs.get(key)
+
+            # Retry jobs that failed instead of memoizing the error
+            if job is not None and job.done() and job.future.exception():
+                job = None
+
+            if job is None:
+                queue = self._manager.Queue()
+                future = self._pool.submit(
+                    func, self.output_dir, progress=queue, **params
+                )
+                job = Job(key, future, queue)
+                self._jobs[key] = job
+                new = True
+
+        # Outside the lock: a job that already finished runs the callback
+        # right here, and _store() takes the lock itself
+        if new and self.cache is not None:
+            job.future.add_done_callback(
+                lambda f, key=key: self._store(key, f)
+            )
+
+        return job
+
+    def _store(self, key, future):
+        if future.cancelled() or future.exception() is not None:
+            return
+        self.cache.put(key, future.result())
+        with self._lock:
+            self._jobs.pop(key, None)
+
+    def shutdown(self):
+        self._pool.shutdown(cancel_futures=True)
+        self._manager.shutdown()
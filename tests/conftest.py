@@ -0,0 +1,11 @@
+import os
+import sys
+
+import matplotlib
+matplotlib.use("Agg")
+
+# PATHS
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC_DIR = os.path.join(BASE_DIR, "src")
+
+sys.path.insert(0, SRC_DIR)
@@ -0,0 +1,90 @@
+import numpy as np
+
+import capacity_monitor
+import estimate_capacity_no_buffer as cap_no_buf
+import estimate_capacity_with_buffer as cap_buf
+
+SLOTS_PER_SEC = capacity_monitor.SLOTS_PER_SEC
+WINDOW = cap_buf.WINDOW
+
+
+# SYNTHETIC LINK TRACES
+def bursty_trace(rng, seconds):
+    """
+    Idle / busy slots with bursts, like a link sum
+    """
+    num_slots = seconds * SLOTS_PER_SEC
+    busy = rng.random(num_slots) < 0.6
+    traffic = np.where(busy, rng.gamma(2.0, 1.0, num_slots), 0.0)
+    for start in rng.integers(0, num_slots - 50, seconds * 4):
+        traffic[start:start + rng.integers(5, 50)] += rng.uniform(2, 6)
+    return traffic
+
+
+def feed(rng, monitor, traffic, max_batch=3000):
+    statuses = []
+    start = 0
+    while start < len(traffic):
+        stop = start + int(rng.integers(1, max_batch))
+        statuses += monitor.update(traffic[start:stop])
+        start = stop
+    return statuses
+
+
+def windowed(traffic):
+    return np.convolve(traffic, np.ones(WINDOW) / WINDOW, mode="valid")
+
+
+# TESTS
+def test_random_batches_match_whole_trace():
+    rng = np.random.default_rng(3)
+    traffic = bursty_trace(rng, 20)
+    capacity = 4.0
+    monitor = capacity_monitor.LinkMonitor(1, capacity, horizon_sec=100)
+
+    statuses = feed(rng, monitor, traffic)
+    closed = windowed(traffic)[:len(statuses) * SLOTS_PER_SEC]
+    assert len(statuses) == (len(traffic) - WINDOW + 1) // SLOTS_PER_SEC
+
+    expected = cap_buf.loss_ratio_for_capacity(closed, capacity)
+    assert monitor.loss_slots / monitor.traffic_slots == expected
+    assert statuses[-1]["Overflow_Ratio_Window"] == round(expected, 4)
+
+    q = cap_no_buf.LOSS_PERCENTILE
+    exact = np.percentile(closed, q)
+    assert abs(monitor.sketch.quantile(q / 100) - exact) <= capacity_monitor.SKETCH_ERROR * exact
+
+
+def test_horizon_drops_old_seconds():
+    rng = np.random.default_rng(4)
+    traffic = np.concatenate([bursty_trace(rng, 10) * 3, bursty_trace(rng, 10)])
+    monitor = capacity_monitor.LinkMonitor(1, 4.0, horizon_sec=5)
+
+    statuses = feed(rng, monitor, traffic)
+    closed = windowed(traffic)[:len(statuses) * SLOTS_PER_SEC]
+    last = closed[-5 * SLOTS_PER_SEC:]
+
+    exact = np.percentile(last, cap_no_buf.LOSS_PERCENTILE)
+    needed = monitor.sketch.quantile(cap_no_buf.LOSS_PERCENTILE / 100)
+    assert abs(needed - exact) <= capacity_monitor.SKETCH_ERROR * exact
+    assert monitor.sketch.count() == len(last)
+
+
+def test_quantile_checked_against_no_buffer_capacity():
+    # Flat 1 Gbps with short bursts the buffer absorbs: the windowed p99 is
+    # above the buffered capacity while almost no slot overflows
+    traffic = np.ones(10 * SLOTS_PER_SEC)
+    for start in range(500, len(traffic), 1000):
+        traffic[start:start + 23] = 1.08
+    capacity = 1.05
+    p99 = np.percentile(windowed(traffic), cap_no_buf.LOSS_PERCENTILE)
+    assert p99 > capacity
+
+    rng = np.random.default_rng(5)
+    for no_buffer, level in [(None, "OK"), (1.02 * p99, "OK"), (1.0, "WARN")]:
+        monitor = capacity_monitor.LinkMonitor(
+            1, capacity, no_buffer_capacity_gbps=no_buffer
+        )
+        status = feed(rng, monitor, traffic)[-1]
+        assert status["Overflow_Ratio_Window"] < capacity_monitor.WARN_FRACTION * cap_buf.LOSS_LIMIT
+        assert status["Status"] == level
@@ -0,0 +1,34 @@
+import numpy as np
+
+import estimate_capacity_no_buffer as cap_no_buf
+import estimate_capacity_with_buffer as cap_buf
+import estimate_capacity_batched as batched
+
+WINDOW = cap_no_buf.WINDOW
+
+
+def check_against_per_link(link_traces):
+    capacity = batched.estimate_capacity(link_traces).set_index("Link")
+    for link_id, traffic in link_traces.items():
+        row = capacity.loc[f"Link {link_id}"]
+        avg, no_buf = cap_no_buf.required_capacity_no_buffer(traffic)
+        with_buf, _ = cap_buf.search_capacity(traffic)
+        assert row["Avg_Traffic_Gbps"] == round(avg, 3)
+        assert row["Required_Capacity_No_Buffer_Gbps"] == round(no_buf, 3)
+        assert abs(row["Required_Capacity_With_Buffer_Gbps"] - with_buf) <= 1e-3
+
+
+def test_short_rows_longer_than_the_moving_average():
+    # The longest row's moving average has 6 columns, the short row 15 slots
+    check_against_per_link({1: np.ones(WINDOW + 5), 2: np.arange(1, WINDOW - 4.0)})
+
+
+def test_mixed_short_long_and_idle_links():
+    rng = np.random.default_rng(6)
+    check_against_per_link({
+        1: np.ones(WINDOW + 5),
+        2: np.arange(1, WINDOW - 4.0),
+        3: rng.gamma(2.0, 1.0, 400) * (rng.random(400) < 0.7),
+        4: rng.gamma(2.0, 1.0, WINDOW - 1),
+        5: np.zeros(10),
+    })
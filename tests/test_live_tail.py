@@ -0,0 +1,166 @@
+import os
+import numpy as np
+
+import live_tail
+import preprocess_member1 as member1
+import build_link_slot_traffic as link_traffic
+
+T0 = 1_700_000_000.0
+
+
+# SYNTHETIC CELL FILES
+def cell_lines(rng, num_slots, extra_symbols=0):
+    """
+    (throughput, pkt-stats) file contents of one cell. kbits take a few
+    values only, so the glitch quantile never zeroes a symbol and live and
+    batch rates match exactly.
+    """
+    num_symbols = num_slots * member1.SYMBOLS_PER_SLOT + extra_symbols
+    symbol_sec = member1.SLOT_DURATION_SEC / member1.SYMBOLS_PER_SLOT
+    kbits = rng.choice([0.0, 10.0, 20.0], num_symbols)
+    thr = "".join(f"{T0 + i * symbol_sec:.6f} {k:.3f}\n" for i, k in enumerate(kbits))
+
+    tx = rng.integers(0, 50, num_slots)
+    rx = tx - rng.integers(0, 3, num_slots).clip(max=tx)
+    late = rng.integers(0, 2, num_slots)
+    pkt = "".join(
+        f"{T0 + i * member1.SLOT_DURATION_SEC:.6f} {a} {b} {c}\n"
+        for i, (a, b, c) in enumerate(zip(tx, rx, late))
+    )
+    return thr.encode(), pkt.encode()
+
+
+def paths(data_dir, cell_id):
+    return (os.path.join(data_dir, "throughput", f"throughput-cell-{cell_id}.dat"),
+            os.path.join(data_dir, "pkt-stats", f"pkt-stats-cell-{cell_id}.dat"))
+
+
+def write(path, data, mode="wb"):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, mode) as f:
+        f.write(data)
+
+
+def replay(rng, store, contents, max_chunk=5000):
+    """
+    Append every cell's remaining bytes in random-sized chunks (splitting
+    lines and slots), polling the streams after each one
+    """
+    offsets = {key: 0 for key in contents}
+    while any(offsets[key] < len(data) for key, data in contents.items()):
+        for (cell_id, kind), data in contents.items():
+            n = int(rng.integers(1, max_chunk))
+            chunk = data[offsets[cell_id, kind]:offsets[cell_id, kind] + n]
+            offsets[cell_id, kind] += len(chunk)
+            if chunk:
+                write(paths(store.data_dir, cell_id)[kind], chunk, "ab")
+            stream = store.streams[cell_id]
+            stream.poll_throughput()
+            stream.poll_pktstats()
+
+
+def batch(data_dir, cell_id):
+    thr_path, pkt_path = paths(data_dir, cell_id)
+    slots = member1.throughput_to_slots(member1.read_throughput(thr_path))
+    loss = member1.pktstats_to_loss(member1.read_pktstats(pkt_path))
+    return slots.values, loss.values
+
+
+class Store(live_tail.LiveStore):
+    def __init__(self, cells, data_dir, from_end=False):
+        super().__init__(cells, data_dir, 10_000, from_end)
+        self.data_dir = data_dir
+
+
+# TESTS
+def test_chunked_replay_matches_batch(tmp_path):
+    rng = np.random.default_rng(1)
+    data_dir = str(tmp_path)
+    store = Store([1, 2], data_dir)
+
+    contents = {}
+    for cell_id, num_slots in [(1, 300), (2, 250)]:
+        thr, pkt = cell_lines(rng, num_slots)
+        contents[cell_id, 0], contents[cell_id, 1] = thr, pkt
+    replay(rng, store, contents)
+
+    for cell_id in [1, 2]:
+        slots, loss = batch(data_dir, cell_id)
+        stream = store.streams[cell_id]
+        assert stream.throughput.first == 0 and stream.loss.first == 0
+        np.testing.assert_array_equal(stream.throughput.latest(), slots)
+        np.testing.assert_array_equal(stream.loss.latest(), loss)
+
+    start, stop = store.link_span([1, 2])
+    assert (start, stop) == (0, 250)
+    expected = link_traffic.sum_cell_traces([batch(data_dir, c)[0][:, 1] for c in [1, 2]])
+    np.testing.assert_array_equal(store.link_traffic([1, 2]), expected)
+
+
+def test_from_end_keeps_batch_slot_indices(tmp_path):
+    rng = np.random.default_rng(2)
+    data_dir = str(tmp_path)
+
+    # Cells of unequal length, cell 1 stopping mid-slot
+    existing = {1: (100, 5), 2: (137, 0)}
+    contents = {}
+    for cell_id, (num_slots, extra) in existing.items():
+        thr, pkt = cell_lines(rng, 300)
+        cut = num_slots * member1.SYMBOLS_PER_SLOT + extra
+        thr_cut = sum(len(line) + 1 for line in thr.split(b"\n")[:cut])
+        pkt_cut = sum(len(line) + 1 for line in pkt.split(b"\n")[:num_slots])
+        thr_path, pkt_path = paths(data_dir, cell_id)
+        write(thr_path, thr[:thr_cut])
+        write(pkt_path, pkt[:pkt_cut])
+        contents[cell_id, 0], contents[cell_id, 1] = thr[thr_cut:], pkt[pkt_cut:]
+
+    store = Store([1, 2], data_dir, from_end=True)
+    for stream in store.streams.values():
+        stream.poll_throughput()
+        stream.poll_pktstats()
+    replay(rng, store, contents)
+
+    # Cell 1's partial slot 100 is dropped; its ring starts at slot 101
+    assert store.streams[1].throughput.first == 101
+    assert store.streams[2].throughput.first == 137
+    assert store.streams[1].loss.first == 100
+    assert store.streams[2].loss.first == 137
+
+    batches = {c: batch(data_dir, c) for c in [1, 2]}
+    for cell_id, (slots, loss) in batches.items():
+        stream = store.streams[cell_id]
+        np.testing.assert_array_equal(stream.throughput.latest(), slots[stream.throughput.first:])
+        np.testing.assert_array_equal(stream.loss.latest(), loss[stream.loss.first:])
+
+    start, stop = store.link_span([1, 2])
+    assert (start, stop) == (137, 300)
+    expected = link_traffic.sum_cell_traces([batches[c][0][start:stop, 1] for c in [1, 2]])
+    np.testing.assert_array_equal(store.link_traffic([1, 2]), expected)
+
+
+def test_rotation_restarts_rings(tmp_path):
+    rng = np.random.default_rng(3)
+    data_dir = str(tmp_path)
+    store = Store([1], data_dir)
+
+    # Old files end mid-slot, so a half-collected slot is pending too
+    old_thr, old_pkt = cell_lines(rng, 200, extra_symbols=5)
+    thr_path, pkt_path = paths(data_dir, 1)
+    write(thr_path, old_thr)
+    write(pkt_path, old_pkt)
+    stream = store.streams[1]
+    stream.poll_throughput()
+    stream.poll_pktstats()
+    assert stream.throughput.total == 200 and stream.loss.total == 200
+
+    # Rotate both files: the new ones replace the old paths
+    for path in (thr_path, pkt_path):
+        os.replace(path, path + ".1")
+    contents = dict(zip([(1, 0), (1, 1)], cell_lines(rng, 120)))
+    replay(rng, store, contents)
+
+    slots, loss = batch(data_dir, 1)
+    assert stream.throughput.first == 0 and stream.loss.first == 0
+    np.testing.assert_array_equal(stream.throughput.latest(), slots)
+    np.testing.assert_array_equal(stream.loss.latest(), loss)
+    assert store.link_span([1]) == (0, 120)